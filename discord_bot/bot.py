@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import os
+from typing import Optional
 
 import discord
 from discord.ext import commands
@@ -7,12 +9,14 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from .core.bootstrap import bootstrap_application
+from .core.bootstrap import bootstrap_application, shutdown_application
 
 bootstrap_application()
 
 from .cogs import load_extensions
+from .db.repository import summary_repository
 from .integrations.gemini_client import gemini_model
+from .integrations.local_llm_client import local_llm_client
 
 logger = logging.getLogger("discord_digest_bot")
 
@@ -33,10 +37,21 @@ class DiscordSummaryBot(commands.Bot):
         intents.messages = True
         super().__init__(command_prefix="!", intents=intents)
         self._synced = False
+        self._prompt_migration: Optional[asyncio.Task] = None
 
     async def setup_hook(self) -> None:
-        """在連上 Discord 前先載入所有 cogs。"""
+        """在連上 Discord 前先建立共用 HTTP client 並載入所有 cogs；舊 summaries.prompt 在背景分批壓縮搬移。"""
+        await local_llm_client.start()
         await load_extensions(self)
+        self._prompt_migration = asyncio.create_task(summary_repository.migrate_inline_prompts_async())
+
+    async def close(self) -> None:
+        """關閉 bot 前先釋放本地 LLM 的連線池；gateway 關閉後再把 write-behind 佇列與 DB thread 寫完。"""
+        await local_llm_client.close()
+        if self._prompt_migration is not None and not self._prompt_migration.done():
+            self._prompt_migration.cancel()
+        await super().close()
+        await shutdown_application()
 
 
 bot = DiscordSummaryBot()
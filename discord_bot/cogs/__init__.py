@@ -3,6 +3,7 @@ from __future__ import annotations
 from discord.ext import commands
 
 EXTENSIONS = (
+    "discord_bot.cogs.message_archive_cog",
     "discord_bot.cogs.summary_cog",
     "discord_bot.cogs.conversation_cog",
     "discord_bot.cogs.fun_cog",
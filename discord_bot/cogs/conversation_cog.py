@@ -8,13 +8,16 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
+from ..core.llm_scheduler import LLMPriority, interaction_queue_notifier, llm_request
+from ..db.message_archive_repository import message_archive_repository
 from ..db.repository import summary_repository
-from ..features.chat.history import collect_non_bot_messages, format_message_history, truncate_for_discord
+from ..features.chat.compactor import stream_compacted_history
+from ..features.chat.history import truncate_for_discord
 from ..features.chat.records import build_summary_record
+from ..features.chat.streaming import StreamingReply
 from ..features.notifications.service import notification_service
-from ..features.summaries.service import call_cloud_llm
-from ..integrations.gemini_client import gemini_model, gemini_user_message
-from ..integrations.local_llm import query_local_llm
+from ..features.summaries.service import answer_role_question
+from ..integrations.gemini_client import gemini_model, gemini_user_message, stream_text
 
 logger = logging.getLogger("discord_digest_bot")
 
@@ -51,67 +54,77 @@ class ConversationCog(commands.Cog):
             command="你要不要聽聽看你現在在講什麼",
             question=question,
         )
-        try:
-            time_since = datetime.now(timezone.utc) - timedelta(days=1)
-            messages = await collect_non_bot_messages(channel, limit=len_msg, after=time_since, fetch_multiplier=1.1)
-            if not messages:
-                await interaction.followup.send("找不到最近的訊息，無法回答問題。")
-                return
-
-            message_text = format_message_history(messages, include_author_id=True)
-            record["prompt"] = message_text
-            contents = [
-                {
-                    "role": "model",
-                    "parts": ["你是 Discord 頻道的觀察者，會用詼諧風格根據歷史訊息回答問題。請用繁體中文簡潔地作答。"],
-                },
-                {
-                    "role": "user",
-                    "parts": [
-                        f"""以下是過去 24 小時最近的 {len(messages)} 則對話：
-
-                        {message_text}
-
-                        使用者的提問：
-                        {question}
-
-                        請回答："""
-                    ],
-                },
-            ]
-
-            logger.info("Sending user question prompt to Gemini (length: %s chars)", len(contents[1]["parts"][0]))
-            if not gemini_model:
-                await interaction.followup.send("Summarization feature is unavailable (missing API key).", ephemeral=True)
-                return
-
-            response = await gemini_model.generate_content_async(contents=contents)
-            if not response.parts:
-                await interaction.followup.send("AI 無法提供回應（可能被內容審核攔截）。")
-                return
-
-            answer = truncate_for_discord(response.text.strip())
-            reply_content = f"{interaction.user.mention} 問了：{question}\n\n{answer}"
-
-            record["summary"] = answer
-            summary_repository.insert_summary(record)
-
-            await notification_service.dispatch(
-                record=record,
-                guild=interaction.guild,
-                bot_client=interaction.client,
-            )
-            await interaction.followup.send(reply_content)
-        except Exception as exc:
-            logger.error("Error in ask_about_conversation: %s", exc, exc_info=True)
-            await notification_service.dispatch(
-                record=record,
-                guild=interaction.guild,
-                bot_client=interaction.client,
-                error=exc,
-            )
-            public_message = gemini_user_message(exc) or "SERN 系統暫時發生問題，請稍後再試一次。"
-            await interaction.followup.send(public_message, ephemeral=True)
+        with llm_request(
+            guild_id=interaction.guild_id,
+            priority=LLMPriority.SUMMARY,
+            on_position=interaction_queue_notifier(interaction),
+        ):
+            try:
+                time_since = datetime.now(timezone.utc) - timedelta(days=1)
+                transcript = await stream_compacted_history(
+                    channel,
+                    limit=len_msg,
+                    after=time_since,
+                    fetch_multiplier=1.1,
+                    archive=message_archive_repository,
+                    flight_key=("過去24小時", len_msg),
+                )
+                if not transcript.message_count:
+                    await interaction.followup.send("找不到最近的訊息，無法回答問題。")
+                    return
+
+                message_text = transcript.text
+                record["prompt"] = message_text
+                # 同一段歷史在短時間內被多次提問時，context 部分可以重用 Gemini context cache，
+                # 每次只需送出新的問題。
+                context = [
+                    {
+                        "role": "model",
+                        "parts": ["你是 Discord 頻道的觀察者，會用詼諧風格根據歷史訊息回答問題。請用繁體中文簡潔地作答。"],
+                    },
+                    {
+                        "role": "user",
+                        "parts": [f"以下是過去 24 小時最近的 {transcript.message_count} 則對話：\n\n{message_text}"],
+                    },
+                ]
+                prompt_question = f"使用者的提問：\n{question}\n\n請回答："
+
+                logger.info("Sending user question prompt to Gemini (history length: %s chars)", len(message_text))
+                if not gemini_model:
+                    await interaction.followup.send("Summarization feature is unavailable (missing API key).", ephemeral=True)
+                    return
+
+                async with StreamingReply(interaction, prefix=f"{interaction.user.mention} 問了：{question}\n\n") as reply:
+                    text, block_reason = await stream_text(
+                        gemini_model.generate_with_context_stream_async(context, prompt_question),
+                        reply.update,
+                    )
+                    if block_reason is not None:
+                        await reply.discard()
+                        await interaction.followup.send("AI 無法提供回應（可能被內容審核攔截）。")
+                        return
+
+                    answer = text.strip()
+
+                    record["summary"] = answer
+                    await summary_repository.insert_summary_async(record)
+
+                    await notification_service.dispatch(
+                        record=record,
+                        guild=interaction.guild,
+                        bot_client=interaction.client,
+                    )
+                    await reply.finish(answer)
+            except Exception as exc:
+                logger.error("Error in ask_about_conversation: %s", exc, exc_info=True)
+                await notification_service.dispatch(
+                    record=record,
+                    guild=interaction.guild,
+                    bot_client=interaction.client,
+                    error=exc,
+                )
+                public_message = gemini_user_message(exc) or "SERN 系統暫時發生問題，請稍後再試一次。"
+                await interaction.followup.send(public_message, ephemeral=True)
 
     @app_commands.command(name="解答之書", description="取樣最近20則訊息，向本地 LLM 詢問")
     async def answer_book(self, interaction: discord.Interaction, 問題: str) -> None:
@@ -124,54 +137,73 @@ class ConversationCog(commands.Cog):
         await interaction.response.defer(ephemeral=False)
         role_mode = os.getenv("ROLE_MODE", "local")
         record = {}
-        try:
-            messages = await collect_non_bot_messages(channel, limit=20, after=None, fetch_multiplier=2.5)
-            if not messages:
-                await interaction.followup.send("找不到最近的訊息。")
-                return
-
-            history = format_message_history(messages)
-            prompt = (
-                f"以下是此頻道最近的 20 則對話：\n{history}\n\n"
-                f"使用者問題：{問題}\n可以根據對話內容與使用者聊天，並以繁體中文回答。"
-            )
-            logger.info("Sending prompt to %s LLM (length: %s chars)", role_mode, len(prompt))
-
-            answer = await query_local_llm(prompt, role="basic") if role_mode == "local" else await call_cloud_llm(prompt, role="basic")
-            answer = truncate_for_discord(answer)
-            reply = f"{interaction.user.mention} 問了：{問題}\n\n{answer}"
-
-            record = build_summary_record(
-                channel_id=str(channel.name),
-                user_id=str(interaction.user.global_name or interaction.user.name),
-                command="解答之書",
-                question=問題,
-                prompt=prompt,
-                summary=answer,
-            )
-            summary_repository.insert_summary(record)
-
-            await notification_service.dispatch(
-                record=record,
-                guild=interaction.guild,
-                bot_client=interaction.client,
-            )
-
-            if answer.startswith("Error contacting local LLM"):
-                await interaction.followup.send("AI 罷工了捏 _(:з」∠)_", ephemeral=True)
-                return
-
-            await interaction.followup.send(reply)
-        except Exception as exc:
-            logger.error("Error in answer_book: %s", exc, exc_info=True)
-            await notification_service.dispatch(
-                record=record,
-                guild=interaction.guild,
-                bot_client=interaction.client,
-                error=exc,
-            )
-            public_message = gemini_user_message(exc) or "SERN 系統暫時發生問題，請稍後再試一次。"
-            await interaction.followup.send(public_message, ephemeral=True)
+        with llm_request(
+            guild_id=interaction.guild_id,
+            priority=LLMPriority.INTERACTIVE,
+            on_position=interaction_queue_notifier(interaction),
+        ):
+            try:
+                transcript = await stream_compacted_history(
+                    channel,
+                    limit=20,
+                    after=None,
+                    fetch_multiplier=2.5,
+                    archive=message_archive_repository,
+                    flight_key=("最近", 20),
+                )
+                if not transcript.message_count:
+                    await interaction.followup.send("找不到最近的訊息。")
+                    return
+
+                history = transcript.text
+                prompt = (
+                    f"以下是此頻道最近的 20 則對話：\n{history}\n\n"
+                    f"使用者問題：{問題}\n可以根據對話內容與使用者聊天，並以繁體中文回答。"
+                )
+                logger.info("Sending prompt to %s LLM (length: %s chars)", role_mode, len(prompt))
+
+                async with StreamingReply(interaction, prefix=f"{interaction.user.mention} 問了：{問題}\n\n") as reply:
+                    answer, cached = await answer_role_question(
+                        prompt,
+                        "basic",
+                        question=問題,
+                        history=history,
+                        mode=role_mode,
+                        on_text=reply.update,
+                    )
+
+                    record = build_summary_record(
+                        channel_id=str(channel.name),
+                        user_id=str(interaction.user.global_name or interaction.user.name),
+                        command="解答之書（快取）" if cached else "解答之書",
+                        question=問題,
+                        prompt=prompt,
+                        summary=answer,
+                    )
+                    await summary_repository.insert_summary_async(record)
+
+                    await notification_service.dispatch(
+                        record=record,
+                        guild=interaction.guild,
+                        bot_client=interaction.client,
+                    )
+
+                    if answer.startswith("Error contacting local LLM"):
+                        await reply.discard()
+                        await interaction.followup.send("AI 罷工了捏 _(:з」∠)_", ephemeral=True)
+                        return
+
+                    await reply.finish(answer)
+            except Exception as exc:
+                logger.error("Error in answer_book: %s", exc, exc_info=True)
+                await notification_service.dispatch(
+                    record=record,
+                    guild=interaction.guild,
+                    bot_client=interaction.client,
+                    error=exc,
+                )
+                public_message = gemini_user_message(exc) or "SERN 系統暫時發生問題，請稍後再試一次。"
+                await interaction.followup.send(public_message, ephemeral=True)
 
     @app_commands.command(name="el_psy_kongroo", description="一切都是命運石之門的選擇！")
     async def el_psy_kongroo(self, interaction: discord.Interaction, 問題: str) -> None:
@@ -184,55 +216,73 @@ class ConversationCog(commands.Cog):
         await interaction.response.defer(ephemeral=False)
         role_mode = os.getenv("ROLE_MODE", "local")
         record = {}
-        try:
-            messages = await collect_non_bot_messages(channel, limit=20, after=None, fetch_multiplier=2.5)
-            if not messages:
-                await interaction.followup.send("找不到最近的訊息。")
-                return
-
-            history = format_message_history(messages)
-            prompt = (
-                f"以下是此頻道最近的 20 則對話：\n{history}\n\n"
-                f"使用者問題：{問題}\n可以根據對話內容與使用者聊天，並以繁體中文回答，可適度帶入命運石之門風格語感。"
-            )
-            logger.info("Sending prompt to %s LLM (length: %s chars)", role_mode, len(prompt))
-
-            answer = await query_local_llm(prompt, role="kurisu") if role_mode == "local" else await call_cloud_llm(prompt, role="kurisu")
-            answer = truncate_for_discord(answer)
-            reply = f"{interaction.user.mention} 問了：{問題}\n\n{answer}"
-
-            record = build_summary_record(
-                channel_id=str(channel.name),
-                user_id=str(interaction.user.global_name or interaction.user.name),
-                command="el_psy_kongroo",
-                question=問題,
-                prompt=prompt,
-                summary=answer,
-            )
-            summary_repository.insert_summary(record)
-
-            await notification_service.dispatch(
-                record=record,
-                guild=interaction.guild,
-                bot_client=interaction.client,
-            )
-
-            if answer.startswith("Error contacting local LLM"):
-                await interaction.followup.send("Amadeus 罷工了捏 _(:з」∠)_", ephemeral=True)
-                return
-
-            await self._send_as_amadeus(channel, reply)
-            await interaction.delete_original_response()
-        except Exception as exc:
-            logger.error("Error in el_psy_kongroo: %s", exc, exc_info=True)
-            await notification_service.dispatch(
-                record=record,
-                guild=interaction.guild,
-                bot_client=interaction.client,
-                error=exc,
-            )
-            public_message = gemini_user_message(exc) or "SERN 系統暫時發生問題，請稍後再試一次。"
-            await interaction.followup.send(public_message, ephemeral=True)
+        with llm_request(
+            guild_id=interaction.guild_id,
+            priority=LLMPriority.INTERACTIVE,
+            on_position=interaction_queue_notifier(interaction),
+        ):
+            try:
+                transcript = await stream_compacted_history(
+                    channel,
+                    limit=20,
+                    after=None,
+                    fetch_multiplier=2.5,
+                    archive=message_archive_repository,
+                    flight_key=("最近", 20),
+                )
+                if not transcript.message_count:
+                    await interaction.followup.send("找不到最近的訊息。")
+                    return
+
+                history = transcript.text
+                prompt = (
+                    f"以下是此頻道最近的 20 則對話：\n{history}\n\n"
+                    f"使用者問題：{問題}\n可以根據對話內容與使用者聊天，並以繁體中文回答，可適度帶入命運石之門風格語感。"
+                )
+                logger.info("Sending prompt to %s LLM (length: %s chars)", role_mode, len(prompt))
+
+                answer, cached = await answer_role_question(
+                    prompt,
+                    "kurisu",
+                    question=問題,
+                    history=history,
+                    mode=role_mode,
+                )
+                answer = truncate_for_discord(answer)
+                reply = f"{interaction.user.mention} 問了：{問題}\n\n{answer}"
+
+                record = build_summary_record(
+                    channel_id=str(channel.name),
+                    user_id=str(interaction.user.global_name or interaction.user.name),
+                    command="el_psy_kongroo（快取）" if cached else "el_psy_kongroo",
+                    question=問題,
+                    prompt=prompt,
+                    summary=answer,
+                )
+                await summary_repository.insert_summary_async(record)
+
+                await notification_service.dispatch(
+                    record=record,
+                    guild=interaction.guild,
+                    bot_client=interaction.client,
+                )
+
+                if answer.startswith("Error contacting local LLM"):
+                    await interaction.followup.send("Amadeus 罷工了捏 _(:з」∠)_", ephemeral=True)
+                    return
+
+                await self._send_as_amadeus(channel, reply)
+                await interaction.delete_original_response()
+            except Exception as exc:
+                logger.error("Error in el_psy_kongroo: %s", exc, exc_info=True)
+                await notification_service.dispatch(
+                    record=record,
+                    guild=interaction.guild,
+                    bot_client=interaction.client,
+                    error=exc,
+                )
+                public_message = gemini_user_message(exc) or "SERN 系統暫時發生問題，請稍後再試一次。"
+                await interaction.followup.send(public_message, ephemeral=True)
 
     async def _send_as_amadeus(self, channel: discord.TextChannel, content: str) -> None:
         """Send a webhook message that impersonates the Amadeus persona."""
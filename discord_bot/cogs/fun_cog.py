@@ -72,7 +72,7 @@ class FunCog(commands.Cog):
             prompt=cross_worldline_text,
             summary=reply_content,
         )
-        summary_repository.insert_summary(record)
+        await summary_repository.insert_summary_async(record)
 
         if crossed:
             await notification_service.dispatch(
@@ -127,7 +127,7 @@ class FunCog(commands.Cog):
             success = True
             target_for_log = username
 
-        def record_deepfaker_event(delivery_status: str) -> None:
+        async def record_deepfaker_event(delivery_status: str) -> None:
             event = build_deepfaker_event(
                 guild=channel.guild,
                 channel=channel,
@@ -142,22 +142,22 @@ class FunCog(commands.Cog):
                 failure_exposed_content=fake_message_content or None,
                 delivery_status=delivery_status,
             )
-            deepfaker_repository.insert_event(event)
+            await deepfaker_repository.insert_event_async(event)
 
         try:
             await self._send_with_webhook(channel, message_content, username, avatar_url, "DeepFaker")
         except discord.Forbidden:
-            record_deepfaker_event("forbidden")
+            await record_deepfaker_event("forbidden")
             logger.error("DeepFaker 需要 Manage Webhooks 權限才能發送訊息。")
             await interaction.followup.send("無法使用 DeepFaker，缺少建立或使用 Webhook 的權限。", ephemeral=True)
             return
         except discord.HTTPException as http_err:
-            record_deepfaker_event("http_error")
+            await record_deepfaker_event("http_error")
             logger.error("DeepFaker webhook 發送失敗: %s", http_err, exc_info=True)
             await interaction.followup.send("DeepFaker 發送失敗，請稍後再試一次。", ephemeral=True)
             return
 
-        record_deepfaker_event("sent")
+        await record_deepfaker_event("sent")
 
         log_message = (
             f"DeepFaker invoked by {interaction.user.display_name or interaction.user.name} "
@@ -173,7 +173,7 @@ class FunCog(commands.Cog):
             prompt=message_content,
             summary=fake_message_content,
         )
-        summary_repository.insert_summary(record)
+        await summary_repository.insert_summary_async(record)
 
         fake_username = 冒牌對象.display_name or 冒牌對象.name
         tag = "✅SUCCESS" if not should_fail else "❌FAIL"
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import logging
+
+import discord
+from discord.ext import commands
+
+from ..db.message_archive_repository import MessageArchiveRepository, message_archive_repository
+
+logger = logging.getLogger("discord_digest_bot")
+
+
+class MessageArchiveCog(commands.Cog):
+    """Keep the local message archive current from gateway events.
+
+    這層只把事件轉給 repository；history helpers 會依 coverage 決定要不要再問 Discord。
+    """
+
+    def __init__(self, bot: commands.Bot, archive: MessageArchiveRepository = message_archive_repository) -> None:
+        self.bot = bot
+        self.archive = archive
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        """新的 gateway session 開始，斷線期間可能漏掉事件，所以 coverage 從現在重新累積。"""
+        await self.archive.start_session_async()
+        logger.info("Message archive session started at %s", self.archive.session_started_at)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        if message.author.bot or message.guild is None:
+            return
+        await self.archive.store_message_async(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        """使用 raw 事件，才能涵蓋不在 discord.py message cache 內的舊訊息。"""
+        content = payload.data.get("content")
+        if content is None:
+            return
+        await self.archive.update_content_async(payload.message_id, content)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        await self.archive.delete_messages_async([payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        await self.archive.delete_messages_async(payload.message_ids)
+
+
+async def setup(bot: commands.Bot) -> None:
+    """Register the message archive cog."""
+    await bot.add_cog(MessageArchiveCog(bot))
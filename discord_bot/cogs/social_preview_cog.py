@@ -32,17 +32,17 @@ class SocialPreviewCog(commands.Cog):
         guild_id = str(message.guild.id) if message.guild is not None else None
 
         # Threads 優先處理；若已經成功代發 preview，Facebook 就不用再接手。
-        if has_threads_url and is_social_preview_enabled(guild_id, PLATFORM_THREADS):
+        if has_threads_url and await is_social_preview_enabled(guild_id, PLATFORM_THREADS):
             handled = await handle_threads_in_message(message)
             if handled:
                 return
 
-        if has_instagram_url and is_social_preview_enabled(guild_id, PLATFORM_INSTAGRAM):
+        if has_instagram_url and await is_social_preview_enabled(guild_id, PLATFORM_INSTAGRAM):
             handled = await handle_instagram_in_message(message)
             if handled:
                 return
 
-        if has_facebook_url and is_social_preview_enabled(guild_id, PLATFORM_FACEBOOK):
+        if has_facebook_url and await is_social_preview_enabled(guild_id, PLATFORM_FACEBOOK):
             await handle_facebook_in_message(message)
 
 
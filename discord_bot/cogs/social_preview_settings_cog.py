@@ -98,9 +98,9 @@ class SocialPreviewSettingsCog(commands.Cog):
         update_results = []
         for target_platform in target_platforms:
             if state_value == STATE_DEFAULT:
-                result = social_preview_settings_service.clear_override(guild_id, target_platform)
+                result = await social_preview_settings_service.clear_override_async(guild_id, target_platform)
             else:
-                result = social_preview_settings_service.set_override(
+                result = await social_preview_settings_service.set_override_async(
                     guild_id,
                     target_platform,
                     state_value == STATE_ENABLED,
@@ -115,7 +115,7 @@ class SocialPreviewSettingsCog(commands.Cog):
             )
             return
 
-        statuses = social_preview_settings_service.list_statuses(guild_id)
+        statuses = await social_preview_settings_service.list_statuses_async(guild_id)
         lines = [_format_status_line(statuses[platform_name]) for platform_name in SUPPORTED_PLATFORMS]
         target_label = "全部平台" if platform_value == PLATFORM_ALL else _PLATFORM_LABELS.get(platform_value, platform_value)
         state_label = _STATE_LABELS.get(state_value, state_value)
@@ -130,14 +130,14 @@ class SocialPreviewSettingsCog(commands.Cog):
             await interaction.response.send_message("此指令只能在伺服器內使用。", ephemeral=True)
             return
 
-        if not social_preview_settings_service.settings_available():
+        if not await social_preview_settings_service.settings_available_async():
             await interaction.response.send_message(
                 "社群預覽設定資料庫目前無法使用，無法確認伺服器層級設定。請檢查 Server 啟動時的資料庫連線錯誤。",
                 ephemeral=True,
             )
             return
 
-        statuses = social_preview_settings_service.list_statuses(str(interaction.guild.id))
+        statuses = await social_preview_settings_service.list_statuses_async(str(interaction.guild.id))
         lines = [_format_status_line(statuses[platform_name]) for platform_name in SUPPORTED_PLATFORMS]
         await interaction.response.send_message("社群預覽狀態：\n" + "\n".join(lines), ephemeral=True)
 
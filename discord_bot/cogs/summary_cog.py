@@ -7,8 +7,12 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-from ..features.chat.history import collect_non_bot_messages, truncate_for_discord
-from ..features.summaries.service import summarize_messages
+from ..core.llm_scheduler import LLMPriority, interaction_queue_notifier, llm_request
+from ..db.message_archive_repository import message_archive_repository
+from ..features.chat.compactor import stream_compacted_history
+from ..features.chat.history import HISTORY_FETCH_SLICES
+from ..features.chat.streaming import StreamingReply
+from ..features.summaries.service import resolve_summary_window, summarize_transcript
 
 logger = logging.getLogger("discord_digest_bot")
 UNEXPECTED_COMMAND_ERROR_MESSAGE = "SERN 系統暫時發生問題，請稍後再試一次。"
@@ -37,36 +41,53 @@ class SummaryCog(commands.Cog):
             return
 
         await interaction.response.defer(ephemeral=False)
-        try:
-            time_since = datetime.now(timezone.utc) - timedelta(days=1)
-            messages = await collect_non_bot_messages(
-                channel,
-                limit=len_msg,
-                after=time_since,
-                fetch_multiplier=1.1,
-            )
-            logger.info("Fetched %s non-bot messages for summarization.", len(messages))
-
-            user_id = str(interaction.user.display_name or interaction.user.name)
-            summary_text = await summarize_messages(messages, user_id=user_id)
-            if not summary_text:
-                summary_text = "Could not generate a summary (empty response)."
-
-            await interaction.followup.send(truncate_for_discord(summary_text, suffix="... (summary truncated)"))
-            logger.info("Sent summary to channel '%s'", channel.name)
-        except discord.Forbidden:
-            logger.error(
-                "Permission error: Bot lacks permissions to read history or send messages in channel '%s' (ID: %s)",
-                channel.name,
-                channel.id,
-            )
-            await interaction.followup.send(
-                "Error: I don't have the necessary permissions to read message history or send messages in this channel.",
-                ephemeral=True,
-            )
-        except Exception as exc:
-            logger.error("An unexpected error occurred during summarization command: %s", exc, exc_info=True)
-            await interaction.followup.send(UNEXPECTED_COMMAND_ERROR_MESSAGE, ephemeral=True)
+        with llm_request(
+            guild_id=interaction.guild_id,
+            priority=LLMPriority.SUMMARY,
+            on_position=interaction_queue_notifier(interaction),
+        ):
+            try:
+                time_since = datetime.now(timezone.utc) - timedelta(days=1)
+                fetch_after, watermark = await resolve_summary_window(channel.id, "過去24小時", time_since)
+                transcript = await stream_compacted_history(
+                    channel,
+                    limit=len_msg,
+                    after=fetch_after,
+                    fetch_multiplier=1.1,
+                    archive=message_archive_repository,
+                    flight_key=("過去24小時", len_msg, watermark.last_message_id if watermark else None),
+                )
+                logger.info("Fetched %s non-bot messages for summarization.", transcript.message_count)
+
+                user_id = str(interaction.user.display_name or interaction.user.name)
+                async with StreamingReply(interaction) as reply:
+                    summary_text = await summarize_transcript(
+                        transcript,
+                        user_id=user_id,
+                        channel=channel,
+                        window_start=time_since,
+                        watermark=watermark,
+                        on_text=reply.update,
+                        message_limit=len_msg,
+                    )
+                    if not summary_text:
+                        summary_text = "Could not generate a summary (empty response)."
+
+                    await reply.finish(summary_text)
+                logger.info("Sent summary to channel '%s'", channel.name)
+            except discord.Forbidden:
+                logger.error(
+                    "Permission error: Bot lacks permissions to read history or send messages in channel '%s' (ID: %s)",
+                    channel.name,
+                    channel.id,
+                )
+                await interaction.followup.send(
+                    "Error: I don't have the necessary permissions to read message history or send messages in this channel.",
+                    ephemeral=True,
+                )
+            except Exception as exc:
+                logger.error("An unexpected error occurred during summarization command: %s", exc, exc_info=True)
+                await interaction.followup.send(UNEXPECTED_COMMAND_ERROR_MESSAGE, ephemeral=True)
 
     @app_commands.command(name="整理廢話的魔法", description="總結頻道中的1小時內所有訊息")
     async def magic_summarize(self, interaction: discord.Interaction, len_msg: int = 5000) -> None:
@@ -77,32 +98,54 @@ class SummaryCog(commands.Cog):
             return
 
         await interaction.response.defer(ephemeral=False)
-        try:
-            time_since = datetime.now(timezone.utc) - timedelta(hours=1)
-            logger.info("Fetching messages from channel '%s' since %s", channel.name, time_since.isoformat())
-            messages = await collect_non_bot_messages(channel, limit=len_msg, after=time_since)
-
-            logger.info("Fetched %s non-bot messages in last hour.", len(messages))
-            user_id = str(interaction.user.display_name or interaction.user.name)
-            summary_text = await summarize_messages(messages, prompt_scope="過去一小時", user_id=user_id)
-            if not summary_text:
-                summary_text = "找不到有效內容，無法生成摘要。"
-
-            await interaction.followup.send(f"＜(´⌯  ̫⌯`)＞ {truncate_for_discord(summary_text)}")
-            logger.info("Sent 1h summary to channel '%s'", channel.name)
-        except discord.Forbidden:
-            logger.error(
-                "Permission error: Bot lacks permissions to read history or send messages in channel '%s' (ID: %s)",
-                channel.name,
-                channel.id,
-            )
-            await interaction.followup.send(
-                "Error: I don't have the necessary permissions to read message history or send messages in this channel.",
-                ephemeral=True,
-            )
-        except Exception as exc:
-            logger.error("An unexpected error occurred during summarization command: %s", exc, exc_info=True)
-            await interaction.followup.send(UNEXPECTED_COMMAND_ERROR_MESSAGE, ephemeral=True)
+        with llm_request(
+            guild_id=interaction.guild_id,
+            priority=LLMPriority.SUMMARY,
+            on_position=interaction_queue_notifier(interaction),
+        ):
+            try:
+                time_since = datetime.now(timezone.utc) - timedelta(hours=1)
+                logger.info("Fetching messages from channel '%s' since %s", channel.name, time_since.isoformat())
+                fetch_after, watermark = await resolve_summary_window(channel.id, "過去一小時", time_since)
+                transcript = await stream_compacted_history(
+                    channel,
+                    limit=len_msg,
+                    after=fetch_after,
+                    archive=message_archive_repository,
+                    flight_key=("過去一小時", len_msg, watermark.last_message_id if watermark else None),
+                )
+
+                logger.info("Fetched %s non-bot messages in last hour.", transcript.message_count)
+                user_id = str(interaction.user.display_name or interaction.user.name)
+                async with StreamingReply(interaction, prefix="＜(´⌯  ̫⌯`)＞ ") as reply:
+                    summary_text = await summarize_transcript(
+                        transcript,
+                        prompt_scope="過去一小時",
+                        user_id=user_id,
+                        channel=channel,
+                        window_start=time_since,
+                        watermark=watermark,
+                        on_text=reply.update,
+                        message_limit=len_msg,
+                    )
+                    if not summary_text:
+                        summary_text = "找不到有效內容，無法生成摘要。"
+
+                    await reply.finish(summary_text)
+                logger.info("Sent 1h summary to channel '%s'", channel.name)
+            except discord.Forbidden:
+                logger.error(
+                    "Permission error: Bot lacks permissions to read history or send messages in channel '%s' (ID: %s)",
+                    channel.name,
+                    channel.id,
+                )
+                await interaction.followup.send(
+                    "Error: I don't have the necessary permissions to read message history or send messages in this channel.",
+                    ephemeral=True,
+                )
+            except Exception as exc:
+                logger.error("An unexpected error occurred during summarization command: %s", exc, exc_info=True)
+                await interaction.followup.send(UNEXPECTED_COMMAND_ERROR_MESSAGE, ephemeral=True)
 
     @app_commands.command(name="命運探知之魔眼", description="總結頻道中七天內一萬則訊息的精華(實驗性)")
     async def deep_summary(self, interaction: discord.Interaction, len_msg: int = 10000) -> None:
@@ -113,36 +156,55 @@ class SummaryCog(commands.Cog):
             return
 
         await interaction.response.defer(ephemeral=False)
-        try:
-            time_since = datetime.now(timezone.utc) - timedelta(days=7)
-            logger.info(
-                "Fetching messages (7d, max %s) from channel '%s' (ID: %s) since %s",
-                len_msg,
-                channel.name,
-                channel.id,
-                time_since,
-            )
-            messages = await collect_non_bot_messages(
-                channel,
-                limit=len_msg,
-                after=time_since,
-                fetch_multiplier=1.1,
-            )
-            logger.info("Fetched %s non-bot messages for 7-day summary.", len(messages))
-
-            user_id = str(interaction.user.display_name or interaction.user.name)
-            summary_text = await summarize_messages(messages, prompt_scope="過去七天", user_id=user_id)
-            if not summary_text:
-                summary_text = "總結失敗，無法取得任何有效的訊息。"
-
-            await interaction.followup.send(truncate_for_discord(summary_text, suffix="... (summary truncated)"))
-            logger.info("Sent 7-day summary to channel '%s'", channel.name)
-        except discord.Forbidden:
-            logger.error("Permission error: No access to read or send in channel '%s' (ID: %s)", channel.name, channel.id)
-            await interaction.followup.send("權限錯誤：無法讀取或發送訊息至此頻道。", ephemeral=True)
-        except Exception as exc:
-            logger.error("Unexpected error in /命運探知之魔眼: %s", exc, exc_info=True)
-            await interaction.followup.send(UNEXPECTED_COMMAND_ERROR_MESSAGE, ephemeral=True)
+        with llm_request(
+            guild_id=interaction.guild_id,
+            priority=LLMPriority.DEEP,
+            on_position=interaction_queue_notifier(interaction),
+        ):
+            try:
+                time_since = datetime.now(timezone.utc) - timedelta(days=7)
+                logger.info(
+                    "Fetching messages (7d, max %s) from channel '%s' (ID: %s) since %s",
+                    len_msg,
+                    channel.name,
+                    channel.id,
+                    time_since,
+                )
+                fetch_after, watermark = await resolve_summary_window(channel.id, "過去七天", time_since)
+                transcript = await stream_compacted_history(
+                    channel,
+                    limit=len_msg,
+                    after=fetch_after,
+                    fetch_multiplier=1.1,
+                    archive=message_archive_repository,
+                    flight_key=("過去七天", len_msg, watermark.last_message_id if watermark else None),
+                    slices=HISTORY_FETCH_SLICES,
+                )
+                logger.info("Fetched %s non-bot messages for 7-day summary.", transcript.message_count)
+
+                user_id = str(interaction.user.display_name or interaction.user.name)
+                async with StreamingReply(interaction) as reply:
+                    summary_text = await summarize_transcript(
+                        transcript,
+                        prompt_scope="過去七天",
+                        user_id=user_id,
+                        channel=channel,
+                        window_start=time_since,
+                        watermark=watermark,
+                        on_text=reply.update,
+                        message_limit=len_msg,
+                    )
+                    if not summary_text:
+                        summary_text = "總結失敗，無法取得任何有效的訊息。"
+
+                    await reply.finish(summary_text)
+                logger.info("Sent 7-day summary to channel '%s'", channel.name)
+            except discord.Forbidden:
+                logger.error("Permission error: No access to read or send in channel '%s' (ID: %s)", channel.name, channel.id)
+                await interaction.followup.send("權限錯誤：無法讀取或發送訊息至此頻道。", ephemeral=True)
+            except Exception as exc:
+                logger.error("Unexpected error in /命運探知之魔眼: %s", exc, exc_info=True)
+                await interaction.followup.send(UNEXPECTED_COMMAND_ERROR_MESSAGE, ephemeral=True)
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -2,8 +2,13 @@ from __future__ import annotations
 
 from .logging_utils import configure_logging
 from ..db.deepfaker_repository import deepfaker_repository
+from ..db.executor import db_executor
+from ..db.postgres_pool import postgres_pool
+from ..db.message_archive_repository import message_archive_repository
 from ..db.repository import summary_repository
 from ..db.social_preview_settings_repository import social_preview_settings_repository
+from ..db.sqlite_engine import close_sqlite_engines
+from ..db.summary_watermark_repository import summary_watermark_repository
 
 
 def bootstrap_application() -> None:
@@ -12,3 +17,14 @@ def bootstrap_application() -> None:
     summary_repository.init()
     deepfaker_repository.init()
     social_preview_settings_repository.init()
+    message_archive_repository.init()
+    summary_watermark_repository.init()
+
+
+async def shutdown_application() -> None:
+    """Flush write-behind queues, let the DB threads finish everything still queued, then close pooled connections."""
+    await summary_repository.writes.close()
+    await deepfaker_repository.writes.close()
+    await db_executor.close()
+    postgres_pool.close()
+    close_sqlite_engines()
@@ -0,0 +1,335 @@
+"""Admission control shared by every Gemini / local LLM call."""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger("discord_digest_bot")
+
+T = TypeVar("T")
+
+LLM_OVERLOADED_MESSAGE = "SERN 目前排隊的請求太多了，請稍後再試一次。"
+
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_MAX_QUEUE_PER_GUILD = int(os.getenv("LLM_MAX_QUEUE_PER_GUILD", "8"))
+LLM_QUEUE_UPDATE_INTERVAL = float(os.getenv("LLM_QUEUE_UPDATE_INTERVAL", "2"))
+
+
+class LLMPriority(IntEnum):
+    """數字越小越先排到；同一優先級內再依 guild 的公平份額排序。"""
+
+    INTERACTIVE = 0
+    SUMMARY = 1
+    DEEP = 2
+
+
+class LLMOverloadedError(RuntimeError):
+    """Raised instead of queueing when a backend or guild already has too many waiting calls."""
+
+
+class LLMQueueTimeoutError(LLMOverloadedError):
+    """Raised when a queued call did not get a slot before its deadline."""
+
+
+PositionCallback = Callable[[Optional[int]], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class LLMRequestContext:
+    guild_id: Optional[int] = None
+    priority: LLMPriority = LLMPriority.SUMMARY
+    on_position: Optional[PositionCallback] = None
+
+
+_request_context: ContextVar[LLMRequestContext] = ContextVar("llm_request_context", default=LLMRequestContext())
+
+
+@contextmanager
+def llm_request(
+    *,
+    guild_id: Optional[int],
+    priority: LLMPriority,
+    on_position: Optional[PositionCallback] = None,
+) -> Iterator[None]:
+    """Tag every LLM call made inside this block (including spawned tasks) with guild and priority."""
+    token = _request_context.set(LLMRequestContext(guild_id=guild_id, priority=priority, on_position=on_position))
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+def _parse_guild_weights(raw: str) -> dict[str, float]:
+    """`LLM_GUILD_WEIGHTS=123:2,456:0.5`；未列出的 guild 權重為 1。"""
+    weights: dict[str, float] = {}
+    for item in (raw or "").split(","):
+        guild_id, _, weight = item.strip().partition(":")
+        if not guild_id or not weight:
+            continue
+        try:
+            weights[guild_id] = max(0.01, float(weight))
+        except ValueError:
+            logger.warning("Ignoring invalid LLM_GUILD_WEIGHTS entry: %s", item)
+    return weights
+
+
+class _Ticket:
+    __slots__ = ("sort_key", "start_tag", "guild_key", "future", "on_position", "last_position", "cancelled")
+
+    def __init__(
+        self,
+        sort_key: tuple,
+        start_tag: float,
+        guild_key: str,
+        on_position: Optional[PositionCallback],
+    ) -> None:
+        self.sort_key = sort_key
+        self.start_tag = start_tag
+        self.guild_key = guild_key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.on_position = on_position
+        self.last_position: Optional[int] = None
+        self.cancelled = False
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return self.sort_key < other.sort_key
+
+
+class _BackendQueue:
+    def __init__(self, name: str, max_concurrent: int) -> None:
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.active = 0
+        self.waiting: list[_Ticket] = []
+        self.queued_per_guild: Counter[str] = Counter()
+        self.virtual_time = 0.0
+        self.guild_finish: dict[str, float] = {}
+        self.enqueued = 0
+        self.timed_out = 0
+        self.shed = 0
+        self.peak_waiting = 0
+        self.total_wait = 0.0
+
+
+class LLMScheduler:
+    """Per-backend concurrency limit with priority + per-guild weighted fair queuing.
+
+    每個 backend 各自一組 slot。排不到 slot 的呼叫依 (優先級, WFQ finish tag) 排隊：
+    同一 guild 連續送出的請求 finish tag 會往後推，其他 guild 的請求因此能插到前面。
+    排隊過長（整體或單一 guild）時直接拒絕，而不是讓請求無限等待。
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, int],
+        *,
+        max_queue: int = LLM_MAX_QUEUE,
+        max_queue_per_guild: int = LLM_MAX_QUEUE_PER_GUILD,
+        guild_weights: Optional[dict[str, float]] = None,
+    ) -> None:
+        self.limits = dict(limits)
+        self.max_queue = max_queue
+        self.max_queue_per_guild = max_queue_per_guild
+        self.guild_weights = guild_weights or {}
+        self.shed = 0
+        self._queues: dict[str, _BackendQueue] = {}
+        self._sequence = itertools.count()
+
+    def _queue(self, backend: str) -> _BackendQueue:
+        queue = self._queues.get(backend)
+        if queue is None:
+            queue = _BackendQueue(backend, self.limits.get(backend, 1))
+            self._queues[backend] = queue
+        return queue
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Current load per backend, for logs and diagnostics."""
+        return {
+            name: {
+                "active": queue.active,
+                "max_concurrent": queue.max_concurrent,
+                "waiting": sum(1 for ticket in queue.waiting if not ticket.cancelled),
+                "waiting_per_guild": dict(+queue.queued_per_guild),
+                "peak_waiting": queue.peak_waiting,
+                "queued_total": queue.enqueued,
+                "timed_out": queue.timed_out,
+                "shed": queue.shed,
+                "avg_wait": queue.total_wait / queue.enqueued if queue.enqueued else 0.0,
+            }
+            for name, queue in self._queues.items()
+        }
+
+    async def run(
+        self,
+        backend: str,
+        factory: Callable[[], Awaitable[T]],
+        *,
+        cost: float = 1.0,
+        max_wait: Optional[float] = None,
+    ) -> T:
+        async with self.slot(backend, cost=cost, max_wait=max_wait):
+            return await factory()
+
+    @asynccontextmanager
+    async def slot(self, backend: str, *, cost: float = 1.0, max_wait: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold one backend slot for the whole block; streaming replies keep it until the stream ends.
+
+        `max_wait` 是排隊的 deadline（秒）：時間內沒排到 slot 就拋出 LLMQueueTimeoutError。
+        """
+        context = _request_context.get()
+        queue = self._queue(backend)
+        guild_key = str(context.guild_id) if context.guild_id is not None else "-"
+        start_tag = max(queue.virtual_time, queue.guild_finish.get(guild_key, 0.0))
+        finish_tag = start_tag + max(cost, 0.01) / self.guild_weights.get(guild_key, 1.0)
+
+        waiting = sum(1 for ticket in queue.waiting if not ticket.cancelled)
+        if queue.active < queue.max_concurrent and not waiting:
+            queue.guild_finish[guild_key] = finish_tag
+            queue.virtual_time = max(queue.virtual_time, start_tag)
+            queue.active += 1
+        else:
+            if waiting >= self.max_queue or queue.queued_per_guild[guild_key] >= self.max_queue_per_guild:
+                self.shed += 1
+                queue.shed += 1
+                logger.warning(
+                    "Shedding %s LLM call for guild %s (waiting=%s, guild waiting=%s, shed total=%s)",
+                    backend,
+                    guild_key,
+                    waiting,
+                    queue.queued_per_guild[guild_key],
+                    self.shed,
+                )
+                raise LLMOverloadedError(f"{backend} LLM queue is full")
+            queue.guild_finish[guild_key] = finish_tag
+            await self._wait_for_slot(queue, context, guild_key, start_tag, finish_tag, max_wait)
+
+        try:
+            yield
+        finally:
+            queue.active -= 1
+            self._dispatch(queue)
+
+    async def _wait_for_slot(
+        self,
+        queue: _BackendQueue,
+        context: LLMRequestContext,
+        guild_key: str,
+        start_tag: float,
+        finish_tag: float,
+        max_wait: Optional[float],
+    ) -> None:
+        ticket = _Ticket(
+            (int(context.priority), finish_tag, next(self._sequence)),
+            start_tag,
+            guild_key,
+            context.on_position,
+        )
+        heapq.heappush(queue.waiting, ticket)
+        queue.queued_per_guild[guild_key] += 1
+        queue.enqueued += 1
+        queue.peak_waiting = max(queue.peak_waiting, sum(1 for waiting in queue.waiting if not waiting.cancelled))
+        loop = asyncio.get_running_loop()
+        enqueued_at = loop.time()
+        self._dispatch(queue)
+        try:
+            if max_wait is None:
+                await ticket.future
+            else:
+                await asyncio.wait_for(ticket.future, max_wait)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as exc:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # slot 已經分配給這張票，呼叫端卻被取消了：把 slot 交給下一位。
+                queue.active -= 1
+                self._dispatch(queue)
+            else:
+                ticket.cancelled = True
+                queue.queued_per_guild[guild_key] -= 1
+                self._publish_positions(queue)
+            if isinstance(exc, asyncio.TimeoutError):
+                queue.timed_out += 1
+                logger.warning(
+                    "%s LLM call for guild %s waited %.1fs without a slot; giving up",
+                    queue.name,
+                    guild_key,
+                    max_wait,
+                )
+                raise LLMQueueTimeoutError(f"{queue.name} LLM queue wait exceeded {max_wait}s") from None
+            raise
+        finally:
+            queue.total_wait += loop.time() - enqueued_at
+
+    def _dispatch(self, queue: _BackendQueue) -> None:
+        while queue.waiting and queue.active < queue.max_concurrent:
+            ticket = heapq.heappop(queue.waiting)
+            # future 可能已被 wait_for / 呼叫端取消，但 except 區塊還沒來得及標記。
+            if ticket.cancelled or ticket.future.done():
+                continue
+            queue.queued_per_guild[ticket.guild_key] -= 1
+            queue.virtual_time = max(queue.virtual_time, ticket.start_tag)
+            queue.active += 1
+            ticket.future.set_result(None)
+            self._notify(ticket, None)
+        self._publish_positions(queue)
+
+    def _publish_positions(self, queue: _BackendQueue) -> None:
+        live = sorted(ticket for ticket in queue.waiting if not ticket.cancelled)
+        for position, ticket in enumerate(live):
+            if ticket.last_position != position:
+                ticket.last_position = position
+                self._notify(ticket, position)
+
+    @staticmethod
+    def _notify(ticket: _Ticket, position: Optional[int]) -> None:
+        if ticket.on_position is None:
+            return
+        # 只有曾經排過隊的請求才需要「輪到你了」的通知。
+        if position is None and ticket.last_position is None:
+            return
+        task = asyncio.ensure_future(ticket.on_position(position))
+        task.add_done_callback(_log_callback_error)
+
+
+def _log_callback_error(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("LLM queue position callback failed: %s", task.exception())
+
+
+def interaction_queue_notifier(interaction: Any, *, min_interval: float = LLM_QUEUE_UPDATE_INTERVAL) -> PositionCallback:
+    """Edit the deferred interaction with the caller's live queue position.
+
+    位置變動太頻繁時最多每 `min_interval` 秒更新一次，避免撞上 Discord 的編輯速率限制；
+    輪到時（position=None）一定會更新一次。
+    """
+    last_sent = 0.0
+
+    async def notify(position: Optional[int]) -> None:
+        nonlocal last_sent
+        now = asyncio.get_running_loop().time()
+        if position is not None and now - last_sent < min_interval:
+            return
+        last_sent = now
+        if position is None:
+            content = "⏳ 輪到你了，SERN 正在處理…"
+        else:
+            content = f"⏳ 排隊中，前面還有 {position} 個請求…"
+        await interaction.edit_original_response(content=content)
+
+    return notify
+
+
+llm_scheduler = LLMScheduler(
+    {
+        "gemini": int(os.getenv("LLM_MAX_CONCURRENCY_GEMINI", "4")),
+        "local": int(os.getenv("LLM_MAX_CONCURRENCY_LOCAL", "1")),
+    },
+    guild_weights=_parse_guild_weights(os.getenv("LLM_GUILD_WEIGHTS", "")),
+)
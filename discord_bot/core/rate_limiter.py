@@ -0,0 +1,154 @@
+"""Process-wide requests-per-minute / tokens-per-minute limiter for API quotas."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger("discord_digest_bot")
+
+
+class RateLimitExceededError(RuntimeError):
+    """Raised when quota will not free up before the caller's deadline."""
+
+
+class _Bucket:
+    __slots__ = ("capacity", "rate", "level")
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def refill(self, elapsed: float) -> None:
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + elapsed * self.rate)
+
+    def wait_for(self, amount: float) -> float:
+        if self.unlimited:
+            return 0.0
+        # 單筆超過整個桶的請求最多等到桶滿，不會永遠排不到。
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self.level -= amount
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute, plus a pause for server retry hints.
+
+    - 呼叫端依序（FIFO）取得額度；額度不足時等待補充，而不是直接失敗
+    - 預估等待時間超過 `max_wait`（或呼叫端指定的 deadline）就拋出 RateLimitExceededError
+    - 收到 429 時以 `pause()` 暫停整個桶，所有共用這個 limiter 的呼叫都會一起退讓
+    - rpm / tpm 設為 0 表示不限制
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_wait: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        self.name = name
+        self.max_wait = max_wait
+        self.waited = 0
+        self.rejected = 0
+        self.pauses = 0
+        self._requests = _Bucket(requests_per_minute)
+        self._tokens = _Bucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> float:
+        now = self._clock()
+        elapsed = max(0.0, now - self._updated)
+        self._updated = now
+        self._requests.refill(elapsed)
+        self._tokens.refill(elapsed)
+        return now
+
+    def _wait_time(self, now: float, tokens: float) -> float:
+        return max(self._paused_until - now, self._requests.wait_for(1), self._tokens.wait_for(tokens))
+
+    async def acquire(self, tokens: float = 0, *, max_wait: Optional[float] = None) -> None:
+        """Wait for one request plus `tokens` of quota, or raise if that takes longer than `max_wait`."""
+        deadline = self._clock() + (self.max_wait if max_wait is None else max_wait)
+        try:
+            await asyncio.wait_for(self._lock.acquire(), max(0.0, deadline - self._clock()))
+        except asyncio.TimeoutError:
+            self._reject(tokens)
+        try:
+            waited = False
+            while True:
+                now = self._refill()
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    break
+                if now + wait > deadline:
+                    self._reject(tokens)
+                if not waited:
+                    waited = True
+                    self.waited += 1
+                    logger.info("%s rate limiter: waiting %.1fs for quota", self.name, wait)
+                await self._sleep(wait)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+        finally:
+            self._lock.release()
+
+    def try_acquire(self, tokens: float = 0) -> bool:
+        """Take quota only if it is available right now; used for optional extra requests such as hedges."""
+        if self._lock.locked():
+            return False
+        now = self._refill()
+        if self._wait_time(now, tokens) > 0:
+            return False
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        return True
+
+    def _reject(self, tokens: float) -> None:
+        self.rejected += 1
+        logger.warning("%s rate limiter: no quota for %s tokens before the deadline", self.name, tokens)
+        raise RateLimitExceededError(f"{self.name} quota exhausted")
+
+    def adjust(self, tokens: float) -> None:
+        """Correct the token bucket once the real usage of a request is known."""
+        self._refill()
+        self._tokens.take(tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out quota for `seconds` (e.g. a 429 retry-after hint)."""
+        until = self._clock() + max(0.0, seconds)
+        if until > self._paused_until:
+            self._paused_until = until
+            self.pauses += 1
+            logger.warning("%s rate limiter paused for %.1fs", self.name, seconds)
+
+    def paused_for(self) -> float:
+        return max(0.0, self._paused_until - self._clock())
+
+    def snapshot(self) -> dict[str, Any]:
+        self._refill()
+        return {
+            "requests_available": None if self._requests.unlimited else round(self._requests.level, 2),
+            "tokens_available": None if self._tokens.unlimited else round(self._tokens.level),
+            "paused_for": self.paused_for(),
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "pauses": self.pauses,
+        }
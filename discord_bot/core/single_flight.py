@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+logger = logging.getLogger("discord_digest_bot")
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight task.
+
+    後到的呼叫直接等待同一個 task 的結果；task 以 shield 保護，
+    單一呼叫端被取消（例如 interaction 逾時）不會中斷其他人正在等的結果。
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.calls = 0
+        self.deduplicated = 0
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+            logger.info(
+                "Single-flight %s joined in-flight request %s (deduplicated %s of %s calls)",
+                self.name,
+                key,
+                self.deduplicated,
+                self.calls,
+            )
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有呼叫端都已取消時仍要取走例外，避免 "exception was never retrieved"。
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("Single-flight %s request %s failed: %s", self.name, key, task.exception())
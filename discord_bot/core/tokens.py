@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import re
+
+# CJK、假名、全形符號大多一字一 token；其他文字以約 4 字元一 token 估算。
+_WIDE_CHAR_PATTERN = re.compile(r"[⺀-鿿가-힯豈-﫿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for prompt budgeting without pulling in a tokenizer."""
+    if not text:
+        return 0
+    wide = len(_WIDE_CHAR_PATTERN.findall(text))
+    narrow = len(text) - wide
+    return wide + (narrow + 3) // 4
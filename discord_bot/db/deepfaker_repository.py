@@ -2,24 +2,43 @@ from __future__ import annotations
 
 import logging
 import os
-import sqlite3
-from typing import Any, Optional
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
 
+from .postgres_pool import postgres_pool
 from .schema import (
     CREATE_DEEPFAKER_EVENT_INDEXES_SQL,
     DEEPFAKER_EVENT_COLUMNS,
     POSTGRES_CREATE_DEEPFAKER_EVENTS_SQL,
     SQLITE_CREATE_DEEPFAKER_EVENTS_SQL,
 )
+from .sqlite_engine import SQLiteEngine, sqlite_engine
+from .write_behind import WriteBehindQueue
 
 logger = logging.getLogger("discord_digest_bot")
 
+_POSTGRES_SCHEMA = ("deepfaker_events", (POSTGRES_CREATE_DEEPFAKER_EVENTS_SQL, *CREATE_DEEPFAKER_EVENT_INDEXES_SQL))
+
 try:
     import psycopg2
+    import psycopg2.extras
 except ImportError:  # pragma: no cover - depends on runtime extras
     psycopg2 = None
 
 
+def _matches_schema(record: dict[str, Any]) -> bool:
+    unknown_columns = set(record) - set(DEEPFAKER_EVENT_COLUMNS)
+    missing_columns = set(DEEPFAKER_EVENT_COLUMNS) - set(record)
+    if unknown_columns or missing_columns:
+        logger.error(
+            "DeepFaker event 欄位不符 schema，missing=%s unknown=%s",
+            sorted(missing_columns),
+            sorted(unknown_columns),
+        )
+        return False
+    return True
+
+
 class DeepFakerRepository:
     """Persist append-only DeepFaker events behind one small interface."""
 
@@ -27,9 +46,10 @@ class DeepFakerRepository:
         self.db_type = (os.getenv("DB_TYPE", "sqlite") or "sqlite").lower()
         self.db_enabled = True
         self.placeholder = "?"
+        self.engine: Optional[SQLiteEngine] = None
         self.conn: Optional[Any] = None
-        self.cursor: Optional[Any] = None
         self._initialized = False
+        self.writes = WriteBehindQueue("deepfaker_events", self.insert_events)
 
     def init(self) -> bool:
         if self._initialized:
@@ -53,74 +73,86 @@ class DeepFakerRepository:
             logger.error("psycopg2 未安裝，無法初始化 DeepFaker 紀錄表")
             self.db_enabled = False
             return
-        database_url = os.getenv("DATABASE_URL")
-        if not database_url:
+        if not postgres_pool.is_configured():
             logger.error("使用 PostgreSQL 但未設定 DATABASE_URL，停用 DeepFaker 紀錄寫入")
             self.db_enabled = False
             return
 
+        self.placeholder = "%s"
         try:
-            self.conn = psycopg2.connect(database_url, connect_timeout=5)
-            self.cursor = self.conn.cursor()
-            self.cursor.execute(POSTGRES_CREATE_DEEPFAKER_EVENTS_SQL)
-            for index_sql in CREATE_DEEPFAKER_EVENT_INDEXES_SQL:
-                self.cursor.execute(index_sql)
-            self.conn.commit()
-            self.placeholder = "%s"
+            with postgres_pool.connection(schema=_POSTGRES_SCHEMA):
+                pass
             logger.info("DeepFaker PostgreSQL 紀錄表初始化完成")
         except Exception as exc:
-            logger.error("DeepFaker PostgreSQL 紀錄表初始化失敗: %s", exc, exc_info=True)
-            self.db_enabled = False
+            logger.error("DeepFaker PostgreSQL 紀錄表初始化失敗，之後寫入時會重試: %s", exc)
 
     def _init_sqlite(self) -> None:
         sqlite_path = os.getenv("SQLITE_PATH", "summaries.db")
         try:
-            self.conn = sqlite3.connect(sqlite_path)
-            self.cursor = self.conn.cursor()
-            self.cursor.execute(SQLITE_CREATE_DEEPFAKER_EVENTS_SQL)
-            for index_sql in CREATE_DEEPFAKER_EVENT_INDEXES_SQL:
-                self.cursor.execute(index_sql)
-            self.conn.commit()
+            self.engine = sqlite_engine(sqlite_path)
+            with self.engine.writer() as conn:
+                conn.execute(SQLITE_CREATE_DEEPFAKER_EVENTS_SQL)
+                for index_sql in CREATE_DEEPFAKER_EVENT_INDEXES_SQL:
+                    conn.execute(index_sql)
+                conn.commit()
+            self.conn = self.engine.conn
             self.placeholder = "?"
             logger.info("DeepFaker SQLite 紀錄表初始化完成 (%s)", sqlite_path)
         except Exception as exc:
             logger.error("DeepFaker SQLite 紀錄表初始化失敗: %s", exc, exc_info=True)
             self.db_enabled = False
 
+    @contextmanager
+    def _connection(self) -> Iterator[Any]:
+        if self.db_type == "postgres":
+            with postgres_pool.connection(schema=_POSTGRES_SCHEMA) as conn:
+                yield conn
+        else:
+            with self.engine.writer() as conn:
+                yield conn
+
     def insert_event(self, record: dict[str, Any]) -> bool:
         if not self.init():
             logger.warning("insert_event: DeepFaker DB unavailable，跳過寫入")
             return False
-
-        unknown_columns = set(record) - set(DEEPFAKER_EVENT_COLUMNS)
-        missing_columns = set(DEEPFAKER_EVENT_COLUMNS) - set(record)
-        if unknown_columns or missing_columns:
-            logger.error(
-                "DeepFaker event 欄位不符 schema，missing=%s unknown=%s",
-                sorted(missing_columns),
-                sorted(unknown_columns),
-            )
+        if not _matches_schema(record):
             return False
 
-        columns = list(DEEPFAKER_EVENT_COLUMNS)
-        values = [record[column] for column in columns]
-        placeholders = ",".join([self.placeholder] * len(columns))
-        sql = f"INSERT INTO deepfaker_events ({','.join(columns)}) VALUES ({placeholders});"
         try:
-            self.cursor.execute(sql, values)
-            self.conn.commit()
+            self.insert_events([record])
             return True
         except Exception as exc:
             logger.error("DeepFaker event 寫入失敗: %s", exc, exc_info=True)
-            try:
-                self.conn.rollback()
-            except Exception:
-                logger.debug("DeepFaker DB rollback 失敗", exc_info=True)
             return False
 
+    def insert_events(self, records: list[dict[str, Any]]) -> None:
+        """在同一個 transaction 內寫入多筆 event；失敗時 rollback 並拋出例外。"""
+        if not self.init():
+            logger.warning("insert_events: DeepFaker DB unavailable，跳過 %s 筆寫入", len(records))
+            return
+
+        columns = list(DEEPFAKER_EVENT_COLUMNS)
+        rows = [[record[column] for column in columns] for record in records]
+        placeholders = ",".join([self.placeholder] * len(columns))
+        sql = f"INSERT INTO deepfaker_events ({','.join(columns)}) VALUES ({placeholders});"
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if self.db_type == "postgres":
+                psycopg2.extras.execute_batch(cursor, sql, rows)
+            else:
+                cursor.executemany(sql, rows)
+            conn.commit()
+
+    async def insert_event_async(self, record: dict[str, Any]) -> bool:
+        """檢查欄位後交給 write-behind queue 批次寫入；回傳值只代表是否已排入佇列。"""
+        if not _matches_schema(record):
+            return False
+        await self.writes.submit(dict(record))
+        return True
+
     @property
     def _ready(self) -> bool:
-        return self.db_enabled and self.cursor is not None and self.conn is not None
+        return self.db_enabled and (self.db_type == "postgres" or self.conn is not None)
 
 
 deepfaker_repository = DeepFakerRepository()
@@ -0,0 +1,165 @@
+"""Dedicated DB threads so sqlite3 / psycopg2 calls never block the Discord event loop."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+logger = logging.getLogger("discord_digest_bot")
+
+T = TypeVar("T")
+
+# 單次 DB 呼叫超過這個秒數會記一筆 warning（原本這段時間整個 event loop 都會卡住）。
+DB_SLOW_CALL_SECONDS = float(os.getenv("DB_SLOW_CALL_SECONDS", "0.5"))
+# 唯讀查詢另開的 thread 數；SQLite 走 engine 的 reader 連線、PostgreSQL 從 pool 借，不必排在寫入後面。
+DB_READER_THREADS = int(os.getenv("DB_READER_THREADS", "2"))
+_RECENT_SAMPLES = 256
+
+
+class DBCallStats:
+    """Per-operation timings: `elapsed` is time spent inside the driver, `queued` time waiting for the thread."""
+
+    __slots__ = ("label", "calls", "errors", "total_elapsed", "max_elapsed", "total_queued", "recent")
+
+    def __init__(self, label: str) -> None:
+        self.label = label
+        self.calls = 0
+        self.errors = 0
+        self.total_elapsed = 0.0
+        self.max_elapsed = 0.0
+        self.total_queued = 0.0
+        self.recent: deque[float] = deque(maxlen=_RECENT_SAMPLES)
+
+    def record(self, elapsed: float, queued: float, failed: bool) -> None:
+        self.calls += 1
+        self.errors += int(failed)
+        self.total_elapsed += elapsed
+        self.max_elapsed = max(self.max_elapsed, elapsed)
+        self.total_queued += queued
+        self.recent.append(elapsed)
+
+    def snapshot(self) -> dict[str, Any]:
+        ordered = sorted(self.recent)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_elapsed / self.calls * 1000, 2) if self.calls else 0.0,
+            "p95_ms": round(p95 * 1000, 2),
+            "max_ms": round(self.max_elapsed * 1000, 2),
+            "total_ms": round(self.total_elapsed * 1000, 1),
+            "avg_queue_ms": round(self.total_queued / self.calls * 1000, 2) if self.calls else 0.0,
+        }
+
+
+class DBExecutor:
+    """Run blocking repository calls on dedicated DB threads and time each of them.
+
+    - 寫入只用一條 thread，與 SQLite engine 的單一 writer 對齊；`run_read()` 的唯讀查詢改走
+      `reader_threads` 條 reader thread，不會被 write-behind 的批次寫入擋住
+    - 每個 `label` 記錄呼叫次數、driver 內耗時（p95 / max）與排隊時間，`snapshot()` 供 log 與壓測報表使用
+    - `shutdown()` 之後的呼叫改在呼叫端直接執行，關機途中的最後幾筆寫入不會遺失
+    """
+
+    def __init__(
+        self,
+        *,
+        slow_call_seconds: float = DB_SLOW_CALL_SECONDS,
+        thread_name: str = "discord-db",
+        reader_threads: int = DB_READER_THREADS,
+    ) -> None:
+        self.slow_call_seconds = slow_call_seconds
+        self.thread_name = thread_name
+        self.reader_threads = max(0, reader_threads)
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self._stats: dict[str, DBCallStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.thread_name)
+        return self._executor
+
+    def _ensure_read_executor(self) -> ThreadPoolExecutor:
+        if self.reader_threads == 0:
+            return self._ensure_executor()
+        if self._read_executor is None:
+            self._read_executor = ThreadPoolExecutor(
+                max_workers=self.reader_threads, thread_name_prefix=f"{self.thread_name}-read"
+            )
+        return self._read_executor
+
+    async def run(self, label: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Await `fn(*args, **kwargs)` executed on the DB thread."""
+        return await self._submit(self._ensure_executor, label, fn, args, kwargs)
+
+    async def run_read(self, label: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Await a read-only `fn` on a reader thread; `fn` must not write or share a connection with writers."""
+        return await self._submit(self._ensure_read_executor, label, fn, args, kwargs)
+
+    async def _submit(
+        self,
+        executor: Callable[[], ThreadPoolExecutor],
+        label: str,
+        fn: Callable[..., T],
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+    ) -> T:
+        submitted = time.perf_counter()
+
+        def call() -> T:
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self._record(label, time.perf_counter() - started, started - submitted, failed)
+
+        if self._closed:
+            return call()
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor(), call)
+        finally:
+            self.pending -= 1
+
+    def _record(self, label: str, elapsed: float, queued: float, failed: bool) -> None:
+        with self._stats_lock:
+            stats = self._stats.get(label)
+            if stats is None:
+                stats = self._stats[label] = DBCallStats(label)
+            stats.record(elapsed, queued, failed)
+        if elapsed >= self.slow_call_seconds:
+            logger.warning("Slow DB call %s took %.0f ms (queued %.0f ms)", label, elapsed * 1000, queued * 1000)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._stats_lock:
+            operations = {label: stats.snapshot() for label, stats in sorted(self._stats.items())}
+        return {"pending": self.pending, "operations": operations}
+
+    def shutdown(self) -> None:
+        """Finish queued calls and stop the thread."""
+        self._closed = True
+        for attr in ("_read_executor", "_executor"):
+            executor = getattr(self, attr)
+            if executor is not None:
+                executor.shutdown(wait=True)
+                setattr(self, attr, None)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.shutdown)
+        logger.info("DB executor stopped: %s", self.snapshot())
+
+
+db_executor = DBExecutor()
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+from .executor import db_executor
+from .schema import (
+    CREATE_ARCHIVED_MESSAGE_INDEXES_SQL,
+    SQLITE_CREATE_ARCHIVE_COVERAGE_SQL,
+    SQLITE_CREATE_ARCHIVED_MESSAGES_SQL,
+)
+from .sqlite_engine import SQLiteEngine, sqlite_engine
+
+logger = logging.getLogger("discord_digest_bot")
+
+# Discord snowflake epoch；代表「整個頻道歷史都已封存」時使用的 coverage 下限。
+ARCHIVE_EPOCH = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+
+def _env_enabled(name: str, default: str = "1") -> bool:
+    raw = (os.getenv(name, default) or "").strip().lower()
+    return raw in {"1", "true", "yes", "on", "enabled"}
+
+
+def _default_archive_path() -> str:
+    """封存庫預設放在 summaries.db 旁邊，避免跟 summaries 搶同一個 writer lock。"""
+    sqlite_path = os.getenv("SQLITE_PATH", "summaries.db")
+    return os.path.join(os.path.dirname(sqlite_path), "message_archive.db")
+
+
+def _to_db_time(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _from_db_time(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+@dataclass(frozen=True)
+class ArchivedAuthor:
+    name: str
+    display_name: str
+    bot: bool = False
+
+
+@dataclass(frozen=True)
+class ArchivedMessage:
+    """封存訊息；欄位形狀對齊 `format_message_history` 會讀取的 discord.Message 屬性。"""
+
+    id: int
+    channel_id: int
+    guild_id: Optional[int]
+    author: ArchivedAuthor
+    content: str
+    created_at: datetime
+
+    @classmethod
+    def from_message(cls, message: Any) -> "ArchivedMessage":
+        author = message.author
+        guild = getattr(message, "guild", None)
+        return cls(
+            id=int(message.id),
+            channel_id=int(message.channel.id),
+            guild_id=int(guild.id) if guild is not None else None,
+            author=ArchivedAuthor(
+                name=str(author.name),
+                display_name=str(getattr(author, "display_name", None) or author.name),
+            ),
+            content=message.content or "",
+            created_at=message.created_at,
+        )
+
+
+class MessageArchiveRepository:
+    """Local SQLite store of non-bot channel messages kept current by gateway events.
+
+    `archive_coverage` 記錄每個頻道「從哪個時間點之後的訊息已完整封存」。
+    每次新的 gateway session 開始時 coverage 會重設，因為斷線期間的事件無法保證收到。
+    """
+
+    def __init__(self, *, prune_every: int = 1000) -> None:
+        self.enabled = _env_enabled("MESSAGE_ARCHIVE_ENABLED")
+        self.sqlite_path = os.getenv("MESSAGE_ARCHIVE_PATH") or _default_archive_path()
+        self.retention = timedelta(days=float(os.getenv("MESSAGE_ARCHIVE_RETENTION_DAYS", "8")))
+        self.prune_every = prune_every
+        self.engine: Optional[SQLiteEngine] = None
+        self.session_started_at: Optional[datetime] = None
+        self._initialized = False
+        self._writes_since_prune = 0
+
+    def init(self) -> bool:
+        if self._initialized:
+            return self._ready
+
+        self._initialized = True
+        self.enabled = _env_enabled("MESSAGE_ARCHIVE_ENABLED")
+        self.sqlite_path = os.getenv("MESSAGE_ARCHIVE_PATH") or _default_archive_path()
+        if not self.enabled:
+            logger.info("Message archive disabled by MESSAGE_ARCHIVE_ENABLED")
+            return False
+
+        try:
+            self.engine = sqlite_engine(self.sqlite_path)
+            with self.engine.writer() as conn:
+                conn.execute(SQLITE_CREATE_ARCHIVED_MESSAGES_SQL)
+                conn.execute(SQLITE_CREATE_ARCHIVE_COVERAGE_SQL)
+                for index_sql in CREATE_ARCHIVED_MESSAGE_INDEXES_SQL:
+                    conn.execute(index_sql)
+                conn.commit()
+            logger.info("Message archive SQLite 初始化完成 (%s)", self.sqlite_path)
+        except Exception as exc:
+            logger.error("Message archive SQLite 初始化失敗，已停用封存: %s", exc, exc_info=True)
+            self.enabled = False
+            self.engine = None
+        return self._ready
+
+    def close(self) -> None:
+        # engine 可能與其他 repository 共用（MESSAGE_ARCHIVE_PATH 指向 SQLITE_PATH 時），由 shutdown 統一關閉。
+        self.engine = None
+        self._initialized = False
+        self.session_started_at = None
+
+    def start_session(self, started_at: Optional[datetime] = None) -> None:
+        """Reset coverage when listeners begin receiving a fresh gateway session."""
+        if not self.init():
+            return
+        self.session_started_at = started_at or datetime.now(timezone.utc)
+        try:
+            with self.engine.writer() as conn:
+                conn.execute("DELETE FROM archive_coverage;")
+                conn.commit()
+        except Exception as exc:
+            logger.error("重設 message archive coverage 失敗: %s", exc, exc_info=True)
+        self.prune(now=self.session_started_at)
+
+    def covered_from(self, channel_id: int) -> Optional[datetime]:
+        """Return the instant after which the archive holds every non-bot message of the channel."""
+        if self.session_started_at is None or not self.init():
+            return None
+        try:
+            with self.engine.reader() as conn:
+                row = conn.execute(
+                    "SELECT covered_from FROM archive_coverage WHERE channel_id = ?;",
+                    (int(channel_id),),
+                ).fetchone()
+        except Exception as exc:
+            logger.error("讀取 message archive coverage 失敗: %s", exc, exc_info=True)
+            return None
+        if row is None:
+            return self.session_started_at
+        return _from_db_time(row[0])
+
+    def extend_coverage(self, channel_id: int, covered_from: datetime) -> None:
+        """Move a channel's coverage lower bound earlier after a successful backfill."""
+        current = self.covered_from(channel_id)
+        if current is None or covered_from >= current:
+            return
+        try:
+            with self.engine.writer() as conn:
+                conn.execute(
+                    "INSERT INTO archive_coverage (channel_id, covered_from) VALUES (?, ?) "
+                    "ON CONFLICT(channel_id) DO UPDATE SET covered_from = excluded.covered_from;",
+                    (int(channel_id), _to_db_time(covered_from)),
+                )
+                conn.commit()
+        except Exception as exc:
+            logger.error("更新 message archive coverage 失敗: %s", exc, exc_info=True)
+
+    def store_message(self, message: Any) -> bool:
+        return self._store_record(ArchivedMessage.from_message(message))
+
+    def update_content(self, message_id: int, content: str) -> bool:
+        if not self.init():
+            return False
+        try:
+            with self.engine.writer() as conn:
+                conn.execute(
+                    "UPDATE archived_messages SET content = ? WHERE message_id = ?;",
+                    (content, int(message_id)),
+                )
+                conn.commit()
+            return True
+        except Exception as exc:
+            logger.error("更新封存訊息失敗: %s", exc, exc_info=True)
+            return False
+
+    def delete_messages(self, message_ids: Iterable[int]) -> int:
+        if not self.init():
+            return 0
+        ids = [(int(message_id),) for message_id in message_ids]
+        try:
+            with self.engine.writer() as conn:
+                cursor = conn.executemany("DELETE FROM archived_messages WHERE message_id = ?;", ids)
+                conn.commit()
+            return cursor.rowcount
+        except Exception as exc:
+            logger.error("刪除封存訊息失敗: %s", exc, exc_info=True)
+            return 0
+
+    def replace_range(
+        self,
+        channel_id: int,
+        *,
+        after: datetime,
+        before: datetime,
+        messages: Iterable[ArchivedMessage],
+    ) -> bool:
+        """Swap the archived rows strictly between `after` and `before` for freshly fetched ones."""
+        if not self.init():
+            return False
+        # 刪除與重新寫入要在同一個 writer 區段內，中間不能插入其他寫入的 commit。
+        with self.engine.writer() as conn:
+            try:
+                conn.execute(
+                    "DELETE FROM archived_messages WHERE channel_id = ? AND created_at > ? AND created_at < ?;",
+                    (int(channel_id), _to_db_time(after), _to_db_time(before)),
+                )
+            except Exception as exc:
+                logger.error("清除封存訊息區間失敗: %s", exc, exc_info=True)
+                conn.rollback()
+                return False
+            return self._insert_many(messages)
+
+    def fetch_recent(
+        self,
+        channel_id: int,
+        *,
+        after: Optional[datetime] = None,
+        limit: int,
+    ) -> list[ArchivedMessage]:
+        """Return archived messages newer than `after`, newest first like `channel.history()`."""
+        if not self.init():
+            return []
+        sql = (
+            "SELECT message_id, channel_id, guild_id, author_name, author_display_name, content, created_at "
+            "FROM archived_messages WHERE channel_id = ?"
+        )
+        params: list[Any] = [int(channel_id)]
+        if after is not None:
+            sql += " AND created_at > ?"
+            params.append(_to_db_time(after))
+        sql += " ORDER BY message_id DESC LIMIT ?;"
+        params.append(int(limit))
+        try:
+            with self.engine.reader() as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except Exception as exc:
+            logger.error("讀取封存訊息失敗: %s", exc, exc_info=True)
+            return []
+        return [
+            ArchivedMessage(
+                id=message_id,
+                channel_id=row_channel_id,
+                guild_id=guild_id,
+                author=ArchivedAuthor(name=author_name, display_name=author_display_name),
+                content=content,
+                created_at=_from_db_time(created_at),
+            )
+            for message_id, row_channel_id, guild_id, author_name, author_display_name, content, created_at in rows
+        ]
+
+    def prune(self, *, now: Optional[datetime] = None) -> int:
+        """Drop messages past retention and raise coverage so it never claims pruned history."""
+        if not self.init():
+            return 0
+        cutoff = _to_db_time((now or datetime.now(timezone.utc)) - self.retention)
+        try:
+            with self.engine.writer() as conn:
+                cursor = conn.execute("DELETE FROM archived_messages WHERE created_at < ?;", (cutoff,))
+                conn.execute("UPDATE archive_coverage SET covered_from = ? WHERE covered_from < ?;", (cutoff, cutoff))
+                conn.commit()
+            self._writes_since_prune = 0
+            return cursor.rowcount
+        except Exception as exc:
+            logger.error("清理過期封存訊息失敗: %s", exc, exc_info=True)
+            return 0
+
+    def _insert_many(self, messages: Iterable[ArchivedMessage]) -> bool:
+        rows = [
+            (
+                message.id,
+                message.channel_id,
+                message.guild_id,
+                message.author.name,
+                message.author.display_name,
+                message.content,
+                _to_db_time(message.created_at),
+            )
+            for message in messages
+        ]
+        with self.engine.writer() as conn:
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO archived_messages "
+                    "(message_id, channel_id, guild_id, author_name, author_display_name, content, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                    rows,
+                )
+                conn.commit()
+            except Exception as exc:
+                logger.error("寫入封存訊息失敗: %s", exc, exc_info=True)
+                conn.rollback()
+                return False
+
+        self._writes_since_prune += len(rows)
+        if self._writes_since_prune >= self.prune_every:
+            self.prune()
+        return True
+
+    # 以下為 cog / history helpers 使用的 async 版本，寫入在 DB thread、唯讀查詢在 reader thread 上執行。
+
+    async def start_session_async(self, started_at: Optional[datetime] = None) -> None:
+        await db_executor.run("archive.start_session", self.start_session, started_at)
+
+    async def covered_from_async(self, channel_id: int) -> Optional[datetime]:
+        return await db_executor.run_read("archive.covered_from", self.covered_from, channel_id)
+
+    async def extend_coverage_async(self, channel_id: int, covered_from: datetime) -> None:
+        await db_executor.run("archive.extend_coverage", self.extend_coverage, channel_id, covered_from)
+
+    async def store_message_async(self, message: Any) -> bool:
+        # discord.Message 在 event loop 上先轉成純資料，DB thread 不碰 discord.py 物件。
+        record = ArchivedMessage.from_message(message)
+        return await db_executor.run("archive.store", self._store_record, record)
+
+    async def update_content_async(self, message_id: int, content: str) -> bool:
+        return await db_executor.run("archive.update", self.update_content, message_id, content)
+
+    async def delete_messages_async(self, message_ids: Iterable[int]) -> int:
+        return await db_executor.run("archive.delete", self.delete_messages, list(message_ids))
+
+    async def replace_range_async(
+        self,
+        channel_id: int,
+        *,
+        after: datetime,
+        before: datetime,
+        messages: Iterable[ArchivedMessage],
+    ) -> bool:
+        return await db_executor.run(
+            "archive.replace_range", self.replace_range, channel_id, after=after, before=before, messages=list(messages)
+        )
+
+    async def fetch_recent_async(
+        self,
+        channel_id: int,
+        *,
+        after: Optional[datetime] = None,
+        limit: int,
+    ) -> list[ArchivedMessage]:
+        return await db_executor.run_read("archive.fetch_recent", self.fetch_recent, channel_id, after=after, limit=limit)
+
+    def _store_record(self, record: ArchivedMessage) -> bool:
+        if not self.init():
+            return False
+        return self._insert_many([record])
+
+    @property
+    def _ready(self) -> bool:
+        return self.enabled and self.engine is not None
+
+
+message_archive_repository = MessageArchiveRepository()
@@ -0,0 +1,244 @@
+"""Shared, bounded PostgreSQL connection pool with validation and reconnect backoff."""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+logger = logging.getLogger("discord_digest_bot")
+
+try:
+    import psycopg2
+except ImportError:  # pragma: no cover - depends on runtime extras
+    psycopg2 = None
+
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "4"))
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "10"))
+# 閒置超過這個秒數的連線在借出前先 `SELECT 1`，擋掉被 Render / NAT 靜默切斷的連線。
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))
+DB_POOL_RETRY_SECONDS = float(os.getenv("DB_POOL_RETRY_SECONDS", "1"))
+DB_POOL_RETRY_MAX_SECONDS = float(os.getenv("DB_POOL_RETRY_MAX_SECONDS", "60"))
+
+
+class DatabaseUnavailableError(RuntimeError):
+    """No connection could be checked out (still backing off, or the pool stayed exhausted)."""
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    if isinstance(exc, DatabaseUnavailableError):
+        return True
+    return psycopg2 is not None and isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "last_used")
+
+    def __init__(self, conn: Any, last_used: float) -> None:
+        self.conn = conn
+        self.last_used = last_used
+
+
+class PostgresPool:
+    """Hand out PostgreSQL connections per operation instead of one connection per repository.
+
+    - 最多 `max_size` 條連線；借滿時等待 `checkout_timeout` 秒，仍借不到就拋 DatabaseUnavailableError
+    - 閒置超過 `ping_interval` 的連線借出前先驗證，失效就丟掉重連
+    - 操作中發生連線錯誤時該連線直接丟棄；其他錯誤 rollback 後放回池中
+    - 連線失敗以指數退避（`retry_seconds` ~ `retry_max_seconds`）重試，DB 恢復後自動接回，
+      不會像以前一樣初始化失敗就永久停用
+    - 各 repository 的建表 SQL 以 `schema=(name, statements)` 傳入，每個 pool 只成功執行一次
+    """
+
+    def __init__(
+        self,
+        *,
+        dsn: Optional[str] = None,
+        max_size: int = DB_POOL_MAX_SIZE,
+        checkout_timeout: float = DB_POOL_CHECKOUT_TIMEOUT,
+        ping_interval: float = DB_POOL_PING_INTERVAL,
+        retry_seconds: float = DB_POOL_RETRY_SECONDS,
+        retry_max_seconds: float = DB_POOL_RETRY_MAX_SECONDS,
+        connect: Optional[Callable[..., Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.created = 0
+        self.discarded = 0
+        self.connect_failures = 0
+        self.waits = 0
+        self._connect = connect
+        self._clock = clock
+        self._idle: list[_PooledConnection] = []
+        self._size = 0
+        self._failures = 0
+        self._next_attempt_at = 0.0
+        self._schemas: set[str] = set()
+        self._condition = threading.Condition()
+
+    def database_url(self) -> Optional[str]:
+        return self.dsn or os.getenv("DATABASE_URL")
+
+    def is_configured(self) -> bool:
+        """psycopg2 與 DATABASE_URL 都在才有機會連線；缺任何一個都是設定問題，重試也沒用。"""
+        return (self._connect is not None or psycopg2 is not None) and bool(self.database_url())
+
+    @contextmanager
+    def connection(self, *, schema: Optional[tuple[str, Sequence[str]]] = None) -> Iterator[Any]:
+        """Check out a validated connection for one operation; the caller commits."""
+        pooled = self._checkout()
+        try:
+            if schema is not None:
+                self._ensure_schema(pooled.conn, *schema)
+            yield pooled.conn
+        except BaseException as exc:
+            self._release(pooled, broken=is_connection_error(exc) or bool(getattr(pooled.conn, "closed", 0)))
+            raise
+        else:
+            self._release(pooled, broken=bool(getattr(pooled.conn, "closed", 0)))
+
+    def _checkout(self) -> _PooledConnection:
+        deadline = self._clock() + self.checkout_timeout
+        while True:
+            pooled: Optional[_PooledConnection] = None
+            with self._condition:
+                while True:
+                    if self._idle:
+                        # 借出後才驗證：`SELECT 1` 可能卡在失效的 socket 上，不能佔著 lock。
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        raise DatabaseUnavailableError(f"PostgreSQL pool exhausted ({self.max_size} connections in use)")
+                    self.waits += 1
+                    self._condition.wait(remaining)
+
+            if pooled is None:
+                # 連線建立可能要好幾秒，不佔著 lock，其他 thread 仍可歸還 / 借用既有連線。
+                try:
+                    return _PooledConnection(self._open(), self._clock())
+                except BaseException:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+
+            if self._validate(pooled):
+                return pooled
+            with self._condition:
+                self._discard(pooled)
+                self._condition.notify()
+            _close(pooled.conn)
+
+    def _open(self) -> Any:
+        with self._condition:
+            now = self._clock()
+            if now < self._next_attempt_at:
+                raise DatabaseUnavailableError(f"PostgreSQL reconnect backing off for {self._next_attempt_at - now:.1f}s")
+        connect = self._connect or psycopg2.connect
+        try:
+            conn = connect(self.database_url(), connect_timeout=5)
+        except Exception as exc:
+            with self._condition:
+                self.connect_failures += 1
+                self._failures += 1
+                delay = min(self.retry_seconds * 2 ** (self._failures - 1), self.retry_max_seconds)
+                self._next_attempt_at = self._clock() + delay
+            logger.error("PostgreSQL 連線失敗，%.1f 秒後重試: %s", delay, exc)
+            raise DatabaseUnavailableError("PostgreSQL connection failed") from exc
+        with self._condition:
+            failures = self._failures
+            self._failures = 0
+            self._next_attempt_at = 0.0
+            self.created += 1
+        if failures:
+            logger.info("PostgreSQL 連線恢復（先前失敗 %s 次）", failures)
+        return conn
+
+    def _validate(self, pooled: _PooledConnection) -> bool:
+        if getattr(pooled.conn, "closed", 0):
+            return False
+        if self._clock() - pooled.last_used < self.ping_interval:
+            return True
+        try:
+            cursor = pooled.conn.cursor()
+            cursor.execute("SELECT 1;")
+            cursor.fetchone()
+            pooled.conn.rollback()
+            return True
+        except Exception as exc:
+            logger.warning("PostgreSQL 閒置連線已失效，重新連線: %s", exc)
+            return False
+
+    def _ensure_schema(self, conn: Any, name: str, statements: Sequence[str]) -> None:
+        if name in self._schemas:
+            return
+        cursor = conn.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        conn.commit()
+        self._schemas.add(name)
+        logger.info("PostgreSQL %s 表初始化完成", name)
+
+    def _release(self, pooled: _PooledConnection, *, broken: bool) -> None:
+        if not broken:
+            try:
+                pooled.conn.rollback()
+            except Exception:
+                broken = True
+        with self._condition:
+            if broken:
+                self._discard(pooled)
+            else:
+                pooled.last_used = self._clock()
+                self._idle.append(pooled)
+            self._condition.notify()
+        if broken:
+            _close(pooled.conn)
+
+    def _discard(self, pooled: _PooledConnection) -> None:
+        """Stop counting a connection; the caller holds the condition lock and closes it afterwards."""
+        self._size -= 1
+        self.discarded += 1
+
+    def close(self) -> None:
+        with self._condition:
+            idle, self._idle = self._idle, []
+            for pooled in idle:
+                self._discard(pooled)
+            self._schemas.clear()
+        for pooled in idle:
+            _close(pooled.conn)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._condition:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "created": self.created,
+                "discarded": self.discarded,
+                "connect_failures": self.connect_failures,
+                "waits": self.waits,
+                "backoff_for": round(max(0.0, self._next_attempt_at - self._clock()), 1),
+            }
+
+
+def _close(conn: Any) -> None:
+    try:
+        conn.close()
+    except Exception:
+        logger.debug("關閉 PostgreSQL 連線失敗", exc_info=True)
+
+
+postgres_pool = PostgresPool()
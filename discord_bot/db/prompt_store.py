@@ -0,0 +1,65 @@
+"""Content-addressed, compressed storage format for summary prompt transcripts."""
+from __future__ import annotations
+
+import hashlib
+import zlib
+from dataclasses import dataclass
+from typing import Any, Optional
+
+PROMPT_CODEC = "zlib"
+# 舊資料的 prompt 直接存在 summaries.prompt，讀取時以 plain codec 包成同一個介面。
+PLAIN_CODEC = "plain"
+
+
+def decompress_prompt(codec: str, data: Any) -> str:
+    """Decode one stored prompt; PostgreSQL BYTEA comes back as memoryview."""
+    if codec == PLAIN_CODEC:
+        return data if isinstance(data, str) else bytes(data).decode("utf-8")
+    if codec == PROMPT_CODEC:
+        return zlib.decompress(bytes(data)).decode("utf-8")
+    raise ValueError(f"Unsupported prompt codec: {codec}")
+
+
+@dataclass(frozen=True)
+class CompressedPrompt:
+    """One row of `summary_prompts`."""
+
+    prompt_hash: str
+    codec: str
+    original_length: int
+    data: bytes
+
+    @classmethod
+    def from_text(cls, text: str) -> "CompressedPrompt":
+        raw = text.encode("utf-8")
+        return cls(
+            prompt_hash=hashlib.sha256(raw).hexdigest(),
+            codec=PROMPT_CODEC,
+            original_length=len(text),
+            data=zlib.compress(raw, 6),
+        )
+
+
+class LazyPrompt:
+    """Hold a stored prompt and only decompress it when `.text` is first read."""
+
+    __slots__ = ("codec", "data", "prompt_hash", "_text")
+
+    def __init__(self, codec: str, data: Any, *, prompt_hash: Optional[str] = None) -> None:
+        self.codec = codec
+        self.data = data
+        self.prompt_hash = prompt_hash
+        self._text: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = decompress_prompt(self.codec, self.data)
+        return self._text
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._text is not None else "compressed"
+        return f"LazyPrompt(codec={self.codec!r}, hash={self.prompt_hash!r}, {state})"
@@ -2,32 +2,52 @@ from __future__ import annotations
 
 import logging
 import os
-import sqlite3
-from typing import Any, Optional
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterator, Optional
 
-from .schema import POSTGRES_CREATE_SUMMARIES_SQL, SQLITE_CREATE_SUMMARIES_SQL
+from .executor import db_executor
+from .postgres_pool import postgres_pool
+from .prompt_store import PLAIN_CODEC, CompressedPrompt, LazyPrompt
+from .schema import (
+    POSTGRES_ADD_SUMMARY_PROMPT_HASH_SQL,
+    POSTGRES_CREATE_SUMMARIES_SQL,
+    POSTGRES_CREATE_SUMMARY_PROMPTS_SQL,
+    SQLITE_ADD_SUMMARY_PROMPT_HASH_SQL,
+    SQLITE_CREATE_SUMMARIES_SQL,
+    SQLITE_CREATE_SUMMARY_PROMPTS_SQL,
+)
+from .sqlite_engine import SQLiteEngine, sqlite_engine
+from .write_behind import WriteBehindQueue
 
 logger = logging.getLogger("discord_digest_bot")
 
 try:
     import psycopg2
+    import psycopg2.extras
 except ImportError:  # pragma: no cover - depends on runtime extras
     psycopg2 = None
 
+_POSTGRES_SCHEMA = (
+    "summaries",
+    (POSTGRES_CREATE_SUMMARIES_SQL, POSTGRES_ADD_SUMMARY_PROMPT_HASH_SQL, POSTGRES_CREATE_SUMMARY_PROMPTS_SQL),
+)
+
 
 class SummaryRepository:
     def __init__(self) -> None:
         self.db_type = (os.getenv("DB_TYPE", "sqlite") or "sqlite").lower()
         self.db_enabled = True
         self.placeholder = "?"
+        self.engine: Optional[SQLiteEngine] = None
         self.conn: Optional[Any] = None
-        self.cursor: Optional[Any] = None
         self._initialized = False
+        self.writes = WriteBehindQueue("summaries", self.insert_summaries)
 
     def init(self) -> None:
         """初始化 repository。
 
-        目前只處理 `summaries` 表，啟動後會盡量重用同一個連線。
+        SQLite 與其他 repository 共用同一個 `sqlite_engine`；PostgreSQL 每次操作從共用的 `postgres_pool` 借連線。
         """
         if self._initialized:
             return
@@ -52,57 +72,199 @@ class SummaryRepository:
             self.db_enabled = False
             return
 
-        database_url = os.getenv("DATABASE_URL")
-        if not database_url:
+        if not postgres_pool.is_configured():
             logger.error("使用 PostgreSQL 時，必須設定 DATABASE_URL，停用 DB 寫入")
             self.db_enabled = False
             return
 
+        self.placeholder = "%s"
         try:
-            self.conn = psycopg2.connect(database_url, connect_timeout=5)
-            self.cursor = self.conn.cursor()
-            self.cursor.execute(POSTGRES_CREATE_SUMMARIES_SQL)
-            self.conn.commit()
-            self.placeholder = "%s"
+            with postgres_pool.connection(schema=_POSTGRES_SCHEMA):
+                pass
             logger.info("✅ PostgreSQL 連線及建表成功")
         except Exception as exc:
-            logger.error("❌ PostgreSQL 初始化失敗，已停用 DB 寫入: %s", exc, exc_info=True)
-            self.db_enabled = False
+            # 連線問題交給 pool 退避重連，之後的寫入會再建表，不再永久停用。
+            logger.error("❌ PostgreSQL 初始化失敗，之後寫入時會重試: %s", exc)
 
     def _init_sqlite(self) -> None:
         sqlite_path = os.getenv("SQLITE_PATH", "summaries.db")
         try:
-            self.conn = sqlite3.connect(sqlite_path)
-            self.cursor = self.conn.cursor()
-            self.cursor.execute(SQLITE_CREATE_SUMMARIES_SQL)
-            self.conn.commit()
+            self.engine = sqlite_engine(sqlite_path)
+            with self.engine.writer() as conn:
+                conn.execute(SQLITE_CREATE_SUMMARIES_SQL)
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(summaries);")}
+                if "prompt_hash" not in columns:
+                    conn.execute(SQLITE_ADD_SUMMARY_PROMPT_HASH_SQL)
+                conn.execute(SQLITE_CREATE_SUMMARY_PROMPTS_SQL)
+                conn.commit()
+            self.conn = self.engine.conn
             self.placeholder = "?"
             logger.info("✅ SQLite 連線及建表成功 (%s)", sqlite_path)
         except Exception as exc:
             logger.error("❌ SQLite 初始化失敗，已停用 DB 寫入: %s", exc, exc_info=True)
             self.db_enabled = False
 
+    @contextmanager
+    def _connection(self, *, read_only: bool = False) -> Iterator[Any]:
+        if self.db_type == "postgres":
+            with postgres_pool.connection(schema=_POSTGRES_SCHEMA) as conn:
+                yield conn
+        else:
+            with (self.engine.reader() if read_only else self.engine.writer()) as conn:
+                yield conn
+
+    @property
+    def _ready(self) -> bool:
+        return self.db_enabled and (self.db_type == "postgres" or self.conn is not None)
+
     def insert_summary(self, record: dict) -> None:
         """寫入一筆 summaries record。"""
         self.init()
-        if not self.db_enabled:
+        if not self._ready:
             logger.warning("insert_summary: DB_DISABLED，跳過寫入")
             return
-        if not self.cursor or not self.conn:
-            logger.warning("insert_summary: DB 尚未完成初始化，跳過寫入")
-            return
-
-        cols = list(record.keys())
-        vals = list(record.values())
-        phs = ",".join([self.placeholder] * len(cols))
-        sql = f"INSERT INTO summaries ({','.join(cols)}) VALUES ({phs});"
 
         try:
-            self.cursor.execute(sql, vals)
-            self.conn.commit()
+            self.insert_summaries([record])
             logger.info("✅ summaries 寫入成功")
         except Exception as exc:
             logger.error("❌ summaries 寫入失敗: %s", exc, exc_info=True)
 
+    def insert_summaries(self, records: list[dict]) -> None:
+        """在同一個 transaction 內寫入多筆 summaries；失敗時 rollback 並拋出例外，交給 write-behind queue 重試。
+
+        `prompt` 不再直接寫進 summaries，而是壓縮後以內容 hash 存進 summary_prompts，summaries 只記 `prompt_hash`。
+        """
+        self.init()
+        if not self._ready:
+            logger.warning("insert_summaries: DB 無法使用，跳過 %s 筆寫入", len(records))
+            return
+
+        prompts: dict[str, CompressedPrompt] = {}
+        # 不同指令的 record 欄位不完全相同，依欄位組合分組後各自 executemany。
+        grouped: dict[tuple[str, ...], list[list[Any]]] = {}
+        for record in records:
+            record = dict(record)
+            prompt = record.pop("prompt", None)
+            if prompt:
+                compressed = CompressedPrompt.from_text(str(prompt))
+                prompts.setdefault(compressed.prompt_hash, compressed)
+                record["prompt_hash"] = compressed.prompt_hash
+            elif prompt is not None:
+                record["prompt"] = prompt
+            grouped.setdefault(tuple(record.keys()), []).append(list(record.values()))
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            self._insert_prompts(cursor, prompts.values())
+            for cols, rows in grouped.items():
+                phs = ",".join([self.placeholder] * len(cols))
+                sql = f"INSERT INTO summaries ({','.join(cols)}) VALUES ({phs});"
+                self._executemany(cursor, sql, rows)
+            conn.commit()
+
+    def _insert_prompts(self, cursor: Any, prompts: Any) -> None:
+        rows = [
+            [prompt.prompt_hash, prompt.codec, prompt.original_length, prompt.data, _now()]
+            for prompt in prompts
+        ]
+        if not rows:
+            return
+        phs = ",".join([self.placeholder] * 5)
+        sql = (
+            "INSERT INTO summary_prompts (prompt_hash, codec, original_length, compressed, created_at) "
+            f"VALUES ({phs}) ON CONFLICT (prompt_hash) DO NOTHING;"
+        )
+        self._executemany(cursor, sql, rows)
+
+    def _executemany(self, cursor: Any, sql: str, rows: list[list[Any]]) -> None:
+        if self.db_type == "postgres":
+            # psycopg2 的 executemany 每列一次 round trip，execute_batch 會合併成少數幾次。
+            psycopg2.extras.execute_batch(cursor, sql, rows)
+        else:
+            cursor.executemany(sql, rows)
+
+    async def insert_summary_async(self, record: dict) -> None:
+        """交給 write-behind queue 批次寫入，指令不用等 DB commit。"""
+        await self.writes.submit(dict(record))
+
+    def get_prompt(self, summary_id: int) -> Optional[LazyPrompt]:
+        """Return the prompt of one summary row; it is only decompressed when `.text` is read."""
+        self.init()
+        if not self._ready:
+            return None
+
+        sql = (
+            "SELECT s.prompt, s.prompt_hash, p.codec, p.compressed FROM summaries s "
+            "LEFT JOIN summary_prompts p ON p.prompt_hash = s.prompt_hash "
+            f"WHERE s.id = {self.placeholder};"
+        )
+        try:
+            with self._connection(read_only=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, (int(summary_id),))
+                row = cursor.fetchone()
+        except Exception as exc:
+            logger.error("讀取 summary prompt 失敗: %s", exc, exc_info=True)
+            return None
+        if row is None:
+            return None
+
+        inline_prompt, hash_value, codec, compressed = row
+        if compressed is not None:
+            return LazyPrompt(codec, compressed, prompt_hash=hash_value)
+        if inline_prompt is not None:
+            return LazyPrompt(PLAIN_CODEC, inline_prompt)
+        return None
+
+    def migrate_inline_prompts(self, *, batch_size: int = 100) -> int:
+        """Move up to `batch_size` legacy `summaries.prompt` values into summary_prompts; returns rows moved."""
+        self.init()
+        if not self._ready:
+            return 0
+
+        select_sql = (
+            "SELECT id, prompt FROM summaries "
+            f"WHERE prompt_hash IS NULL AND prompt IS NOT NULL AND prompt <> '' ORDER BY id LIMIT {self.placeholder};"
+        )
+        update_sql = f"UPDATE summaries SET prompt = NULL, prompt_hash = {self.placeholder} WHERE id = {self.placeholder};"
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(select_sql, (int(batch_size),))
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+            prompts = {}
+            updates = []
+            for summary_id, prompt in rows:
+                compressed = CompressedPrompt.from_text(prompt)
+                prompts.setdefault(compressed.prompt_hash, compressed)
+                updates.append([compressed.prompt_hash, summary_id])
+            self._insert_prompts(cursor, prompts.values())
+            self._executemany(cursor, update_sql, updates)
+            conn.commit()
+        return len(rows)
+
+    async def migrate_inline_prompts_async(self, *, batch_size: int = 100) -> int:
+        """分批搬移舊資料，每批各自排進 DB thread，不會長時間佔住寫入。"""
+        moved = 0
+        try:
+            while True:
+                count = await db_executor.run(
+                    "summaries.migrate_prompts", self.migrate_inline_prompts, batch_size=batch_size
+                )
+                if not count:
+                    break
+                moved += count
+        except Exception as exc:
+            logger.error("搬移舊 summaries.prompt 失敗，下次啟動再繼續: %s", exc, exc_info=True)
+        if moved:
+            logger.info("已將 %s 筆舊 summaries.prompt 壓縮搬移到 summary_prompts", moved)
+        return moved
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
 
 summary_repository = SummaryRepository()
@@ -20,7 +20,8 @@ CREATE TABLE IF NOT EXISTS summaries (
     question TEXT,
     prompt TEXT,
     summary TEXT,
-    call_time TEXT
+    call_time TEXT,
+    prompt_hash TEXT
 );
 """
 
@@ -33,7 +34,33 @@ CREATE TABLE IF NOT EXISTS summaries (
     question TEXT,
     prompt TEXT,
     summary TEXT,
-    call_time TIMESTAMPTZ
+    call_time TIMESTAMPTZ,
+    prompt_hash TEXT
+);
+"""
+
+# 舊版 summaries 表沒有 prompt_hash；SQLite 不支援 IF NOT EXISTS，由 repository 先查 PRAGMA table_info。
+POSTGRES_ADD_SUMMARY_PROMPT_HASH_SQL = "ALTER TABLE summaries ADD COLUMN IF NOT EXISTS prompt_hash TEXT;"
+SQLITE_ADD_SUMMARY_PROMPT_HASH_SQL = "ALTER TABLE summaries ADD COLUMN prompt_hash TEXT;"
+
+# prompt transcript 以內容 hash 為 key 壓縮後存一份，同一段歷史重跑指令不會再存第二次。
+SQLITE_CREATE_SUMMARY_PROMPTS_SQL = """
+CREATE TABLE IF NOT EXISTS summary_prompts (
+    prompt_hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    original_length INTEGER NOT NULL,
+    compressed BLOB NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+POSTGRES_CREATE_SUMMARY_PROMPTS_SQL = """
+CREATE TABLE IF NOT EXISTS summary_prompts (
+    prompt_hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    original_length INTEGER NOT NULL,
+    compressed BYTEA NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL
 );
 """
 
@@ -151,3 +178,53 @@ CREATE_DEEPFAKER_EVENT_INDEXES_SQL = (
     "CREATE INDEX IF NOT EXISTS idx_deepfaker_events_target_time "
     "ON deepfaker_events (target_user_id, occurred_at);",
 )
+
+SQLITE_CREATE_ARCHIVED_MESSAGES_SQL = """
+CREATE TABLE IF NOT EXISTS archived_messages (
+    message_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    guild_id INTEGER,
+    author_name TEXT NOT NULL,
+    author_display_name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+SQLITE_CREATE_ARCHIVE_COVERAGE_SQL = """
+CREATE TABLE IF NOT EXISTS archive_coverage (
+    channel_id INTEGER PRIMARY KEY,
+    covered_from TEXT NOT NULL
+);
+"""
+
+CREATE_ARCHIVED_MESSAGE_INDEXES_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_archived_messages_channel_time "
+    "ON archived_messages (channel_id, created_at);",
+)
+
+SQLITE_CREATE_SUMMARY_WATERMARKS_SQL = """
+CREATE TABLE IF NOT EXISTS summary_watermarks (
+    channel_id TEXT NOT NULL,
+    prompt_scope TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    last_message_id TEXT NOT NULL,
+    last_message_at TEXT NOT NULL,
+    window_start TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (channel_id, prompt_scope)
+);
+"""
+
+POSTGRES_CREATE_SUMMARY_WATERMARKS_SQL = """
+CREATE TABLE IF NOT EXISTS summary_watermarks (
+    channel_id TEXT NOT NULL,
+    prompt_scope TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    last_message_id TEXT NOT NULL,
+    last_message_at TIMESTAMPTZ NOT NULL,
+    window_start TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (channel_id, prompt_scope)
+);
+"""
@@ -2,18 +2,22 @@ from __future__ import annotations
 
 import logging
 import os
-import sqlite3
 import time
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 
+from .postgres_pool import postgres_pool
 from .schema import (
     POSTGRES_CREATE_GUILD_SOCIAL_PREVIEW_SETTINGS_SQL,
     SQLITE_CREATE_GUILD_SOCIAL_PREVIEW_SETTINGS_SQL,
 )
+from .sqlite_engine import SQLiteEngine, sqlite_engine
 
 logger = logging.getLogger("discord_digest_bot")
 
+_POSTGRES_SCHEMA = ("guild_social_preview_settings", (POSTGRES_CREATE_GUILD_SOCIAL_PREVIEW_SETTINGS_SQL,))
+
 try:
     import psycopg2
 except ImportError:  # pragma: no cover - depends on runtime extras
@@ -27,8 +31,8 @@ class SocialPreviewSettingsRepository:
         self.db_type = (os.getenv("DB_TYPE", "sqlite") or "sqlite").lower()
         self.db_enabled = True
         self.placeholder = "?"
+        self.engine: Optional[SQLiteEngine] = None
         self.conn: Optional[Any] = None
-        self.cursor: Optional[Any] = None
         self._initialized = False
         self._last_init_attempt: Optional[float] = None
         self.retry_interval_seconds = retry_interval_seconds
@@ -61,22 +65,19 @@ class SocialPreviewSettingsRepository:
             self.db_enabled = False
             return
 
-        database_url = os.getenv("DATABASE_URL")
-        if not database_url:
+        if not postgres_pool.is_configured():
             logger.error("使用 PostgreSQL 但未設定 DATABASE_URL，停用 Social Preview 設定寫入")
             self.db_enabled = False
             return
 
+        self.placeholder = "%s"
         try:
-            self.conn = psycopg2.connect(database_url, connect_timeout=5)
-            self.cursor = self.conn.cursor()
-            self.cursor.execute(POSTGRES_CREATE_GUILD_SOCIAL_PREVIEW_SETTINGS_SQL)
-            self.conn.commit()
-            self.placeholder = "%s"
+            with postgres_pool.connection(schema=_POSTGRES_SCHEMA):
+                pass
             logger.info("Social Preview guild settings PostgreSQL 初始化完成")
         except Exception as exc:
-            logger.error("Social Preview guild settings PostgreSQL 初始化失敗: %s", exc, exc_info=True)
-            self.db_enabled = False
+            # 連線由 postgres_pool 退避重連，這裡不停用，之後的讀寫會再嘗試。
+            logger.error("Social Preview guild settings PostgreSQL 初始化失敗: %s", exc)
 
     def _init_sqlite(self) -> None:
         sqlite_path = os.getenv("SQLITE_PATH", "summaries.db")
@@ -86,10 +87,11 @@ class SocialPreviewSettingsRepository:
             sqlite_path,
         )
         try:
-            self.conn = sqlite3.connect(sqlite_path)
-            self.cursor = self.conn.cursor()
-            self.cursor.execute(SQLITE_CREATE_GUILD_SOCIAL_PREVIEW_SETTINGS_SQL)
-            self.conn.commit()
+            self.engine = sqlite_engine(sqlite_path)
+            with self.engine.writer() as conn:
+                conn.execute(SQLITE_CREATE_GUILD_SOCIAL_PREVIEW_SETTINGS_SQL)
+                conn.commit()
+            self.conn = self.engine.conn
             self.placeholder = "?"
             logger.info("Social Preview guild settings SQLite 初始化完成 (%s)", sqlite_path)
         except Exception as exc:
@@ -102,13 +104,18 @@ class SocialPreviewSettingsRepository:
         self._last_init_attempt = None
 
     def _close_connection(self) -> None:
-        if self.conn is not None:
-            try:
-                self.conn.close()
-            except Exception:
-                logger.debug("關閉 Social Preview settings DB 連線失敗", exc_info=True)
+        # SQLite 連線屬於共用的 engine，其他 repository 還在用，這裡只放掉參照；重新 init 時再向 engine 取得。
+        self.engine = None
         self.conn = None
-        self.cursor = None
+
+    @contextmanager
+    def _connection(self, *, read_only: bool = False) -> Iterator[Any]:
+        if self.db_type == "postgres":
+            with postgres_pool.connection(schema=_POSTGRES_SCHEMA) as conn:
+                yield conn
+        else:
+            with (self.engine.reader() if read_only else self.engine.writer()) as conn:
+                yield conn
 
     def _ensure_ready(self) -> bool:
         if self.init():
@@ -121,6 +128,9 @@ class SocialPreviewSettingsRepository:
         return False
 
     def _mark_unavailable(self) -> None:
+        # PostgreSQL 的壞連線已由 pool 丟棄並退避重連；SQLite 則標記停用，等重試間隔後重新初始化。
+        if self.db_type == "postgres":
+            return
         self.db_enabled = False
         self._close_connection()
 
@@ -133,8 +143,10 @@ class SocialPreviewSettingsRepository:
                 "SELECT enabled FROM guild_social_preview_settings "
                 f"WHERE guild_id = {self.placeholder} AND platform = {self.placeholder};"
             )
-            self.cursor.execute(sql, (str(guild_id), platform))
-            row = self.cursor.fetchone()
+            with self._connection(read_only=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, (str(guild_id), platform))
+                row = cursor.fetchone()
         except Exception as exc:
             logger.error("讀取 Social Preview guild setting 失敗: %s", exc, exc_info=True)
             self._mark_unavailable()
@@ -167,8 +179,9 @@ class SocialPreviewSettingsRepository:
             "updated_at = excluded.updated_at;"
         )
         try:
-            self.cursor.execute(sql, (str(guild_id), platform, enabled_value, updated_by, updated_at))
-            self.conn.commit()
+            with self._connection() as conn:
+                conn.cursor().execute(sql, (str(guild_id), platform, enabled_value, updated_by, updated_at))
+                conn.commit()
             return True
         except Exception as exc:
             logger.error("寫入 Social Preview guild setting 失敗: %s", exc, exc_info=True)
@@ -185,8 +198,9 @@ class SocialPreviewSettingsRepository:
             f"WHERE guild_id = {self.placeholder} AND platform = {self.placeholder};"
         )
         try:
-            self.cursor.execute(sql, (str(guild_id), platform))
-            self.conn.commit()
+            with self._connection() as conn:
+                conn.cursor().execute(sql, (str(guild_id), platform))
+                conn.commit()
             return True
         except Exception as exc:
             logger.error("清除 Social Preview guild setting 失敗: %s", exc, exc_info=True)
@@ -199,8 +213,10 @@ class SocialPreviewSettingsRepository:
 
         try:
             sql = f"SELECT platform, enabled FROM guild_social_preview_settings WHERE guild_id = {self.placeholder};"
-            self.cursor.execute(sql, (str(guild_id),))
-            return {str(platform): bool(enabled) for platform, enabled in self.cursor.fetchall()}
+            with self._connection(read_only=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, (str(guild_id),))
+                return {str(platform): bool(enabled) for platform, enabled in cursor.fetchall()}
         except Exception as exc:
             logger.error("列出 Social Preview guild settings 失敗: %s", exc, exc_info=True)
             self._mark_unavailable()
@@ -208,11 +224,20 @@ class SocialPreviewSettingsRepository:
 
     def is_available(self) -> bool:
         """Return current availability, retrying a failed initialization when due."""
-        return self._ensure_ready()
+        if not self._ensure_ready():
+            return False
+        if self.db_type != "postgres":
+            return True
+        try:
+            with self._connection():
+                return True
+        except Exception as exc:
+            logger.warning("Social Preview settings PostgreSQL 目前無法連線: %s", exc)
+            return False
 
     @property
     def _ready(self) -> bool:
-        return self.db_enabled and self.cursor is not None and self.conn is not None
+        return self.db_enabled and (self.db_type == "postgres" or self.conn is not None)
 
 
 social_preview_settings_repository = SocialPreviewSettingsRepository()
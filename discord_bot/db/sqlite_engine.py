@@ -0,0 +1,204 @@
+"""Shared, tuned SQLite engine: one serialized writer plus read-only reader connections per file."""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+logger = logging.getLogger("discord_digest_bot")
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# page cache 上限（KiB），對應 `PRAGMA cache_size = -N`。
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "16384"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "64"))
+SQLITE_READER_CONNECTIONS = int(os.getenv("SQLITE_READER_CONNECTIONS", "2"))
+
+
+def _is_memory_path(path: str) -> bool:
+    return path == ":memory:" or path.startswith("file::memory:")
+
+
+def _is_open(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.total_changes
+    except sqlite3.ProgrammingError:
+        return False
+    return True
+
+
+class SQLiteEngine:
+    """Every repository on the same SQLite file shares this engine instead of opening its own connection.
+
+    - 寫入連線只有一條，`writer()` 以 lock 序列化，不會再有多條連線互搶 writer lock 造成 `database is locked`
+    - 開 WAL + `synchronous=NORMAL`：commit 不必每次 fsync 主檔，讀取也不會被進行中的寫入擋住
+    - 唯讀查詢走 `reader()` 借出的 `query_only` 連線（最多 `max_readers` 條），可與寫入同時進行
+    - `:memory:` 資料庫無法跨連線共用，reader 會退回寫入連線
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS,
+        cache_size_kib: int = SQLITE_CACHE_SIZE_KIB,
+        mmap_size_mb: int = SQLITE_MMAP_SIZE_MB,
+        max_readers: int = SQLITE_READER_CONNECTIONS,
+    ) -> None:
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size_mb = mmap_size_mb
+        self.max_readers = 0 if _is_memory_path(path) else max(0, max_readers)
+        self.writes = 0
+        self.reads = 0
+        self._write_lock = threading.RLock()
+        self._readers_idle: list[sqlite3.Connection] = []
+        self._readers_open = 0
+        self._readers_condition = threading.Condition()
+
+        self.conn = self._open()
+        self.journal_mode = "memory"
+        if not _is_memory_path(path):
+            self.journal_mode = str(self.conn.execute("PRAGMA journal_mode = WAL;").fetchone()[0]).lower()
+            if self.journal_mode != "wal":
+                logger.warning("SQLite %s 無法切換成 WAL（目前 %s），讀寫會互相阻塞", path, self.journal_mode)
+
+    def _open(self, *, read_only: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        try:
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)};")
+            conn.execute("PRAGMA synchronous = NORMAL;")
+            conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kib)};")
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size_mb) * 1024 * 1024};")
+            conn.execute("PRAGMA temp_store = MEMORY;")
+            if read_only:
+                conn.execute("PRAGMA query_only = ON;")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @property
+    def closed(self) -> bool:
+        return not _is_open(self.conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Hold the single writer connection; the caller commits, exceptions roll back."""
+        with self._write_lock:
+            try:
+                yield self.conn
+            except BaseException:
+                _rollback(self.conn)
+                raise
+            finally:
+                self.writes += 1
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection; falls back to the writer when readers are disabled."""
+        if self.max_readers == 0:
+            with self.writer() as conn:
+                yield conn
+            return
+
+        conn = self._checkout_reader()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.ProgrammingError:
+            broken = True
+            raise
+        finally:
+            self.reads += 1
+            self._release_reader(conn, broken=broken)
+
+    def _checkout_reader(self) -> sqlite3.Connection:
+        with self._readers_condition:
+            while not self._readers_idle and self._readers_open >= self.max_readers:
+                self._readers_condition.wait()
+            if self._readers_idle:
+                return self._readers_idle.pop()
+            self._readers_open += 1
+        try:
+            return self._open(read_only=True)
+        except BaseException:
+            with self._readers_condition:
+                self._readers_open -= 1
+                self._readers_condition.notify()
+            raise
+
+    def _release_reader(self, conn: sqlite3.Connection, *, broken: bool) -> None:
+        with self._readers_condition:
+            if broken or not _is_open(conn):
+                self._readers_open -= 1
+                _close(conn)
+            else:
+                self._readers_idle.append(conn)
+            self._readers_condition.notify()
+
+    def close(self) -> None:
+        with self._readers_condition:
+            while self._readers_idle:
+                _close(self._readers_idle.pop())
+                self._readers_open -= 1
+        with self._write_lock:
+            _close(self.conn)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._readers_condition:
+            readers = self._readers_open
+        return {
+            "path": self.path,
+            "journal_mode": self.journal_mode,
+            "writes": self.writes,
+            "reads": self.reads,
+            "readers": readers,
+        }
+
+
+def _rollback(conn: sqlite3.Connection) -> None:
+    try:
+        conn.rollback()
+    except Exception:
+        logger.debug("SQLite rollback 失敗", exc_info=True)
+
+
+def _close(conn: sqlite3.Connection) -> None:
+    try:
+        conn.close()
+    except Exception:
+        logger.debug("關閉 SQLite 連線失敗", exc_info=True)
+
+
+_engines: dict[str, SQLiteEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def sqlite_engine(path: str) -> SQLiteEngine:
+    """Return the engine shared by every repository using `path`, opening it on first use."""
+    key = path if _is_memory_path(path) else os.path.abspath(path)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None or engine.closed:
+            # 開啟失敗時直接拋出且不登記，下次呼叫會重新嘗試。
+            engine = _engines[key] = SQLiteEngine(path)
+            logger.info("SQLite engine 開啟 %s (journal_mode=%s)", path, engine.journal_mode)
+        return engine
+
+
+def close_sqlite_engines() -> None:
+    with _engines_lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for engine in engines:
+        engine.close()
+
+
+def sqlite_engines_snapshot() -> list[dict[str, Any]]:
+    with _engines_lock:
+        engines = list(_engines.values())
+    return [engine.snapshot() for engine in engines if not engine.closed]
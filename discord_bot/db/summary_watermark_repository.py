@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import logging
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterator, Optional
+
+from .executor import db_executor
+from .postgres_pool import postgres_pool
+from .schema import POSTGRES_CREATE_SUMMARY_WATERMARKS_SQL, SQLITE_CREATE_SUMMARY_WATERMARKS_SQL
+from .sqlite_engine import SQLiteEngine, sqlite_engine
+
+logger = logging.getLogger("discord_digest_bot")
+
+_POSTGRES_SCHEMA = ("summary_watermarks", (POSTGRES_CREATE_SUMMARY_WATERMARKS_SQL,))
+
+try:
+    import psycopg2
+except ImportError:  # pragma: no cover - depends on runtime extras
+    psycopg2 = None
+
+
+def _as_datetime(value: Any) -> datetime:
+    """SQLite 回傳 ISO 字串、PostgreSQL 回傳 datetime，統一成 aware datetime。"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+@dataclass(frozen=True)
+class SummaryWatermark:
+    """The last rolling summary of one channel/window and the newest message it covered."""
+
+    channel_id: str
+    prompt_scope: str
+    summary: str
+    last_message_id: int
+    last_message_at: datetime
+    window_start: datetime
+    updated_at: datetime
+
+
+class SummaryWatermarkRepository:
+    """Persist per-channel rolling summary state so repeat calls only summarize the delta."""
+
+    def __init__(self) -> None:
+        self.db_type = (os.getenv("DB_TYPE", "sqlite") or "sqlite").lower()
+        self.db_enabled = True
+        self.placeholder = "?"
+        self.engine: Optional[SQLiteEngine] = None
+        self.conn: Optional[Any] = None
+        self._initialized = False
+
+    def init(self) -> bool:
+        if self._initialized:
+            return self._ready
+
+        self.db_type = (os.getenv("DB_TYPE", "sqlite") or "sqlite").lower()
+        self.db_enabled = True
+        if self.db_type not in {"sqlite", "postgres"}:
+            logger.error("不支援的 DB_TYPE: %s，summary watermark 改用 sqlite", self.db_type)
+            self.db_type = "sqlite"
+
+        if self.db_type == "postgres":
+            self._init_postgres()
+        else:
+            self._init_sqlite()
+        self._initialized = True
+        return self._ready
+
+    def _init_postgres(self) -> None:
+        if psycopg2 is None:
+            logger.error("psycopg2 未安裝，無法初始化 summary watermark 表")
+            self.db_enabled = False
+            return
+        if not postgres_pool.is_configured():
+            logger.error("使用 PostgreSQL 但未設定 DATABASE_URL，停用 summary watermark")
+            self.db_enabled = False
+            return
+
+        self.placeholder = "%s"
+        try:
+            with postgres_pool.connection(schema=_POSTGRES_SCHEMA):
+                pass
+            logger.info("Summary watermark PostgreSQL 初始化完成")
+        except Exception as exc:
+            logger.error("Summary watermark PostgreSQL 初始化失敗，之後使用時會重試: %s", exc)
+
+    def _init_sqlite(self) -> None:
+        sqlite_path = os.getenv("SQLITE_PATH", "summaries.db")
+        try:
+            self.engine = sqlite_engine(sqlite_path)
+            with self.engine.writer() as conn:
+                conn.execute(SQLITE_CREATE_SUMMARY_WATERMARKS_SQL)
+                conn.commit()
+            self.conn = self.engine.conn
+            self.placeholder = "?"
+            logger.info("Summary watermark SQLite 初始化完成 (%s)", sqlite_path)
+        except Exception as exc:
+            logger.error("Summary watermark SQLite 初始化失敗: %s", exc, exc_info=True)
+            self.db_enabled = False
+
+    @contextmanager
+    def _connection(self, *, read_only: bool = False) -> Iterator[Any]:
+        if self.db_type == "postgres":
+            with postgres_pool.connection(schema=_POSTGRES_SCHEMA) as conn:
+                yield conn
+        else:
+            with (self.engine.reader() if read_only else self.engine.writer()) as conn:
+                yield conn
+
+    def get_watermark(self, channel_id: str, prompt_scope: str) -> Optional[SummaryWatermark]:
+        if not self.init():
+            return None
+
+        sql = (
+            "SELECT summary, last_message_id, last_message_at, window_start, updated_at "
+            f"FROM summary_watermarks WHERE channel_id = {self.placeholder} AND prompt_scope = {self.placeholder};"
+        )
+        try:
+            with self._connection(read_only=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, (str(channel_id), prompt_scope))
+                row = cursor.fetchone()
+        except Exception as exc:
+            logger.error("讀取 summary watermark 失敗: %s", exc, exc_info=True)
+            return None
+        if row is None:
+            return None
+
+        summary, last_message_id, last_message_at, window_start, updated_at = row
+        return SummaryWatermark(
+            channel_id=str(channel_id),
+            prompt_scope=prompt_scope,
+            summary=summary,
+            last_message_id=int(last_message_id),
+            last_message_at=_as_datetime(last_message_at),
+            window_start=_as_datetime(window_start),
+            updated_at=_as_datetime(updated_at),
+        )
+
+    def save_watermark(self, watermark: SummaryWatermark) -> bool:
+        if not self.init():
+            logger.warning("save_watermark: summary watermark DB unavailable，跳過寫入")
+            return False
+
+        values = (
+            watermark.channel_id,
+            watermark.prompt_scope,
+            watermark.summary,
+            str(watermark.last_message_id),
+            watermark.last_message_at.isoformat(),
+            watermark.window_start.isoformat(),
+            watermark.updated_at.isoformat(),
+        )
+        placeholders = ", ".join([self.placeholder] * len(values))
+        sql = (
+            "INSERT INTO summary_watermarks "
+            "(channel_id, prompt_scope, summary, last_message_id, last_message_at, window_start, updated_at) "
+            f"VALUES ({placeholders}) "
+            "ON CONFLICT(channel_id, prompt_scope) DO UPDATE SET "
+            "summary = excluded.summary, "
+            "last_message_id = excluded.last_message_id, "
+            "last_message_at = excluded.last_message_at, "
+            "window_start = excluded.window_start, "
+            "updated_at = excluded.updated_at;"
+        )
+        try:
+            with self._connection() as conn:
+                conn.cursor().execute(sql, values)
+                conn.commit()
+            return True
+        except Exception as exc:
+            logger.error("寫入 summary watermark 失敗: %s", exc, exc_info=True)
+            return False
+
+    async def get_watermark_async(self, channel_id: str, prompt_scope: str) -> Optional[SummaryWatermark]:
+        return await db_executor.run_read("summary_watermarks.get", self.get_watermark, channel_id, prompt_scope)
+
+    async def save_watermark_async(self, watermark: SummaryWatermark) -> bool:
+        return await db_executor.run("summary_watermarks.save", self.save_watermark, watermark)
+
+    @property
+    def _ready(self) -> bool:
+        return self.db_enabled and (self.db_type == "postgres" or self.conn is not None)
+
+
+summary_watermark_repository = SummaryWatermarkRepository()
@@ -0,0 +1,304 @@
+"""Write-behind buffer that batches append-only inserts off the command hot path."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Optional
+
+from .executor import db_executor
+from .postgres_pool import is_connection_error
+
+logger = logging.getLogger("discord_digest_bot")
+
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "50"))
+DB_WRITE_FLUSH_INTERVAL_MS = float(os.getenv("DB_WRITE_FLUSH_INTERVAL_MS", "500"))
+DB_WRITE_RETRY_SECONDS = float(os.getenv("DB_WRITE_RETRY_SECONDS", "5"))
+DB_WRITE_RETRY_MAX_SECONDS = 300.0
+DB_WRITE_SPILL_MAX_RECORDS = int(os.getenv("DB_WRITE_SPILL_MAX_RECORDS", "10000"))
+
+
+def _default_spill_dir() -> str:
+    """Spill 檔預設放在 summaries.db 旁邊（同一個 persistent volume）。"""
+    return os.getenv("DB_WRITE_SPILL_DIR") or os.path.dirname(os.getenv("SQLITE_PATH", "summaries.db")) or "."
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """連線中斷、鎖定、磁碟問題值得稍後重試；資料本身有錯的批次重試也不會成功。"""
+    return isinstance(exc, (sqlite3.OperationalError, OSError)) or is_connection_error(exc)
+
+
+class WriteBehindQueue:
+    """Buffer records in memory and insert them in batches on the DB thread.
+
+    - `put()` 只把紀錄放進記憶體，累積 `batch_size` 筆或經過 `flush_interval` 秒就整批寫入
+    - `insert_batch` 必須在單一 transaction 內寫入整批，失敗時 rollback 並拋出例外
+    - 暫時性錯誤（斷線、database is locked）把整批寫進 spill 檔（JSON lines），以指數退避重送；
+      spill 檔最多保留 `spill_max_records` 筆，超過的紀錄會記 error 後丟棄
+    - 資料錯誤改逐筆重寫，只丟掉真正寫不進去的那幾筆；逐筆時遇到暫時性錯誤的紀錄同樣進 spill 檔
+    - `close()` 會停止背景 flush 並把剩下的紀錄寫完；之後 `put()` 會拒絕，`submit()` 則直接寫入再返回
+    """
+
+    def __init__(
+        self,
+        name: str,
+        insert_batch: Callable[[list[dict[str, Any]]], None],
+        *,
+        batch_size: int = DB_WRITE_BATCH_SIZE,
+        flush_interval: float = DB_WRITE_FLUSH_INTERVAL_MS / 1000,
+        retry_seconds: float = DB_WRITE_RETRY_SECONDS,
+        spill_path: Optional[str] = None,
+        spill_max_records: int = DB_WRITE_SPILL_MAX_RECORDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.insert_batch = insert_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retry_seconds = retry_seconds
+        self.spill_max_records = spill_max_records
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.dropped = 0
+        self._spill_path = spill_path
+        self._spilled: Optional[int] = None
+        self._retry_delay = retry_seconds
+        self._retry_at = 0.0
+        self._clock = clock
+        self._buffer: list[dict[str, Any]] = []
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def spill_path(self) -> str:
+        if self._spill_path is None:
+            self._spill_path = os.path.join(_default_spill_dir(), f"{self.name}.spill.jsonl")
+        return self._spill_path
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def put(self, record: dict[str, Any]) -> None:
+        """Queue one record; the caller does not wait for the database."""
+        if self._closed:
+            raise RuntimeError(f"{self.name} write-behind queue is closed")
+        self._buffer.append(record)
+        self.queued += 1
+        self._ensure_started()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def submit(self, record: dict[str, Any]) -> None:
+        """`put()` for async callers; once the queue is closed the record is written before returning."""
+        if not self._closed:
+            self.put(record)
+            return
+        # 關機途中才進來的紀錄沒有背景 task 會處理，由呼叫端等這次 flush 寫完。
+        self._buffer.append(record)
+        self.queued += 1
+        await self.flush()
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._loop is loop and not self._task.done():
+            return
+        # 測試或工具可能在不同 event loop 上重用同一個 repository，loop 換了就重建背景 task。
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = loop.create_task(self._run(), name=f"write-behind-{self.name}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("%s write-behind flush failed", self.name)
+
+    async def flush(self, *, force_retry: bool = False) -> None:
+        """Write everything buffered so far, replaying the spill file when its retry is due."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if not batch and not self._retry_due(force_retry):
+                return
+            await db_executor.run(f"{self.name}.flush", self._write, batch, force_retry)
+
+    async def close(self) -> None:
+        """Stop the background flusher and write what is left, retrying spilled records once more."""
+        self._closed = True
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush(force_retry=True)
+        if self._spilled:
+            logger.warning("%s write-behind: %s records left in %s", self.name, self._spilled, self.spill_path)
+
+    def _retry_due(self, force: bool) -> bool:
+        # `_spilled` 尚未讀取（None）時也讓 DB thread 檢查一次，接手上次程序留下的 spill 檔。
+        return self._spilled is None or (self._spilled > 0 and (force or self._clock() >= self._retry_at))
+
+    # 以下在 DB thread 上執行。
+
+    def _write(self, batch: list[dict[str, Any]], force_retry: bool) -> None:
+        if self._spilled is None:
+            self._spilled = self._count_spill()
+        if self._spilled and (force_retry or self._clock() >= self._retry_at):
+            self._replay(batch)
+        elif self._spilled:
+            # DB 剛失敗過，先排進 spill 檔維持寫入順序，不在退避期間反覆打 DB。
+            self._spill(batch)
+        elif batch:
+            self._spill(self._insert(batch))
+
+    def _insert(self, batch: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Write `batch`; return the records that failed transiently and should be retried later.
+
+        整批暫時性失敗時回傳的就是 `batch` 本身。
+        """
+        try:
+            self.insert_batch(batch)
+        except Exception as exc:
+            self.failed_batches += 1
+            if _is_transient(exc):
+                logger.warning("%s write-behind: batch of %s failed (%s)", self.name, len(batch), exc)
+                self._schedule_retry()
+                return batch
+            logger.error("%s write-behind: batch of %s rejected, retrying row by row: %s", self.name, len(batch), exc)
+            retry = self._insert_rows(batch)
+            if retry:
+                self._schedule_retry()
+            return retry
+        self.batches += 1
+        self.written += len(batch)
+        self._retry_delay = self.retry_seconds
+        return []
+
+    def _insert_rows(self, batch: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        for index, record in enumerate(batch):
+            try:
+                self.insert_batch([record])
+                self.written += 1
+            except Exception as exc:
+                if _is_transient(exc):
+                    # DB 在逐筆重寫途中斷線 / 鎖定：這筆和後面的都留給下次重送，不當成壞資料丟掉。
+                    logger.warning(
+                        "%s write-behind: row retry failed (%s), spilling %s records", self.name, exc, len(batch) - index
+                    )
+                    return batch[index:]
+                self.dropped += 1
+                logger.error("%s write-behind: dropping record that cannot be written: %s", self.name, exc)
+        return []
+
+    def _replay(self, batch: list[dict[str, Any]]) -> None:
+        try:
+            spilled, corrupt = self._read_spill()
+        except OSError as exc:
+            logger.error("%s write-behind: cannot read spill file %s: %s", self.name, self.spill_path, exc)
+            self._schedule_retry()
+            self._spill(batch)
+            return
+        records = spilled + batch
+        retry = self._insert(records)
+        if retry is records:
+            # 整批都沒寫進去：spill 檔原封不動，新紀錄接在後面。
+            self._spill(batch)
+            return
+        self._clear_spill()
+        # 壞掉的行隨 spill 檔一起清掉，才算真的丟棄。
+        self.dropped += corrupt
+        self._spill(retry)
+        logger.info(
+            "%s write-behind: replayed %s spilled records (%s still pending)", self.name, len(spilled), len(retry)
+        )
+
+    def _schedule_retry(self) -> None:
+        self._retry_at = self._clock() + self._retry_delay
+        self._retry_delay = min(self._retry_delay * 2, DB_WRITE_RETRY_MAX_SECONDS)
+
+    def _spill(self, batch: list[dict[str, Any]]) -> None:
+        if not batch:
+            return
+        room = max(0, self.spill_max_records - (self._spilled or 0))
+        kept, overflow = batch[:room], batch[room:]
+        if overflow:
+            self.dropped += len(overflow)
+            logger.error("%s write-behind: spill file full, dropping %s records", self.name, len(overflow))
+        if not kept:
+            return
+        try:
+            with open(self.spill_path, "a", encoding="utf-8") as spill:
+                for record in kept:
+                    spill.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError as exc:
+            self.dropped += len(kept)
+            logger.error("%s write-behind: cannot write spill file %s: %s", self.name, self.spill_path, exc)
+            return
+        self._spilled = (self._spilled or 0) + len(kept)
+
+    def _count_spill(self) -> int:
+        try:
+            with open(self.spill_path, encoding="utf-8") as spill:
+                return sum(1 for line in spill if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def _read_spill(self) -> tuple[list[dict[str, Any]], int]:
+        """Return the intact spilled records and how many corrupt lines (e.g. half-written on crash) were skipped.
+
+        讀檔本身失敗（OSError）時往上拋，呼叫端不能把 spill 檔當成已讀完而清掉。
+        """
+        records = []
+        corrupt = 0
+        try:
+            with open(self.spill_path, encoding="utf-8", errors="replace") as spill:
+                for number, line in enumerate(spill, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError as exc:
+                        corrupt += 1
+                        logger.error(
+                            "%s write-behind: skipping corrupt line %s of %s: %s", self.name, number, self.spill_path, exc
+                        )
+        except FileNotFoundError:
+            pass
+        return records, corrupt
+
+    def _clear_spill(self) -> None:
+        try:
+            os.remove(self.spill_path)
+        except FileNotFoundError:
+            pass
+        self._spilled = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._buffer),
+            "queued": self.queued,
+            "written": self.written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "spilled": self._spilled or 0,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,284 @@
+"""Shrink chat transcripts before they are sent to an LLM."""
+from __future__ import annotations
+
+import logging
+import os
+import re
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Hashable, Optional
+
+import discord
+
+from ...core.single_flight import SingleFlight
+from ...core.tokens import estimate_tokens
+from .history import TZ_8, stream_non_bot_messages
+from .message_record import MessageRecord
+
+if TYPE_CHECKING:
+    from ...db.message_archive_repository import MessageArchiveRepository
+
+logger = logging.getLogger("discord_digest_bot")
+
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "100000"))
+
+# 同一作者在這個間隔內的連續訊息會合併成一行。
+MERGE_GAP = timedelta(minutes=5)
+# 近似重複訊息只在最近這麼多行內比對，避免把隔很久才又出現的正常發言當成洗版。
+DUPLICATE_WINDOW = 30
+
+history_flights = SingleFlight("history")
+
+_CODE_BLOCK_PATTERN = re.compile(r"```(?:[^\n`]*\n)?(.*?)```", re.DOTALL)
+_URL_PATTERN = re.compile(r"https?://(?:www\.)?([^/\s?#>]+)[^\s>]*")
+_CUSTOM_EMOJI_PATTERN = re.compile(r"<a?:(\w+):\d+>")
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+_REPEATED_CHAR_PATTERN = re.compile(r"(.)\1{2,}")
+
+
+@dataclass(frozen=True)
+class CompactedTranscript:
+    text: str
+    original_tokens: int
+    compacted_tokens: int
+    message_count: int
+    dropped_messages: int
+    newest_message_id: Optional[int] = None
+    newest_message_at: Optional[datetime] = None
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.original_tokens - self.compacted_tokens)
+
+
+def shorten_content(content: str) -> str:
+    """Replace code blocks, URLs and custom emoji markup with short placeholders."""
+    text = _CODE_BLOCK_PATTERN.sub(lambda match: f"[程式碼 {len(match.group(1).strip().splitlines())} 行]", content)
+    text = _URL_PATTERN.sub(lambda match: f"<連結:{match.group(1)}>", text)
+    text = _CUSTOM_EMOJI_PATTERN.sub(r":\1:", text)
+    return " ".join(text.split())
+
+
+def _duplicate_key(author_id: str, raw_content: str) -> Optional[tuple[str, str]]:
+    """Loose per-author key so "哈哈哈哈", "哈哈哈!!" and "哈哈" from one person count as the same spam line.
+
+    以原始內容計算：縮短後不同網址 / 程式碼會變成相同的標記，不能拿來判斷重複。
+    """
+    key = _NON_WORD_PATTERN.sub("", raw_content.lower())
+    key = _REPEATED_CHAR_PATTERN.sub(r"\1\1", key)
+    return (author_id, key) if key else None
+
+
+class TranscriptEntry:
+    """One message reduced to what the transcript needs, so the Discord object can be released."""
+
+    __slots__ = (
+        "message_id",
+        "created_at",
+        "author_id",
+        "display_name",
+        "content",
+        "original_tokens",
+        "duplicate_key",
+    )
+
+    def __init__(
+        self,
+        message_id: Optional[int],
+        created_at: datetime,
+        author_id: str,
+        display_name: str,
+        content: str,
+        original_tokens: int,
+        duplicate_key: Optional[tuple[str, str]] = None,
+    ) -> None:
+        self.message_id = message_id
+        self.created_at = created_at
+        self.author_id = author_id
+        self.display_name = display_name
+        self.content = content
+        self.original_tokens = original_tokens
+        self.duplicate_key = duplicate_key
+
+
+def prepare_entry(message: MessageRecord) -> TranscriptEntry:
+    """Per-message stage: shorten content and measure the verbose line it replaces."""
+    author_id = message.author.name
+    display_name = message.author.display_name or author_id
+    raw_content = message.content or ""
+    return TranscriptEntry(
+        message_id=getattr(message, "id", None),
+        created_at=message.created_at,
+        author_id=author_id,
+        display_name=display_name,
+        content=shorten_content(raw_content),
+        original_tokens=estimate_tokens(f"[00:00] [id:{author_id}] {display_name}: {raw_content}") + 1,
+        duplicate_key=_duplicate_key(author_id, raw_content),
+    )
+
+
+class _Line:
+    __slots__ = ("alias", "created_at", "parts", "repeats")
+
+    def __init__(self, alias: str, created_at: datetime, content: str) -> None:
+        self.alias = alias
+        self.created_at = created_at
+        self.parts = [content]
+        self.repeats = [1]
+
+    def render(self, time_format: str) -> str:
+        timestamp = self.created_at.astimezone(TZ_8).strftime(time_format)
+        parts = [part if count == 1 else f"{part} (×{count})" for part, count in zip(self.parts, self.repeats)]
+        return f"[{timestamp}] {self.alias}: " + " / ".join(parts)
+
+
+def assemble_transcript(
+    entries: list[TranscriptEntry],
+    *,
+    token_budget: Optional[int] = TRANSCRIPT_TOKEN_BUDGET,
+    time_format: str = "%H:%M",
+) -> CompactedTranscript:
+    """Chronological stage over newest-first entries: alias, merge, dedupe, then fit the budget.
+
+    - 作者以顯示名稱當代號，`[id:...]` 只在開頭的對照表出現一次
+    - 同作者連續訊息合併成一行
+    - 同一作者近期內的重複 / 近似重複訊息只保留第一則並標註次數
+    - 超過 `token_budget` 時從最舊的訊息開始捨棄
+    """
+    aliases: dict[str, str] = {}
+    used_aliases: set[str] = set()
+    lines: list[_Line] = []
+    recent_keys: deque[tuple[Optional[tuple[str, str]], _Line, int]] = deque(maxlen=DUPLICATE_WINDOW)
+    original_tokens = 0
+    dropped = 0
+
+    for entry in reversed(entries):
+        original_tokens += entry.original_tokens
+        content = entry.content
+        if not content:
+            dropped += 1
+            continue
+
+        key = entry.duplicate_key
+        duplicate = next((recent for recent in recent_keys if key and recent[0] == key), None)
+        if duplicate is not None:
+            _, line, part_index = duplicate
+            line.repeats[part_index] += 1
+            dropped += 1
+            continue
+
+        alias = aliases.get(entry.author_id)
+        if alias is None:
+            alias = entry.display_name
+            suffix = 2
+            while alias in used_aliases:
+                alias = f"{entry.display_name}#{suffix}"
+                suffix += 1
+            aliases[entry.author_id] = alias
+            used_aliases.add(alias)
+
+        previous = lines[-1] if lines else None
+        if previous is not None and previous.alias == alias and entry.created_at - previous.created_at <= MERGE_GAP:
+            previous.parts.append(content)
+            previous.repeats.append(1)
+            recent_keys.append((key, previous, len(previous.parts) - 1))
+            continue
+
+        line = _Line(alias, entry.created_at, content)
+        lines.append(line)
+        recent_keys.append((key, line, 0))
+
+    legend = "參與者對照：" + "、".join(f"{alias}=id:{author_id}" for author_id, alias in aliases.items())
+    rendered = [line.render(time_format) for line in lines]
+    line_tokens = [estimate_tokens(line) + 1 for line in rendered]
+    total_tokens = estimate_tokens(legend) + sum(line_tokens)
+
+    start = 0
+    if token_budget is not None:
+        while start < len(rendered) and total_tokens > token_budget:
+            total_tokens -= line_tokens[start]
+            start += 1
+    body = rendered[start:]
+    header = [legend] if aliases else []
+    if start:
+        header.append(f"（較早的 {start} 行對話因長度限制省略）")
+    text = "\n".join(header + body)
+
+    newest = entries[0] if entries else None
+    transcript = CompactedTranscript(
+        text=text,
+        original_tokens=original_tokens,
+        compacted_tokens=estimate_tokens(text),
+        message_count=len(entries),
+        dropped_messages=dropped,
+        newest_message_id=newest.message_id if newest is not None else None,
+        newest_message_at=newest.created_at if newest is not None else None,
+    )
+    logger.info(
+        "Compacted %s messages: %s -> %s tokens (saved %s, dropped %s messages, trimmed %s lines)",
+        transcript.message_count,
+        transcript.original_tokens,
+        transcript.compacted_tokens,
+        transcript.saved_tokens,
+        transcript.dropped_messages,
+        start,
+    )
+    return transcript
+
+
+def compact_message_history(
+    messages: list[MessageRecord],
+    *,
+    token_budget: Optional[int] = TRANSCRIPT_TOKEN_BUDGET,
+    time_format: str = "%H:%M",
+) -> CompactedTranscript:
+    """Render newest-first messages like `format_message_history(include_author_id=True)` but compacted.
+
+    網址、自訂表情、程式碼區塊會改成短標記，其餘規則見 `assemble_transcript`。
+    """
+    return assemble_transcript(
+        [prepare_entry(message) for message in messages],
+        token_budget=token_budget,
+        time_format=time_format,
+    )
+
+
+async def stream_compacted_history(
+    channel: discord.TextChannel,
+    *,
+    limit: int,
+    after: Optional[datetime] = None,
+    fetch_multiplier: float = 1.0,
+    archive: Optional[MessageArchiveRepository] = None,
+    slices: int = 1,
+    token_budget: Optional[int] = TRANSCRIPT_TOKEN_BUDGET,
+    time_format: str = "%H:%M",
+    flight_key: Optional[Hashable] = None,
+) -> CompactedTranscript:
+    """Fetch and compact channel history in one pass.
+
+    每則訊息一到就先做 `prepare_entry`，不保留 discord.Message；最後一頁抵達後只剩依時間排序的組裝。
+    給 `flight_key` 時，同一頻道、同一 key 的並行呼叫共用同一次抓取（key 會自動加上 channel id）。
+    """
+
+    async def fetch() -> CompactedTranscript:
+        entries: list[TranscriptEntry] = []
+        async with aclosing(
+            stream_non_bot_messages(
+                channel,
+                limit=limit,
+                after=after,
+                fetch_multiplier=fetch_multiplier,
+                archive=archive,
+                slices=slices,
+            )
+        ) as messages:
+            async for message in messages:
+                entries.append(prepare_entry(message))
+        return assemble_transcript(entries, token_budget=token_budget, time_format=time_format)
+
+    if flight_key is None:
+        return await fetch()
+    return await history_flights.do((channel.id, flight_key), fetch)
@@ -1,42 +1,392 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Optional
+import asyncio
+import os
+from contextlib import aclosing, asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Optional, TypeVar
 
 import discord
 
+from ...db.message_archive_repository import ARCHIVE_EPOCH, ArchivedMessage
+from .message_record import MessageRecord
 
-async def collect_non_bot_messages(
+if TYPE_CHECKING:
+    from ...db.message_archive_repository import MessageArchiveRepository
+
+T = TypeVar("T")
+
+
+# 預先抓取的訊息數（約兩頁），讓下一頁的 REST 請求與目前頁面的處理重疊。
+HISTORY_PREFETCH_MESSAGES = 200
+# 分段平行抓取（opt-in，預設 1 = 不分段）：時間視窗切成幾段，以及所有分段共用的頁請求預算。
+HISTORY_FETCH_SLICES = int(os.getenv("HISTORY_FETCH_SLICES", "1"))
+HISTORY_FETCH_MAX_CONCURRENCY = int(os.getenv("HISTORY_FETCH_MAX_CONCURRENCY", "4"))
+HISTORY_FETCH_PAGES_PER_SECOND = float(os.getenv("HISTORY_FETCH_PAGES_PER_SECOND", "5"))
+
+DISCORD_EPOCH_MS = 1420070400000
+# 封存時間以微秒精度存放；截斷的 coverage 邊界往新的方向推一個單位。
+_COVERAGE_EPSILON = timedelta(microseconds=1)
+HISTORY_PAGE_SIZE = 100
+
+
+class SnowflakeBound:
+    """Minimal `discord.abc.Snowflake` so history() gets an exact id boundary."""
+
+    __slots__ = ("id",)
+
+    def __init__(self, snowflake_id: int) -> None:
+        self.id = snowflake_id
+
+    @classmethod
+    def from_datetime(cls, moment: datetime) -> "SnowflakeBound":
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return cls((int(moment.timestamp() * 1000) - DISCORD_EPOCH_MS) << 22)
+
+
+class HistoryFetchBudget:
+    """Global budget for history page requests: bounded concurrency plus a pages-per-second pace."""
+
+    def __init__(self, max_concurrent: int, pages_per_second: float) -> None:
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._interval = 1.0 / pages_per_second if pages_per_second > 0 else 0.0
+        self._next_start = 0.0
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[None]:
+        async with self._semaphore:
+            now = asyncio.get_running_loop().time()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+history_fetch_budget = HistoryFetchBudget(HISTORY_FETCH_MAX_CONCURRENCY, HISTORY_FETCH_PAGES_PER_SECOND)
+
+
+class _ProducerFailure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+async def _prefetch(source: AsyncIterator[T], *, buffer: int = HISTORY_PREFETCH_MESSAGES) -> AsyncIterator[T]:
+    """Drain `source` in a background task so network waits overlap with the consumer."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+    finished = object()
+
+    async def produce() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as exc:
+            await queue.put(_ProducerFailure(exc))
+            return
+        await queue.put(finished)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is finished:
+                return
+            if isinstance(item, _ProducerFailure):
+                raise item.error
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer
+
+
+async def stream_non_bot_messages(
     channel: discord.TextChannel,
     *,
     limit: int,
     after: Optional[datetime] = None,
     fetch_multiplier: float = 1.0,
-) -> list[discord.Message]:
-    """Fetch recent messages while skipping bot authors.
+    archive: Optional[MessageArchiveRepository] = None,
+    slices: int = 1,
+) -> AsyncIterator[MessageRecord]:
+    """Yield recent non-bot messages newest first as each history page arrives.
+
+    每則訊息在抓到時就轉成 `MessageRecord`，discord.Message 不會被保留到 prompt 組裝階段。
 
     `fetch_multiplier` lets callers over-fetch when they expect many bot/system messages
     so the final non-bot list can still reach the requested limit.
+    When `archive` is given and covers the channel, archived messages are served locally
+    and Discord is only asked for the older gap the archive does not cover yet.
+    `slices > 1` (with `after`) splits the window into time slices fetched concurrently;
+    see `_stream_time_sliced`.
     """
-    messages: list[discord.Message] = []
+    if archive is not None:
+        covered_from = await archive.covered_from_async(channel.id)
+        if covered_from is not None:
+            async with aclosing(
+                _stream_with_archive(
+                    channel,
+                    archive,
+                    covered_from,
+                    limit=limit,
+                    after=after,
+                    fetch_multiplier=fetch_multiplier,
+                    slices=slices,
+                )
+            ) as messages:
+                async for message in messages:
+                    yield message
+            return
+
     history_limit = max(limit, int(limit * fetch_multiplier))
-    async for message in channel.history(limit=history_limit, after=after, oldest_first=False):
-        if message.author.bot:
-            continue
-        messages.append(message)
-        if len(messages) >= limit:
+    if slices > 1 and after is not None:
+        async with aclosing(
+            _stream_time_sliced(channel, limit=limit, after=after, history_limit=history_limit, slices=slices)
+        ) as messages:
+            async for message in messages:
+                yield message
+        return
+
+    emitted = 0
+
+    async with aclosing(_prefetch(channel.history(limit=history_limit, after=after, oldest_first=False))) as history:
+        async for message in history:
+            if message.author.bot:
+                continue
+            yield MessageRecord.from_message(message)
+            emitted += 1
+            if emitted >= limit:
+                return
+
+
+async def collect_non_bot_messages(
+    channel: discord.TextChannel,
+    *,
+    limit: int,
+    after: Optional[datetime] = None,
+    fetch_multiplier: float = 1.0,
+    archive: Optional[MessageArchiveRepository] = None,
+    slices: int = 1,
+) -> list[MessageRecord]:
+    """Fetch recent non-bot messages into a newest-first list; see `stream_non_bot_messages`."""
+    async with aclosing(
+        stream_non_bot_messages(
+            channel,
+            limit=limit,
+            after=after,
+            fetch_multiplier=fetch_multiplier,
+            archive=archive,
+            slices=slices,
+        )
+    ) as messages:
+        return [message async for message in messages]
+
+
+def slice_window(after: datetime, before: datetime, slices: int) -> list[tuple[SnowflakeBound, Optional[SnowflakeBound]]]:
+    """Split (after, before) into newest-first snowflake ranges; the newest range is open-ended."""
+    start = SnowflakeBound.from_datetime(after).id
+    end = SnowflakeBound.from_datetime(before).id
+    step = max(1, (end - start) // slices)
+    bounds = [start + step * index for index in range(slices)] + [None]
+    ranges = [
+        (SnowflakeBound(bounds[index]), SnowflakeBound(bounds[index + 1]) if bounds[index + 1] is not None else None)
+        for index in range(slices)
+    ]
+    return list(reversed(ranges))
+
+
+class _SliceProgress:
+    """Shared state of one time-sliced fetch, indexed newest slice first."""
+
+    __slots__ = ("collected", "exhausted")
+
+    def __init__(self, slices: int) -> None:
+        self.collected = [0] * slices
+        self.exhausted = [False] * slices
+
+    def newer_collected(self, index: int) -> int:
+        return sum(self.collected[:index])
+
+    @property
+    def complete(self) -> bool:
+        return all(self.exhausted)
+
+
+async def _fetch_slice(
+    channel: discord.TextChannel,
+    after: SnowflakeBound,
+    before: Optional[SnowflakeBound],
+    *,
+    limit: int,
+    history_limit: int,
+    budget: HistoryFetchBudget,
+    progress: _SliceProgress,
+    index: int,
+    convert: Callable[[Any], T],
+) -> list[T]:
+    """Page one slice newest first, one budgeted request per page.
+
+    較新的分段合計已湊滿 `limit` 時，這個較舊的分段不會再送出下一頁請求。
+    """
+    collected: list[T] = []
+    cursor = before
+    fetched = 0
+    while fetched < history_limit and len(collected) < limit:
+        page_size = min(HISTORY_PAGE_SIZE, history_limit - fetched)
+        async with budget.page():
+            if progress.newer_collected(index) >= limit:
+                break
+            page = [message async for message in channel.history(limit=page_size, after=after, before=cursor, oldest_first=False)]
+        fetched += len(page)
+        collected.extend(convert(message) for message in page if not message.author.bot)
+        progress.collected[index] = len(collected)
+        if len(page) < page_size:
+            progress.exhausted[index] = True
             break
-    return messages
+        cursor = page[-1]
+    return collected[:limit]
+
+
+async def _stream_time_sliced(
+    channel: discord.TextChannel,
+    *,
+    limit: int,
+    after: datetime,
+    history_limit: int,
+    slices: int,
+    before: Optional[datetime] = None,
+    budget: Optional[HistoryFetchBudget] = None,
+    progress: Optional[_SliceProgress] = None,
+    convert: Callable[[Any], Any] = MessageRecord.from_message,
+) -> AsyncIterator[Any]:
+    """Fetch time slices concurrently, then yield them newest slice first and cut to `limit`.
+
+    較新的分段已湊滿 `limit` 時，較舊的分段停止抓取並取消。
+    某個分段沒抓完（觸及 `history_limit`）時就停在那裡，不跳過缺口接著輸出更舊的分段。
+    """
+    budget = budget or history_fetch_budget
+    ranges = slice_window(after, before or datetime.now(timezone.utc), slices)
+    if before is not None:
+        ranges[0] = (ranges[0][0], SnowflakeBound.from_datetime(before))
+    progress = progress or _SliceProgress(len(ranges))
+    tasks = [
+        asyncio.create_task(
+            _fetch_slice(
+                channel,
+                slice_after,
+                slice_before,
+                limit=limit,
+                history_limit=history_limit,
+                budget=budget,
+                progress=progress,
+                index=index,
+                convert=convert,
+            )
+        )
+        for index, (slice_after, slice_before) in enumerate(ranges)
+    ]
+    emitted = 0
+    try:
+        for index, task in enumerate(tasks):
+            for message in await task:
+                yield message
+                emitted += 1
+                if emitted >= limit:
+                    return
+            if not progress.exhausted[index]:
+                return
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _stream_with_archive(
+    channel: discord.TextChannel,
+    archive: MessageArchiveRepository,
+    covered_from: datetime,
+    *,
+    limit: int,
+    after: Optional[datetime],
+    fetch_multiplier: float,
+    slices: int = 1,
+) -> AsyncIterator[MessageRecord]:
+    """Serve the covered part of the window from the archive and backfill the rest once.
+
+    `slices > 1`（且有 `after`）時，缺口同樣以 `_stream_time_sliced` 分段平行抓取。
+    """
+    window_covered = after is not None and after >= covered_from
+    archived = await archive.fetch_recent_async(channel.id, after=after if window_covered else covered_from, limit=limit)
+    archived_count = len(archived)
+    for index, message in enumerate(archived):
+        # 逐則轉換並放掉封存列，避免兩份資料同時存在。
+        archived[index] = None
+        yield MessageRecord.from_message(message)
+    del archived
+    if window_covered or archived_count >= limit:
+        return
+
+    remaining = limit - archived_count
+    history_limit = max(remaining, int(remaining * fetch_multiplier))
+    fetched: list[ArchivedMessage] = []
+    if slices > 1 and after is not None:
+        progress = _SliceProgress(slices)
+        sliced = _stream_time_sliced(
+            channel,
+            limit=remaining,
+            after=after,
+            before=covered_from,
+            history_limit=history_limit,
+            slices=slices,
+            progress=progress,
+            convert=ArchivedMessage.from_message,
+        )
+        async with aclosing(sliced) as gap:
+            async for record in gap:
+                fetched.append(record)
+                yield MessageRecord.from_message(record)
+        # 分段結果只在每段都抓完時才代表整段缺口；否則 coverage 只推到最舊輸出的那則。
+        exhausted = progress.complete and len(fetched) < remaining
+        oldest_seen = fetched[-1].created_at if fetched else None
+    else:
+        seen = 0
+        oldest_seen = None
+        history = channel.history(limit=history_limit, after=after, before=covered_from, oldest_first=False)
+        async with aclosing(_prefetch(history)) as gap:
+            async for message in gap:
+                seen += 1
+                oldest_seen = message.created_at
+                if message.author.bot:
+                    continue
+                record = ArchivedMessage.from_message(message)
+                fetched.append(record)
+                yield MessageRecord.from_message(record)
+                if len(fetched) >= remaining:
+                    break
+        exhausted = len(fetched) < remaining and seen < history_limit
+
+    # 拉完整段缺口才能把 coverage 推到 `after`；被 limit 截斷時只推到最舊看過的那則之後一點點：
+    # 封存讀取是 `created_at > covered_from`、缺口抓取是 `before=covered_from`，
+    # 邊界剛好停在那則訊息上會讓它兩邊都讀不到，所以留給下次缺口抓取重新拿。
+    if not exhausted and oldest_seen is None:
+        return
+    new_covered_from = (after or ARCHIVE_EPOCH) if exhausted else oldest_seen + _COVERAGE_EPSILON
+    if await archive.replace_range_async(channel.id, after=new_covered_from, before=covered_from, messages=fetched):
+        await archive.extend_coverage_async(channel.id, new_covered_from)
 
 
 def format_message_history(
-    messages: list[discord.Message],
+    messages: list[MessageRecord],
     *,
     include_author_id: bool = False,
     include_display_name: bool = True,
     time_format: str = "%H:%M",
 ) -> str:
-    """Render Discord messages into the prompt format used by summary and Q&A flows."""
+    """Render newest-first message records into the prompt format used by summary and Q&A flows."""
     lines = []
     for message in reversed(messages):
         timestamp = message.created_at.astimezone(TZ_8).strftime(time_format)
@@ -57,10 +407,21 @@ def truncate_for_discord(text: str, *, limit: int = 1900, suffix: str = "...（
     return text[: limit - len(suffix)] + suffix
 
 
+def split_for_discord(text: str, *, limit: int = 1900) -> list[str]:
+    """Split long text into message-sized pages, preferring to break at a newline."""
+    pages: list[str] = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        pages.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    pages.append(text)
+    return pages
+
+
 TZ_8 = datetime.now().astimezone().tzinfo
 try:
-    from datetime import timedelta, timezone
-
     TZ_8 = timezone(timedelta(hours=8))
 except Exception:  # pragma: no cover - defensive fallback
     pass
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import sys
+import weakref
+from datetime import datetime
+from typing import Any
+
+
+class MessageAuthor:
+    """Author fields the prompts need; one shared instance per (name, display_name)."""
+
+    __slots__ = ("name", "display_name", "bot", "__weakref__")
+
+    def __init__(self, name: str, display_name: str, bot: bool = False) -> None:
+        self.name = name
+        self.display_name = display_name
+        self.bot = bot
+
+
+# 同一位作者在上萬則訊息中只保留一份物件與字串；沒有訊息引用後自動釋放。
+_authors: "weakref.WeakValueDictionary[tuple[str, str, bool], MessageAuthor]" = weakref.WeakValueDictionary()
+
+
+def intern_author(name: str, display_name: str | None = None, bot: bool = False) -> MessageAuthor:
+    name = sys.intern(str(name))
+    display_name = sys.intern(str(display_name or name))
+    key = (name, display_name, bool(bot))
+    author = _authors.get(key)
+    if author is None:
+        author = MessageAuthor(name, display_name, bool(bot))
+        _authors[key] = author
+    return author
+
+
+class MessageRecord:
+    """Compact stand-in for discord.Message built at fetch time.
+
+    只保留摘要 / 問答 prompt 會讀的欄位，屬性名稱與 discord.Message 相同，
+    `format_message_history` 與 compactor 不需分辨來源。
+    """
+
+    __slots__ = ("id", "created_at", "author", "content")
+
+    def __init__(self, id: int, created_at: datetime, author: MessageAuthor, content: str) -> None:
+        self.id = id
+        self.created_at = created_at
+        self.author = author
+        self.content = content
+
+    @classmethod
+    def from_message(cls, message: Any) -> "MessageRecord":
+        """Build from a discord.Message or an archived message row."""
+        author = message.author
+        return cls(
+            id=int(message.id),
+            created_at=message.created_at,
+            author=intern_author(author.name, getattr(author, "display_name", None), getattr(author, "bot", False)),
+            content=message.content or "",
+        )
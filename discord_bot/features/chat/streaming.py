@@ -0,0 +1,127 @@
+"""Stream LLM output into Discord followup messages."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any
+
+import discord
+
+from .history import split_for_discord
+
+logger = logging.getLogger("discord_digest_bot")
+
+# Discord 對同一頻道的訊息編輯約每 5 秒 5 次；保守一點以每 1.2 秒最多一次為準。
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.2"))
+STREAM_MESSAGE_LIMIT = 1900
+
+
+class StreamingReply:
+    """Render a growing LLM answer into the deferred response plus followup messages.
+
+    `update()` 收到目前累積的全文，第一段文字立即送出，之後依 `interval` 節流編輯；
+    超過單則上限時前一則定稿，剩餘內容接續到新的 followup。`finish()` 會強制送出最終版本。
+
+    第一頁直接寫進原本的 interaction 回應，取代排隊時的「⏳ …」提示；
+    以 `async with` 使用時，沒有呼叫 `finish()` 就離開（錯誤或提前 return）會刪掉已串流的半成品。
+    """
+
+    def __init__(
+        self,
+        interaction: Any,
+        *,
+        prefix: str = "",
+        limit: int = STREAM_MESSAGE_LIMIT,
+        interval: float = STREAM_EDIT_INTERVAL,
+    ) -> None:
+        self.interaction = interaction
+        self.prefix = prefix
+        self.limit = limit
+        self.interval = interval
+        # `_messages[0]` 是原本的回應，之後才是 followup。
+        self._messages: list[Any] = []
+        self._pages: list[str] = []
+        self._last_flush = 0.0
+        self._finished = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def sent(self) -> bool:
+        return bool(self._messages)
+
+    async def __aenter__(self) -> "StreamingReply":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if not self._finished:
+            await self.discard()
+
+    async def update(self, text: str) -> None:
+        if self._finished:
+            return
+        now = asyncio.get_running_loop().time()
+        if self._messages and now - self._last_flush < self.interval:
+            return
+        if self._lock.locked():
+            return
+        async with self._lock:
+            await self._render(text, final=False)
+
+    async def finish(self, text: str) -> None:
+        async with self._lock:
+            await self._render(text, final=True)
+            self._finished = True
+            await self._trim(len(split_for_discord(self.prefix + text, limit=self.limit)))
+
+    async def discard(self) -> None:
+        """Remove the partial answer, including the queue notice in the original response."""
+        async with self._lock:
+            self._finished = True
+            await self._trim(1)
+            try:
+                await self.interaction.delete_original_response()
+            except discord.HTTPException as exc:
+                logger.warning("Failed to delete streamed reply: %s", exc)
+            self._messages.clear()
+            self._pages.clear()
+
+    async def _trim(self, keep: int) -> None:
+        """Delete followup pages beyond the first `keep` pages (the original response is never deleted here)."""
+        keep = max(1, keep)
+        while len(self._messages) > keep:
+            message = self._messages.pop()
+            self._pages.pop()
+            try:
+                await message.delete()
+            except discord.HTTPException as exc:
+                logger.warning("Failed to delete surplus streamed page: %s", exc)
+
+    async def _send_page(self, index: int, page: str) -> Any:
+        if index == 0:
+            return await self.interaction.edit_original_response(content=page)
+        return await self.interaction.followup.send(page, wait=True)
+
+    async def _render(self, text: str, *, final: bool) -> None:
+        body = text if final else f"{text} ▌"
+        pages = split_for_discord(self.prefix + body, limit=self.limit)
+        self._last_flush = asyncio.get_running_loop().time()
+        for index, page in enumerate(pages):
+            try:
+                if index < len(self._messages):
+                    if self._pages[index] != page:
+                        if index == 0:
+                            await self.interaction.edit_original_response(content=page)
+                        else:
+                            await self._messages[index].edit(content=page)
+                        self._pages[index] = page
+                else:
+                    message = await self._send_page(index, page)
+                    self._messages.append(message)
+                    self._pages.append(page)
+            except discord.HTTPException as exc:
+                # 中途編輯失敗不影響生成；最終版本失敗才往上拋。
+                if final:
+                    raise
+                logger.warning("Streaming reply edit failed: %s", exc)
+                return
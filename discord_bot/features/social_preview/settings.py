@@ -4,6 +4,7 @@ import os
 from dataclasses import dataclass
 from typing import Optional
 
+from ...db.executor import db_executor
 from ...db.social_preview_settings_repository import (
     SocialPreviewSettingsRepository,
     social_preview_settings_repository,
@@ -98,9 +99,35 @@ class SocialPreviewSettingsService:
     def settings_available(self) -> bool:
         return self.repository.is_available()
 
+    # async 版本把整段 repository 查詢丟到 DB thread（唯讀查詢走 reader thread），cog 應使用這些方法。
+
+    async def is_enabled_async(self, guild_id: Optional[str], platform: str) -> bool:
+        return await db_executor.run_read("social_preview_settings.is_enabled", self.is_enabled, guild_id, platform)
+
+    async def set_override_async(
+        self,
+        guild_id: str,
+        platform: str,
+        enabled: bool,
+        *,
+        updated_by: Optional[str] = None,
+    ) -> bool:
+        return await db_executor.run(
+            "social_preview_settings.set", self.set_override, guild_id, platform, enabled, updated_by=updated_by
+        )
+
+    async def clear_override_async(self, guild_id: str, platform: str) -> bool:
+        return await db_executor.run("social_preview_settings.clear", self.clear_override, guild_id, platform)
+
+    async def list_statuses_async(self, guild_id: Optional[str]) -> dict[str, SocialPreviewSettingStatus]:
+        return await db_executor.run_read("social_preview_settings.list", self.list_statuses, guild_id)
+
+    async def settings_available_async(self) -> bool:
+        return await db_executor.run_read("social_preview_settings.available", self.settings_available)
+
 
 social_preview_settings_service = SocialPreviewSettingsService()
 
 
-def is_social_preview_enabled(guild_id: Optional[str], platform: str) -> bool:
-    return social_preview_settings_service.is_enabled(guild_id, platform)
+async def is_social_preview_enabled(guild_id: Optional[str], platform: str) -> bool:
+    return await social_preview_settings_service.is_enabled_async(guild_id, platform)
@@ -0,0 +1,100 @@
+"""Short-lived cache of role answers (/解答之書, /el_psy_kongroo) over unchanged history."""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import random
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger("discord_digest_bot")
+
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+# 命中時以「temperature × 此係數」的機率重新生成，讓高 temperature 的角色偶爾換個說法；0 為一律使用快取。
+ANSWER_CACHE_RESAMPLE_FACTOR = float(os.getenv("ANSWER_CACHE_RESAMPLE_FACTOR", "0"))
+
+AnswerCacheKey = tuple[str, str, str]
+
+_WHITESPACE_PATTERN = re.compile(r"\s+", re.UNICODE)
+
+
+def _is_trailing_noise(char: str) -> bool:
+    return char.isspace() or unicodedata.category(char).startswith("P")
+
+
+def normalize_question(question: str) -> str:
+    """Fold width / case / whitespace and trim trailing punctuation, so「為什麼？？」and「為什麼」match.
+
+    只去掉結尾的標點：句中的符號（「1+1」、「C++」）仍是問題的一部分。
+    整句都是標點（「???」）時退回原本的字串，避免不同的問題共用同一個空 key。
+    """
+    folded = _WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", question or "").casefold())
+    end = len(folded)
+    while end and _is_trailing_noise(folded[end - 1]):
+        end -= 1
+    normalized = folded[:end].strip()
+    return normalized or (question or "").strip()
+
+
+class AnswerCache:
+    """TTL + LRU cache of answers keyed by (role, normalized question, sha256 of the history block)."""
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        resample_factor: float = ANSWER_CACHE_RESAMPLE_FACTOR,
+        clock: Callable[[], float] = time.time,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.resample_factor = resample_factor
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.hits = 0
+        self.misses = 0
+        self.resampled = 0
+        self._entries: OrderedDict[AnswerCacheKey, tuple[float, str]] = OrderedDict()
+
+    @staticmethod
+    def key(role: str, question: str, history: str) -> AnswerCacheKey:
+        history_hash = hashlib.sha256((history or "").encode("utf-8")).hexdigest()
+        return role, normalize_question(question), history_hash
+
+    def get(self, key: AnswerCacheKey, *, temperature: float = 0.0) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= self.clock():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        if self.resample_factor > 0 and self.rng.random() < temperature * self.resample_factor:
+            self.resampled += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        logger.info("Answer cache hit for role %s (hits=%s misses=%s)", key[0], self.hits, self.misses)
+        return entry[1]
+
+    def put(self, key: AnswerCacheKey, answer: str) -> None:
+        self._entries[key] = (self.clock() + self.ttl_seconds, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+answer_cache = AnswerCache()
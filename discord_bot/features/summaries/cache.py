@@ -0,0 +1,122 @@
+"""Short-lived cache of finished summaries keyed by the newest message they cover."""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from ...db.executor import db_executor
+from ...db.summary_watermark_repository import SummaryWatermarkRepository, summary_watermark_repository
+
+logger = logging.getLogger("discord_digest_bot")
+
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "300"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "256"))
+
+
+def _env_enabled(name: str, default: str = "0") -> bool:
+    raw = (os.getenv(name, default) or "").strip().lower()
+    return raw in {"1", "true", "yes", "on", "enabled"}
+
+
+SummaryCacheKey = tuple[str, str, int, Optional[int]]
+
+
+class SummaryCache:
+    """TTL + LRU cache of summary text keyed by (channel id, prompt scope, newest message id, message limit).
+
+    訊息上限只在真的截斷了 transcript 時才放進 key（否則傳 None）：`len_msg=10` 與 `len_msg=5000`
+    讀到的是不同的對話，但沒被截斷時不論上限多少結果都相同，可以共用。
+    `persist=True` 時記憶體沒命中會再查 summary_watermarks：watermark 正好停在同一則訊息且在 TTL 內，
+    代表另一個程序 / 重啟前剛做過同一份摘要。watermark 不記錄訊息上限，所以有截斷的 key 不查。
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = SUMMARY_CACHE_TTL_SECONDS,
+        max_entries: int = SUMMARY_CACHE_MAX_ENTRIES,
+        persist: Optional[bool] = None,
+        watermarks: SummaryWatermarkRepository = summary_watermark_repository,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.persist = _env_enabled("SUMMARY_CACHE_PERSIST") if persist is None else persist
+        self.watermarks = watermarks
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[SummaryCacheKey, tuple[float, str]] = OrderedDict()
+
+    @staticmethod
+    def key(
+        channel_id: object, prompt_scope: str, newest_message_id: int, message_limit: Optional[int] = None
+    ) -> SummaryCacheKey:
+        return str(channel_id), prompt_scope, int(newest_message_id), message_limit
+
+    def get(self, key: SummaryCacheKey) -> Optional[str]:
+        summary = self._get_memory(key)
+        if summary is None and self.persist:
+            summary = self._get_persisted(key)
+        return self._count(key, summary)
+
+    async def get_async(self, key: SummaryCacheKey) -> Optional[str]:
+        """Same as `get`, but the summary_watermarks lookup runs on a DB reader thread."""
+        summary = self._get_memory(key)
+        if summary is None and self.persist:
+            summary = await db_executor.run_read("summary_cache.persisted", self._get_persisted, key)
+        return self._count(key, summary)
+
+    def put(self, key: SummaryCacheKey, summary: str) -> None:
+        self._entries[key] = (self.clock() + self.ttl_seconds, summary)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get_memory(self, key: SummaryCacheKey) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, summary = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return summary
+
+    def _count(self, key: SummaryCacheKey, summary: Optional[str]) -> Optional[str]:
+        if summary is None:
+            self.misses += 1
+            return None
+        if key not in self._entries:
+            self.put(key, summary)
+        self.hits += 1
+        logger.info(
+            "Summary cache hit for %s/%s at message %s (limit=%s, hits=%s misses=%s)", *key, self.hits, self.misses
+        )
+        return summary
+
+    def _get_persisted(self, key: SummaryCacheKey) -> Optional[str]:
+        channel_id, prompt_scope, newest_message_id, message_limit = key
+        if message_limit is not None:
+            return None
+        watermark = self.watermarks.get_watermark(channel_id, prompt_scope)
+        if watermark is None or watermark.last_message_id != newest_message_id:
+            return None
+        age = datetime.fromtimestamp(self.clock(), timezone.utc) - watermark.updated_at
+        if age.total_seconds() > self.ttl_seconds:
+            return None
+        return watermark.summary
+
+
+summary_cache = SummaryCache()
@@ -0,0 +1,189 @@
+"""Map-reduce summarization for transcripts too long for one fast Gemini call."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional
+
+from ...core.tokens import estimate_tokens
+
+logger = logging.getLogger("discord_digest_bot")
+
+SUMMARY_CHUNK_MAX_TOKENS = int(os.getenv("SUMMARY_CHUNK_MAX_TOKENS", "12000"))
+SUMMARY_CHUNK_CONCURRENCY = int(os.getenv("SUMMARY_CHUNK_CONCURRENCY", "4"))
+
+# content-defined 切點：行內容的 crc32 落在這個除數上就切。
+# 切點只取決於附近的行內容，視窗前端掉幾則舊訊息時，中段 chunk 仍然一樣，重試才能重用。
+_BOUNDARY_DIVISOR = 16
+
+
+class SummaryBlockedError(RuntimeError):
+    """Raised when Gemini returns no candidates for a chunk or reduce prompt."""
+
+
+class ChunkSummaryCache:
+    """Bounded LRU of per-chunk summaries so a retried deep summary skips finished chunks."""
+
+    def __init__(self, max_entries: int = 512) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    @staticmethod
+    def key(prompt_scope: str, chunk_text: str) -> str:
+        return hashlib.sha256(f"{prompt_scope}\n{chunk_text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+chunk_summary_cache = ChunkSummaryCache()
+
+
+def split_transcript(lines: list[str], *, max_tokens: int = SUMMARY_CHUNK_MAX_TOKENS) -> list[str]:
+    """Split transcript lines into chunks of at most `max_tokens` estimated tokens.
+
+    切點優先選在內容決定的位置（且 chunk 已過半預算），超過預算才強制切。
+    """
+    min_tokens = max_tokens // 2
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line) + 1
+        if current and current_tokens + line_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+        if current_tokens >= min_tokens and zlib.crc32(line.encode("utf-8")) % _BOUNDARY_DIVISOR == 0:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class ChunkedSummarizer:
+    """Summarize chunks concurrently (map) and merge the partial summaries (reduce)."""
+
+    def __init__(
+        self,
+        model: Any,
+        system_prompt: str,
+        *,
+        max_chunk_tokens: int = SUMMARY_CHUNK_MAX_TOKENS,
+        concurrency: int = SUMMARY_CHUNK_CONCURRENCY,
+        cache: ChunkSummaryCache = chunk_summary_cache,
+    ) -> None:
+        self.model = model
+        self.system_prompt = system_prompt
+        self.max_chunk_tokens = max_chunk_tokens
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+
+    async def summarize(
+        self,
+        message_text: str,
+        *,
+        prompt_scope: str,
+        previous_summary: Optional[str] = None,
+    ) -> str:
+        chunks = split_transcript(message_text.splitlines(), max_tokens=self.max_chunk_tokens)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        logger.info(
+            "Chunked summary: %s chunks (max %s tokens, concurrency %s)",
+            len(chunks),
+            self.max_chunk_tokens,
+            self.concurrency,
+        )
+
+        results = await asyncio.gather(
+            *(
+                self._summarize_chunk(chunk, index, len(chunks), prompt_scope, semaphore)
+                for index, chunk in enumerate(chunks, start=1)
+            ),
+            return_exceptions=True,
+        )
+        # 成功的 chunk 已進 cache；等全部跑完再拋錯，讓重試只需補跑失敗的部分。
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        partials = list(results)
+        if previous_summary:
+            partials.insert(0, f"稍早的總結：\n{previous_summary}")
+        return await self._reduce(partials, prompt_scope, semaphore)
+
+    async def _summarize_chunk(
+        self,
+        chunk: str,
+        index: int,
+        total: int,
+        prompt_scope: str,
+        semaphore: asyncio.Semaphore,
+    ) -> str:
+        key = self.cache.key(prompt_scope, chunk)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info("Chunk %s/%s reused from chunk summary cache", index, total)
+            return cached
+
+        prompt = f"""以下是{prompt_scope}對話的第 {index}/{total} 段：
+
+                {chunk}
+
+                請條列這段的主要話題、幾句代表性發言與最活躍的參與者，之後會與其他段落合併："""
+        async with semaphore:
+            summary = await self._generate(prompt)
+        self.cache.put(key, summary)
+        return summary
+
+    async def _reduce(self, partials: list[str], prompt_scope: str, semaphore: asyncio.Semaphore) -> str:
+        """Merge partial summaries, reducing in groups first when they exceed one chunk budget."""
+        while len(partials) > 1 and estimate_tokens("\n\n".join(partials)) > self.max_chunk_tokens:
+            groups = split_transcript(partials, max_tokens=self.max_chunk_tokens)
+            if len(groups) >= len(partials):
+                break
+            partials = list(
+                await asyncio.gather(
+                    *(self._merge(group, prompt_scope, semaphore, final=False) for group in groups)
+                )
+            )
+        return await self._merge("\n\n".join(partials), prompt_scope, semaphore, final=True)
+
+    async def _merge(self, partial_text: str, prompt_scope: str, semaphore: asyncio.Semaphore, *, final: bool) -> str:
+        instruction = "請合併成一份完整總結：" if final else "請合併成一份條列重點，之後會再與其他部分合併："
+        prompt = f"""以下是{prompt_scope}對話各段落的重點整理：
+
+                {partial_text}
+
+                {instruction}"""
+        async with semaphore:
+            return await self._generate(prompt)
+
+    async def _generate(self, prompt: str) -> str:
+        contents = [
+            {"role": "model", "parts": [self.system_prompt]},
+            {"role": "user", "parts": [prompt]},
+        ]
+        response = await self.model.generate_content_async(contents=contents)
+        if not response.candidates:
+            reason = getattr(response.prompt_feedback, "block_reason", "UNKNOWN")
+            raise SummaryBlockedError(f"Summarization blocked by policy: {reason}")
+        return response.text.strip()
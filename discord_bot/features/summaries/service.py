@@ -1,31 +1,151 @@
 import discord
 import logging
+import os
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+from ...core.llm_scheduler import LLMOverloadedError
+from ...core.single_flight import SingleFlight
+from ...core.tokens import estimate_tokens
 from ...db.repository import summary_repository
-from ...features.chat.history import format_message_history
+from ...db.summary_watermark_repository import SummaryWatermark, summary_watermark_repository
+from ...features.chat.compactor import CompactedTranscript, compact_message_history
+from ...features.chat.message_record import MessageRecord
 from ...features.chat.records import build_summary_record
 from ...features.notifications.service import notification_service
-from ...integrations.gemini_client import gemini_model, gemini_user_message, role_model
-from ...integrations.local_llm import resolve_prompt
+from ...features.summaries.answer_cache import answer_cache
+from ...features.summaries.cache import summary_cache
+from ...features.summaries.chunked import SUMMARY_CHUNK_MAX_TOKENS, ChunkedSummarizer, SummaryBlockedError
+from ...integrations.gemini_client import gemini_model, gemini_user_message, role_model, stream_text
+from ...integrations.local_llm import ROLE_LLM_TEMPERATURE, query_local_llm, resolve_prompt
 from dotenv import load_dotenv
 
 load_dotenv()
 logger = logging.getLogger('discord_digest_bot')
 
+# watermark 的摘要最早可涵蓋到「目前視窗起點 - 視窗長度 × 此比例」，超過就重新完整總結。
+SUMMARY_WATERMARK_MAX_DRIFT = float(os.getenv("SUMMARY_WATERMARK_MAX_DRIFT", "0.25"))
 
-async def summarize_messages(messages: list[discord.Message], prompt_scope: str = "過去24小時", user_id: str = None) -> str:
+# 本地 LLM 排隊已滿或等太久時，是否改用雲端角色模型回答（1 啟用）。
+LOCAL_LLM_FAILOVER_TO_CLOUD = os.getenv("LOCAL_LLM_FAILOVER_TO_CLOUD", "0") == "1"
+
+summary_flights = SingleFlight("summary")
+answer_flights = SingleFlight("answer")
+
+# 這些開頭的回覆代表失敗或被攔截，不能放進問答快取。
+_UNCACHEABLE_ANSWER_PREFIXES = (
+    "Error contacting local LLM",
+    "Summarization blocked",
+    "Summarization feature is unavailable",
+)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "你是一位觀察 Discord 頻道的對話分析師，擅長用詼諧的繁體中文總結對話主題與參與狀況。"
+    "聊天格式為 [HH:MM] 使用者: 訊息內容，同一人連續發言以 / 分隔，(×N) 表示重複 N 次。請針對給定的訊息，歸納主要討論點，挑出幾句代表性發言，最後點名最積極的參與者"
+)
+
+
+async def resolve_summary_window(
+    channel_id: str,
+    prompt_scope: str,
+    window_start: datetime,
+) -> tuple[datetime, Optional[SummaryWatermark]]:
+    """決定這次要從哪個時間點開始抓訊息。
+
+    有可沿用的 watermark 時只需抓 watermark 之後的新訊息，並回傳 watermark 讓 service 做合併摘要。
+    """
+    watermark = await summary_watermark_repository.get_watermark_async(str(channel_id), prompt_scope)
+    if watermark is None:
+        return window_start, None
+
+    window = datetime.now(timezone.utc) - window_start
+    oldest_allowed = window_start - window * SUMMARY_WATERMARK_MAX_DRIFT
+    if watermark.window_start < oldest_allowed or watermark.last_message_at < window_start:
+        logger.info("Summary watermark for %s/%s is stale; summarizing full window.", channel_id, prompt_scope)
+        return window_start, None
+
+    logger.info(
+        "Reusing summary watermark for %s/%s (last message %s).",
+        channel_id,
+        prompt_scope,
+        watermark.last_message_id,
+    )
+    return watermark.last_message_at, watermark
+
+
+async def _save_watermark(
+    channel: discord.TextChannel,
+    prompt_scope: str,
+    summary_text: str,
+    transcript: CompactedTranscript,
+    window_start: datetime,
+    watermark: Optional[SummaryWatermark],
+) -> None:
+    if transcript.newest_message_id is None:
+        return
+    await summary_watermark_repository.save_watermark_async(
+        SummaryWatermark(
+            channel_id=str(channel.id),
+            prompt_scope=prompt_scope,
+            summary=summary_text,
+            last_message_id=transcript.newest_message_id,
+            last_message_at=transcript.newest_message_at,
+            window_start=watermark.window_start if watermark is not None else window_start,
+            updated_at=datetime.now(timezone.utc),
+        )
+    )
+
+
+async def summarize_messages(
+    messages: list[MessageRecord],
+    prompt_scope: str = "過去24小時",
+    user_id: str = None,
+    channel: discord.TextChannel = None,
+    window_start: Optional[datetime] = None,
+    watermark: Optional[SummaryWatermark] = None,
+) -> str:
+    """以訊息清單呼叫摘要流程；cog 走串流時請直接用 `summarize_transcript`。"""
+    if channel is None and messages:
+        # MessageRecord 不帶 channel；只有直接傳入 discord.Message 的舊呼叫端才能反查。
+        channel = getattr(messages[0], "channel", None)
+    return await summarize_transcript(
+        compact_message_history(messages),
+        prompt_scope=prompt_scope,
+        user_id=user_id,
+        channel=channel,
+        window_start=window_start,
+        watermark=watermark,
+    )
+
+
+async def summarize_transcript(
+    transcript: CompactedTranscript,
+    prompt_scope: str = "過去24小時",
+    user_id: str = None,
+    channel: discord.TextChannel = None,
+    window_start: Optional[datetime] = None,
+    watermark: Optional[SummaryWatermark] = None,
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+    message_limit: Optional[int] = None,
+) -> str:
     """摘要 service 主流程。
 
+    `channel` 由 cog 傳入；封存庫回傳的訊息不帶 channel/guild 物件，不能再從訊息反查。
+    傳入 `watermark` 時 transcript 只包含 watermark 之後的新訊息，會請 Gemini 併入既有摘要；
+    傳入 `window_start` 時成功後會更新 watermark 供下次增量使用。
+    傳入 `on_text` 時單次呼叫的摘要改用串流，生成中會以目前累積的文字回呼（map-reduce 路徑只有最終結果）。
+    `message_limit` 是抓取 transcript 時的訊息上限（指令的 len_msg），截斷時會納入快取 key。
+
     負責：
-    1. 將 Discord 訊息整理成 prompt
+    1. 以已壓縮的 transcript 作為 prompt
     2. 呼叫 Gemini
     3. 寫入 summaries repository
     4. 觸發通知
     """
-    logger.info(f"Summarizing {len(messages)} messages...")
+    logger.info(f"Summarizing {transcript.message_count} messages...")
 
     # 先組好 record skeleton，讓成功與失敗通知都能共用同一份資料。
     record = build_summary_record(
-        channel_id=messages[0].channel.name if messages else None,
+        channel_id=channel.name if channel is not None else None,
         user_id=user_id,
         command=f"{prompt_scope}總結",
     )
@@ -34,70 +154,162 @@ async def summarize_messages(messages: list[discord.Message], prompt_scope: str
         logger.warning("Gemini model not initialized or API key is missing/invalid.")
         return "Error: Summarization feature is not available."
 
-    if not messages:
+    if not transcript.message_count:
+        if watermark is not None:
+            logger.info("No new messages since summary watermark; returning stored summary.")
+            return watermark.summary.strip()
         return "No recent non-bot messages found to summarize."
 
-    message_text = format_message_history(messages, include_author_id=True)
+    message_text = transcript.text
     record["prompt"] = message_text
-    # prompt 統一在 service 層組裝，避免 command/cog 各自拼 prompt。
-    contents = [
-        {
-            "role": "model",
-            "parts": [
-                f"你是一位觀察 Discord 頻道的對話分析師，擅長用詼諧的繁體中文總結對話主題與參與狀況。聊天格式為 [HH:MM] 使用者: 訊息內容。請針對給定的訊息，歸納主要討論點，挑出幾句代表性發言，最後點名最積極的參與者"
-            ]
-        },
-        {
-            "role": "user",
-            "parts": [
-                f"""請協助我總結{prompt_scope}內的對話：
-            
-                聊天紀錄:
-                {message_text}
-            
-                請提供總結：
-                """
-            ]
-        }
-    ]
 
-    logger.info(f"Sending prompt to Gemini (length: {len(contents[1]['parts'][0])} chars)")
+    cache_key = None
+    if channel is not None and transcript.newest_message_id is not None:
+        truncated = message_limit is not None and transcript.message_count >= message_limit
+        truncated_at = message_limit if truncated else None
+        cache_key = summary_cache.key(channel.id, prompt_scope, transcript.newest_message_id, truncated_at)
+        cached_summary = await summary_cache.get_async(cache_key)
+        if cached_summary is not None:
+            # 命中時不呼叫 Gemini，但仍寫一筆 summaries 紀錄，command 標註為快取結果。
+            record["command"] = f"{prompt_scope}總結（快取）"
+            record["summary"] = cached_summary
+            try:
+                await summary_repository.insert_summary_async(record)
+            except Exception as e:
+                logger.warning("Failed to record summary cache hit: %s", e)
+            return cached_summary
 
-    try:
-        response = await gemini_model.generate_content_async(contents=contents)
+    async def run() -> str:
+        return await _summarize_and_store(
+            transcript,
+            record,
+            prompt_scope=prompt_scope,
+            channel=channel,
+            window_start=window_start,
+            watermark=watermark,
+            cache_key=cache_key,
+            on_text=on_text,
+        )
 
-        # 先攔截被封鎖的情況
-        if not response.candidates:
-            reason = getattr(response.prompt_feedback, "block_reason", "UNKNOWN")
-            return f"Summarization blocked by policy: {reason}"
+    if cache_key is None:
+        return await run()
+    # 同一頻道同時多人下同一個指令時，只有第一個真的呼叫 Gemini，其餘等待同一份結果。
+    return await summary_flights.do(cache_key, run)
 
-        summary_text = response.text
+
+async def _summarize_and_store(
+    transcript: CompactedTranscript,
+    record: dict,
+    *,
+    prompt_scope: str,
+    channel: Optional[discord.TextChannel],
+    window_start: Optional[datetime],
+    watermark: Optional[SummaryWatermark],
+    cache_key: Optional[tuple],
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
+    """呼叫 Gemini、寫入 summaries / cache / watermark 並觸發通知。"""
+    message_text = transcript.text
+    guild = getattr(channel, "guild", None)
+    try:
+        if estimate_tokens(message_text) > SUMMARY_CHUNK_MAX_TOKENS:
+            # 長 transcript（通常是七天深度摘要）改走 map-reduce，避免單一超長 prompt 超時。
+            summarizer = ChunkedSummarizer(gemini_model, SUMMARY_SYSTEM_PROMPT)
+            summary_text = await summarizer.summarize(
+                message_text,
+                prompt_scope=prompt_scope,
+                previous_summary=watermark.summary if watermark is not None else None,
+            )
+        else:
+            summary_text = await _generate_single_summary(message_text, prompt_scope, watermark, on_text)
         record["summary"] = summary_text
-        summary_repository.insert_summary(record)
+        await summary_repository.insert_summary_async(record)
+        if cache_key is not None:
+            summary_cache.put(cache_key, summary_text.strip())
+        if window_start is not None and channel is not None:
+            await _save_watermark(channel, prompt_scope, summary_text.strip(), transcript, window_start, watermark)
 
         logger.info("Summary saved successfully.")
 
         await notification_service.dispatch(
             record=record,
-            guild=messages[0].guild if messages else None,
+            guild=guild,
         )
 
         return summary_text.strip()
 
+    except SummaryBlockedError as e:
+        return str(e)
     except Exception as e:
         logger.error(f"Error generating summary: {e}", exc_info=True)
         await notification_service.dispatch(
             record=record,
-            guild=messages[0].guild if messages else None,
+            guild=guild,
             error=e,
         )
         return gemini_user_message(e) or "SERN 系統暫時發生問題，請稍後再試一次。"
 
 
-async def call_cloud_llm(prompt: str, role: str = "basic") -> str:
+async def _generate_single_summary(
+    message_text: str,
+    prompt_scope: str,
+    watermark: Optional[SummaryWatermark],
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
+    """單次 Gemini 呼叫的摘要路徑，適用於預算內的 transcript。"""
+    if watermark is not None:
+        user_prompt = f"""以下是{prompt_scope}稍早的對話總結：
+                {watermark.summary}
+
+                之後新增的聊天紀錄:
+                {message_text}
+
+                請把新增內容併入上面的總結，輸出更新後的完整總結：
+                """
+    else:
+        user_prompt = f"""請協助我總結{prompt_scope}內的對話：
+            
+                聊天紀錄:
+                {message_text}
+            
+                請提供總結：
+                """
+    # prompt 統一在 service 層組裝，避免 command/cog 各自拼 prompt。
+    contents = [
+        {
+            "role": "model",
+            "parts": [SUMMARY_SYSTEM_PROMPT]
+        },
+        {
+            "role": "user",
+            "parts": [user_prompt]
+        }
+    ]
+
+    logger.info(f"Sending prompt to Gemini (length: {len(contents[1]['parts'][0])} chars)")
+    if on_text is not None:
+        text, block_reason = await stream_text(gemini_model.generate_content_stream_async(contents=contents), on_text)
+        if block_reason is not None:
+            raise SummaryBlockedError(f"Summarization blocked by policy: {block_reason}")
+        return text
+
+    response = await gemini_model.generate_content_async(contents=contents)
+
+    # 先攔截被封鎖的情況
+    if not response.candidates:
+        reason = getattr(response.prompt_feedback, "block_reason", "UNKNOWN")
+        raise SummaryBlockedError(f"Summarization blocked by policy: {reason}")
+    return response.text
+
+
+async def call_cloud_llm(
+    prompt: str,
+    role: str = "basic",
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
     """角色問答用的雲端 LLM 包裝。
 
-    給 cogs 用來處理 `ROLE_MODE=cloud` 的對話路徑。
+    給 cogs 用來處理 `ROLE_MODE=cloud` 的對話路徑；傳入 `on_text` 時改用串流。
     """
     logger.info("call_cloud_llm handle role questions and answers")
     if not role_model:
@@ -114,7 +326,16 @@ async def call_cloud_llm(prompt: str, role: str = "basic") -> str:
                 "parts": [prompt]
             }
         ]
-        gen_config = {"temperature": 0.7}
+        gen_config = {"temperature": ROLE_LLM_TEMPERATURE}
+
+        if on_text is not None:
+            text, block_reason = await stream_text(
+                role_model.generate_content_stream_async(contents=contents, generation_config=gen_config),
+                on_text,
+            )
+            if block_reason is not None:
+                return f"Summarization blocked due to policy: {block_reason}"
+            return text.strip()
 
         response = await role_model.generate_content_async(contents=contents, generation_config=gen_config)
 
@@ -128,3 +349,71 @@ async def call_cloud_llm(prompt: str, role: str = "basic") -> str:
     except Exception as e:
         logger.error(f"Error generating summary: {e}", exc_info=True)
         raise
+
+
+async def call_role_llm(
+    prompt: str,
+    role: str = "basic",
+    *,
+    mode: str = "local",
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
+    """角色問答入口：`mode="local"` 走本地 LLM，其餘走雲端。
+
+    本地 LLM 排隊飽和（被拒絕或超過排隊 deadline）時，
+    若啟用 LOCAL_LLM_FAILOVER_TO_CLOUD 就改問雲端模型，否則把 LLMOverloadedError 往上拋。
+    """
+    answer, _ = await _call_role_llm(prompt, role, mode=mode, on_text=on_text)
+    return answer
+
+
+def _role_backend(mode: str) -> str:
+    return "local" if mode == "local" else "cloud"
+
+
+async def _call_role_llm(
+    prompt: str,
+    role: str,
+    *,
+    mode: str,
+    on_text: Optional[Callable[[str], Awaitable[None]]],
+) -> tuple[str, str]:
+    """`call_role_llm` that also reports which backend ("local" / "cloud") actually answered."""
+    if _role_backend(mode) == "cloud":
+        return await call_cloud_llm(prompt, role=role, on_text=on_text), "cloud"
+    try:
+        return await query_local_llm(prompt, role=role, on_text=on_text), "local"
+    except LLMOverloadedError as exc:
+        if not LOCAL_LLM_FAILOVER_TO_CLOUD or not role_model:
+            raise
+        logger.warning("Local LLM is saturated (%s); answering with the cloud model instead.", exc)
+        return await call_cloud_llm(prompt, role=role, on_text=on_text), "cloud"
+
+
+async def answer_role_question(
+    prompt: str,
+    role: str,
+    *,
+    question: str,
+    history: str,
+    mode: str = "local",
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> tuple[str, bool]:
+    """角色問答加上快取：同角色、同問題（正規化後）、同一段最近對話時直接回傳上次的答案。
+
+    回傳 (answer, 是否來自快取)。同時湧入的相同問題共用同一次 LLM 呼叫；
+    只有第一位呼叫端會收到串流的 `on_text`，其餘等待最終結果。
+    快取以實際回答的 backend 分開：本地 LLM 飽和改由雲端回答時，答案只會存在雲端那一格。
+    """
+    key = answer_cache.key(f"{_role_backend(mode)}:{role}", question, history)
+    cached = answer_cache.get(key, temperature=ROLE_LLM_TEMPERATURE)
+    if cached is not None:
+        return cached, True
+
+    async def run() -> str:
+        answer, backend = await _call_role_llm(prompt, role, mode=mode, on_text=on_text)
+        if answer.strip() and not answer.startswith(_UNCACHEABLE_ANSWER_PREFIXES):
+            answer_cache.put(answer_cache.key(f"{backend}:{role}", question, history), answer)
+        return answer
+
+    return await answer_flights.do(key, run), False
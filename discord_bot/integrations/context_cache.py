@@ -0,0 +1,115 @@
+"""Hash-keyed store of prompt prefixes (chat history) and their Gemini context caches."""
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+from ..core.tokens import estimate_tokens
+
+GEMINI_CONTEXT_CACHE_TTL = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "600"))
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "1024"))
+GEMINI_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CONTEXT_CACHE_MAX_ENTRIES", "64"))
+
+
+class CachedContext:
+    """One formatted prefix; `remote_name` is set once Gemini holds it as cached content."""
+
+    __slots__ = ("key", "prefix", "tokens", "uses", "expires_at", "remote_name", "remote_model", "remote_expires_at")
+
+    def __init__(self, key: str, prefix: str, expires_at: float) -> None:
+        self.key = key
+        self.prefix = prefix
+        self.tokens = estimate_tokens(prefix)
+        self.uses = 0
+        self.expires_at = expires_at
+        self.remote_name: Optional[str] = None
+        self.remote_model: Optional[str] = None
+        self.remote_expires_at = 0.0
+
+
+class ContextCache:
+    """Recognise repeated prompt prefixes so follow-up questions can reference them.
+
+    - 以 sha256(模型鏈 + prefix) 為 key，本地只保存一份格式化好的 prefix
+    - 同一 prefix 第二次出現、且夠長（`min_tokens`）時才值得建立 Gemini context cache
+    - 遠端 cache 綁定建立時的模型，過期或失效後退回完整 prompt
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = GEMINI_CONTEXT_CACHE_TTL,
+        min_tokens: int = GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+        max_entries: int = GEMINI_CONTEXT_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.max_entries = max(1, max_entries)
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.remote_created = 0
+        self.remote_failures = 0
+        self._clock = clock
+        self._entries: OrderedDict[str, CachedContext] = OrderedDict()
+
+    @staticmethod
+    def key(prefix: str, scope: Iterable[str]) -> str:
+        digest = hashlib.sha256()
+        digest.update("\x1f".join(scope).encode("utf-8"))
+        digest.update(b"\x1e")
+        digest.update(prefix.encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(self, prefix: str, scope: Iterable[str]) -> CachedContext:
+        """Return the entry for `prefix`, creating it on first sight, and count this use."""
+        now = self._clock()
+        key = self.key(prefix, scope)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            entry = CachedContext(key, prefix, now + self.ttl_seconds)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self.local_hits += 1
+            self._entries.move_to_end(key)
+        entry.uses += 1
+        return entry
+
+    def remote(self, entry: CachedContext) -> Optional[tuple[str, str]]:
+        """(model, cached content name) while the remote cache is still alive."""
+        if entry.remote_name is None or entry.remote_expires_at <= self._clock():
+            return None
+        return entry.remote_model, entry.remote_name
+
+    def wants_remote(self, entry: CachedContext) -> bool:
+        return entry.uses >= 2 and entry.tokens >= self.min_tokens and self.remote(entry) is None
+
+    def attach_remote(self, entry: CachedContext, model_name: str, cache_name: str) -> None:
+        self.remote_created += 1
+        entry.remote_model = model_name
+        entry.remote_name = cache_name
+        # 預留一點餘裕，避免剛好在遠端過期的瞬間引用它。
+        entry.remote_expires_at = self._clock() + self.ttl_seconds * 0.9
+
+    def drop_remote(self, entry: CachedContext) -> None:
+        self.remote_failures += 1
+        entry.remote_name = None
+        entry.remote_model = None
+        entry.remote_expires_at = 0.0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "local_hits": self.local_hits,
+            "remote_hits": self.remote_hits,
+            "remote_created": self.remote_created,
+            "remote_failures": self.remote_failures,
+        }
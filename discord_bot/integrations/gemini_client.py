@@ -1,11 +1,23 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
-from typing import Any, Optional
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from ..core.llm_scheduler import LLM_OVERLOADED_MESSAGE, LLMOverloadedError, llm_scheduler
+from ..core.rate_limiter import RateLimiter, RateLimitExceededError
+from ..core.single_flight import SingleFlight
+from ..core.tokens import estimate_tokens
+from .context_cache import CachedContext, ContextCache
+from .model_router import HedgeBudget, ModelRouter
 
 logger = logging.getLogger("discord_digest_bot")
 
+T = TypeVar("T")
+
 try:
     from google import genai
     from google.genai import types as genai_types
@@ -26,6 +38,20 @@ SUMMARY_MODEL_NAMES = (
     "gemini-3-flash-preview",
     "gemini-3.1-flash-lite",
 )
+# 對沖（hedging）：主要模型超過近期延遲的第 N 百分位還沒回應時，同時向下一個模型送出相同請求。
+GEMINI_HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_ENABLED", "0") == "1"
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+GEMINI_HEDGE_MAX_PER_MINUTE = int(os.getenv("GEMINI_HEDGE_MAX_PER_MINUTE", "6"))
+
+# 全程序共用的 Gemini 配額：每分鐘請求數 / token 數（0 為不限制）、等待額度的上限秒數，
+# 以及 429 沒有附 retry hint 時暫停的秒數。
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "0"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "0"))
+GEMINI_RATE_LIMIT_MAX_WAIT = float(os.getenv("GEMINI_RATE_LIMIT_MAX_WAIT", "20"))
+GEMINI_RATE_LIMIT_DEFAULT_PAUSE = float(os.getenv("GEMINI_RATE_LIMIT_DEFAULT_PAUSE", "5"))
+
+_RETRY_HINT_PATTERN = re.compile(r"retry(?:Delay)?\W+(?:in\W+)?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
 ROLE_MODEL_NAMES = (
     "gemini-3.1-flash-lite",
     "gemini-3.5-flash",
@@ -50,6 +76,10 @@ def _error_status_code(exc: Exception) -> Optional[int]:
 
 def gemini_user_message(exc: Exception) -> Optional[str]:
     """Return a safe Discord message when an exception came from Gemini."""
+    if isinstance(exc, LLMOverloadedError):
+        return LLM_OVERLOADED_MESSAGE
+    if isinstance(exc, RateLimitExceededError):
+        return GEMINI_RATE_LIMIT_MESSAGE
     status_code = _error_status_code(exc)
     error_text = str(exc).upper()
     error_module = exc.__class__.__module__
@@ -77,47 +107,440 @@ def _is_gemini_busy_error(exc: Exception) -> bool:
     )
 
 
+# 同一個模型名稱在 summary / role 兩組 adapter 之間共用健康狀態。
+model_router = ModelRouter()
+hedge_budget = HedgeBudget(GEMINI_HEDGE_MAX_PER_MINUTE)
+context_cache = ContextCache()
+context_flights = SingleFlight("gemini-context")
+gemini_rate_limiter = RateLimiter(
+    "Gemini",
+    requests_per_minute=GEMINI_RPM,
+    tokens_per_minute=GEMINI_TPM,
+    max_wait=GEMINI_RATE_LIMIT_MAX_WAIT,
+)
+
+
+_NO_CHUNK = object()
+
+
+async def _close_stream(chunks: Optional[AsyncIterator[Any]]) -> None:
+    close = getattr(chunks, "aclose", None)
+    if close is None:
+        return
+    try:
+        await close()
+    except Exception:
+        logger.debug("關閉 Gemini 串流失敗", exc_info=True)
+
+
+class _OpenedStream:
+    """A Gemini stream whose first chunk has already arrived."""
+
+    __slots__ = ("first", "chunks")
+
+    def __init__(self, first: Any, chunks: Optional[AsyncIterator[Any]]) -> None:
+        self.first = first
+        self.chunks = chunks
+
+    async def close(self) -> None:
+        await _close_stream(self.chunks)
+
+
+class _HedgeExhausted(Exception):
+    """Both the primary and the hedged request failed; carries the last error."""
+
+    def __init__(self, error: BaseException) -> None:
+        super().__init__(str(error))
+        self.error = error
+
+
+def _find_retry_delay(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        if "retryDelay" in value:
+            return str(value["retryDelay"])
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            found = _find_retry_delay(item)
+            if found is not None:
+                return found
+    return None
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Read the server's retry hint from a 429: RetryInfo.retryDelay, Retry-After, or the message text."""
+    delay = _find_retry_delay(getattr(exc, "details", None))
+    if delay is not None:
+        try:
+            return float(delay.rstrip("s"))
+        except ValueError:
+            pass
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    retry_after = headers.get("retry-after") if headers is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    match = _RETRY_HINT_PATTERN.search(str(exc))
+    return float(match.group(1)) if match else None
+
+
 class GeminiAsyncModel:
-    """Async Gemini adapter with ordered failover for temporary model overloads."""
+    """Async Gemini adapter with health-ordered failover for temporary model overloads.
+
+    每次請求依 `router.order()` 決定嘗試順序：故障中（circuit open）或明顯變慢的模型排到後面，
+    避免故障期間每個請求都先白跑一趟失敗的模型。
+    """
 
     def __init__(
         self,
         client: Any,
         model_name: str,
         fallback_model_names: tuple[str, ...] = (),
+        router: Optional[ModelRouter] = None,
+        hedging: bool = GEMINI_HEDGE_ENABLED,
+        hedges: Optional[HedgeBudget] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        contexts: Optional[ContextCache] = None,
     ) -> None:
         self.client = client
         self.model_name = model_name
         self.model_names = tuple(dict.fromkeys((model_name, *fallback_model_names)))
+        self.router = router or model_router
+        self.hedging = hedging
+        self.hedges = hedges or hedge_budget
+        self.rate_limiter = rate_limiter or gemini_rate_limiter
+        self.contexts = contexts or context_cache
+
+    def router_state(self) -> dict[str, dict[str, Any]]:
+        """Health of this adapter's models, in the order the next request would try them."""
+        snapshot = self.router.snapshot()
+        return {name: snapshot.get(name, {}) for name in self.router.order(self.model_names)}
 
     async def generate_content_async(self, contents: Any, generation_config: Optional[Any] = None) -> Any:
         normalized_contents = _normalize_contents(contents)
         config = _normalize_generation_config(generation_config)
-
-        for index, model_name in enumerate(self.model_names):
-            kwargs = {
-                "model": model_name,
-                "contents": normalized_contents,
-            }
-            if config is not None:
-                kwargs["config"] = config
-
+        tokens = estimate_tokens(str(normalized_contents))
+        return await self._generate_within_quota(normalized_contents, config, tokens)
+
+    async def _generate_within_quota(self, normalized_contents: Any, config: Optional[Any], tokens: int) -> Any:
+        """Take rate-limiter quota first; on a 429 with a retry hint, pause and retry while time allows.
+
+        等待額度時不佔 scheduler slot：拿到額度後才進入共用 scheduler 排隊，
+        成本以千 token 計，讓長 prompt 佔用較多的公平份額。
+        """
+        deadline = time.monotonic() + self.rate_limiter.max_wait
+        while True:
+            await self.rate_limiter.acquire(tokens, max_wait=max(0.0, deadline - time.monotonic()))
             try:
-                return await self.client.aio.models.generate_content(**kwargs)
+                response = await llm_scheduler.run(
+                    "gemini",
+                    lambda: self._generate_with_failover(normalized_contents, config, tokens),
+                    cost=max(1.0, tokens / 1000),
+                )
             except Exception as exc:
-                has_fallback = index + 1 < len(self.model_names)
-                if not has_fallback or not _is_gemini_busy_error(exc):
+                hint = self._pause_on_rate_limit(exc)
+                if hint is None or time.monotonic() + hint > deadline:
                     raise
+                logger.info("Gemini asked us to retry in %.1fs; waiting for quota.", hint)
+                continue
+            usage = getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+            if isinstance(usage, int):
+                self.rate_limiter.adjust(usage - tokens)
+            return response
+
+    def _pause_on_rate_limit(self, exc: Exception) -> Optional[float]:
+        """Pause the shared limiter after a 429; return the server's retry hint if it sent one."""
+        if _error_status_code(exc) != 429 and "RESOURCE_EXHAUSTED" not in str(exc).upper():
+            return None
+        hint = retry_after_seconds(exc)
+        self.rate_limiter.pause(GEMINI_RATE_LIMIT_DEFAULT_PAUSE if hint is None else hint)
+        return hint
+
+    async def _generate_with_failover(self, normalized_contents: Any, config: Optional[Any], tokens: int = 0) -> Any:
+        model_names = self.router.order(self.model_names)
+        index = 0
+        while index < len(model_names):
+            try:
+                if self.hedging and index == 0 and len(model_names) > 1:
+                    return await self._hedged(
+                        model_names[0],
+                        model_names[1],
+                        lambda name: self._attempt(name, normalized_contents, config),
+                        tokens,
+                    )
+                return await self._attempt(model_names[index], normalized_contents, config)
+            except _HedgeExhausted as exhausted:
+                # 主要與對沖的模型都失敗了：從第三個模型繼續 failover。
+                index += 1
+                error = exhausted.error
+            except Exception as exc:
+                error = exc
+            self._raise_unless_failover(error, model_names, index)
+            index += 1
 
-                next_model = self.model_names[index + 1]
-                logger.warning(
-                    "Gemini model %s is temporarily unavailable; falling back to %s.",
-                    model_name,
-                    next_model,
-                )
+        raise RuntimeError("Gemini model failover chain was unexpectedly empty.")
+
+    async def _attempt(self, model_name: str, normalized_contents: Any, config: Optional[Any]) -> Any:
+        started = time.monotonic()
+        try:
+            response = await self.client.aio.models.generate_content(
+                **_request_kwargs(model_name, normalized_contents, config)
+            )
+        except Exception as exc:
+            self.router.record_failure(model_name, _error_status_code(exc))
+            raise
+        self.router.record_success(model_name, time.monotonic() - started)
+        return response
+
+    async def _open_stream(self, model_name: str, normalized_contents: Any, config: Optional[Any]) -> _OpenedStream:
+        """Start a stream and wait for its first chunk, recording time-to-first-chunk as the model's latency."""
+        requested_at = time.monotonic()
+        chunks: Optional[AsyncIterator[Any]] = None
+        try:
+            stream = await self.client.aio.models.generate_content_stream(
+                **_request_kwargs(model_name, normalized_contents, config)
+            )
+            chunks = stream.__aiter__()
+            first: Any = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = _NO_CHUNK
+        except asyncio.CancelledError:
+            # 對沖輸掉的一方在收到第一個 chunk 前被取消，順手關掉底層串流。
+            await _close_stream(chunks)
+            raise
+        except Exception as exc:
+            self.router.record_failure(model_name, _error_status_code(exc))
+            raise
+        self.router.record_success(model_name, time.monotonic() - requested_at)
+        return _OpenedStream(first, chunks)
+
+    def _acquire_hedge(self, tokens: int) -> bool:
+        """A hedge is a real extra request: it needs both a per-minute hedge slot and rate-limiter quota."""
+        if not self.hedges.try_acquire():
+            return False
+        if not self.rate_limiter.try_acquire(tokens):
+            logger.info("Gemini rate limiter has no spare quota; skipping hedge.")
+            return False
+        return True
+
+    async def _hedged(
+        self,
+        primary_name: str,
+        hedge_name: str,
+        attempt: Callable[[str], Awaitable[T]],
+        tokens: int,
+        *,
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+    ) -> T:
+        """Race `attempt(hedge_name)` against the primary once the primary is slower than usual.
+
+        第一個成功的結果勝出，另一個請求會被取消（已完成但沒被採用的結果交給 `discard` 清理）；
+        延遲樣本不足、每分鐘對沖額度用完或 rate limiter 沒有餘裕時不對沖。
+        串流請求以第一個 chunk 的到達時間比較，non-streaming 則以完整回應比較。
+        """
+        delay = self.router.latency_percentile(primary_name, GEMINI_HEDGE_PERCENTILE)
+        primary = asyncio.ensure_future(attempt(primary_name))
+        tasks = [primary]
+        winner: Optional[asyncio.Future] = None
+        try:
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+            if delay is None or primary.done() or not self._acquire_hedge(tokens):
+                winner = primary
+                return await primary
+
+            logger.info(
+                "Gemini model %s exceeded its p%.0f latency (%.2fs); hedging with %s.",
+                primary_name,
+                GEMINI_HEDGE_PERCENTILE,
+                delay,
+                hedge_name,
+            )
+            hedge = asyncio.ensure_future(attempt(hedge_name))
+            tasks.append(hedge)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in tasks if task in done and task.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        self.hedges.wins += 1
+                    return winner.result()
+                error = next(task.exception() for task in tasks if task in done)
+            raise _HedgeExhausted(error)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif discard is not None and task is not winner and not task.cancelled() and task.exception() is None:
+                    await discard(task.result())
+
+    async def generate_content_stream_async(
+        self,
+        contents: Any,
+        generation_config: Optional[Any] = None,
+    ) -> AsyncIterator[Any]:
+        """Yield response chunks as Gemini streams them.
+
+        只有在尚未收到任何 chunk 前遇到 503 才會切換到下一個模型；已輸出部分內容後的錯誤直接拋出。
+        先取得 rate-limiter 額度再排 scheduler slot，之後整段串流期間都佔用同一個 slot。
+        """
+        normalized_contents = _normalize_contents(contents)
+        config = _normalize_generation_config(generation_config)
+        tokens = estimate_tokens(str(normalized_contents))
+        await self.rate_limiter.acquire(tokens)
+        async with llm_scheduler.slot("gemini", cost=max(1.0, tokens / 1000)):
+            model_names = self.router.order(self.model_names)
+            index = 0
+            while index < len(model_names):
+                try:
+                    if self.hedging and index == 0 and len(model_names) > 1:
+                        # 串流的對沖門檻是第一個 chunk 的到達時間（總時間取決於輸出長度）。
+                        opened = await self._hedged(
+                            model_names[0],
+                            model_names[1],
+                            lambda name: self._open_stream(name, normalized_contents, config),
+                            tokens,
+                            discard=_OpenedStream.close,
+                        )
+                    else:
+                        opened = await self._open_stream(model_names[index], normalized_contents, config)
+                except _HedgeExhausted as exhausted:
+                    index += 1
+                    error = exhausted.error
+                except Exception as exc:
+                    error = exc
+                else:
+                    # 已開始輸出後的錯誤直接拋出，不再 failover。
+                    if opened.first is not _NO_CHUNK:
+                        yield opened.first
+                    async for chunk in opened.chunks:
+                        yield chunk
+                    return
+                self._pause_on_rate_limit(error)
+                self._raise_unless_failover(error, model_names, index)
+                index += 1
 
         raise RuntimeError("Gemini model failover chain was unexpectedly empty.")
 
+    async def generate_with_context_stream_async(self, context: Any, question: str) -> AsyncIterator[Any]:
+        """Stream an answer to `question` over a long, frequently repeated `context` (e.g. chat history).
+
+        同一段 context 在 TTL 內第二次出現時建立 Gemini context cache，之後只送出問題與 cache 名稱；
+        不支援 context caching、context 太短或遠端 cache 失效時，退回送出完整 prompt。
+        """
+        entry = self.contexts.lookup(_normalize_contents(context), self.model_names)
+        remote = await self._remote_context(entry)
+        if remote is not None:
+            model_name, cache_name = remote
+            tokens = estimate_tokens(question)
+            await self.rate_limiter.acquire(tokens)
+            async with llm_scheduler.slot("gemini", cost=max(1.0, tokens / 1000)):
+                started = False
+                requested_at = time.monotonic()
+                try:
+                    stream = await self.client.aio.models.generate_content_stream(
+                        model=model_name,
+                        contents=question,
+                        config=genai_types.GenerateContentConfig(cached_content=cache_name),
+                    )
+                    async for chunk in stream:
+                        if not started:
+                            started = True
+                            self.contexts.remote_hits += 1
+                            self.router.record_success(model_name, time.monotonic() - requested_at)
+                        yield chunk
+                    return
+                except Exception as exc:
+                    if started:
+                        raise
+                    logger.warning("Gemini context cache %s unusable (%s); sending the full prompt.", cache_name, exc)
+                    self.contexts.drop_remote(entry)
+
+        async for chunk in self.generate_content_stream_async(f"{entry.prefix}\n\nUser:\n{question}"):
+            yield chunk
+
+    def _supports_context_cache(self) -> bool:
+        return (
+            genai_types is not None
+            and hasattr(genai_types, "CreateCachedContentConfig")
+            and hasattr(getattr(self.client, "aio", None), "caches")
+        )
+
+    async def _remote_context(self, entry: CachedContext) -> Optional[tuple[str, str]]:
+        remote = self.contexts.remote(entry)
+        if remote is not None or not self.contexts.wants_remote(entry) or not self._supports_context_cache():
+            return remote
+        try:
+            await context_flights.do(entry.key, lambda: self._create_remote_context(entry))
+        except Exception as exc:
+            logger.warning("Could not create Gemini context cache: %s", exc)
+            return None
+        return self.contexts.remote(entry)
+
+    async def _create_remote_context(self, entry: CachedContext) -> None:
+        model_name = self.router.order(self.model_names)[0]
+        await self.rate_limiter.acquire(entry.tokens)
+        async with llm_scheduler.slot("gemini", cost=max(1.0, entry.tokens / 1000)):
+            cached = await self.client.aio.caches.create(
+                model=model_name,
+                config=genai_types.CreateCachedContentConfig(
+                    contents=[entry.prefix],
+                    ttl=f"{int(self.contexts.ttl_seconds)}s",
+                ),
+            )
+        self.contexts.attach_remote(entry, model_name, cached.name)
+        logger.info("Created Gemini context cache %s on %s (~%s tokens)", cached.name, model_name, entry.tokens)
+
+    @staticmethod
+    def _raise_unless_failover(exc: Exception, model_names: list[str], index: int) -> None:
+        has_fallback = index + 1 < len(model_names)
+        if not has_fallback or not _is_gemini_busy_error(exc):
+            raise exc
+
+        next_model = model_names[index + 1]
+        logger.warning(
+            "Gemini model %s is temporarily unavailable; falling back to %s.",
+            model_names[index],
+            next_model,
+        )
+
+
+def _request_kwargs(model_name: str, contents: Any, config: Optional[Any]) -> dict[str, Any]:
+    kwargs = {
+        "model": model_name,
+        "contents": contents,
+    }
+    if config is not None:
+        kwargs["config"] = config
+    return kwargs
+
+
+async def stream_text(
+    chunks: AsyncIterator[Any],
+    on_text: Callable[[str], Awaitable[None]],
+) -> tuple[str, Optional[str]]:
+    """Accumulate streamed chunk text, reporting the running text after each chunk.
+
+    回傳 (全文, block_reason)；沒有任何文字時 block_reason 取自最後一個 chunk 的 prompt_feedback。
+    """
+    text = ""
+    last_chunk = None
+    async for chunk in chunks:
+        last_chunk = chunk
+        delta = getattr(chunk, "text", None) or ""
+        if not delta:
+            continue
+        text += delta
+        await on_text(text)
+    if text:
+        return text, None
+    feedback = getattr(last_chunk, "prompt_feedback", None)
+    return text, str(getattr(feedback, "block_reason", None) or "UNKNOWN")
+
 
 def _normalize_contents(contents: Any) -> Any:
     """Convert the legacy google-generativeai chat shape into a simple GenAI contents string."""
@@ -170,17 +593,19 @@ def _normalize_generation_config(generation_config: Optional[Any]) -> Optional[A
     return {"temperature": temperature}
 
 
-def _create_models() -> tuple[Optional[GeminiAsyncModel], Optional[GeminiAsyncModel]]:
-    if not GEMINI_API_KEY:
+def _create_models(client: Optional[Any] = None) -> tuple[Optional[GeminiAsyncModel], Optional[GeminiAsyncModel]]:
+    """Build the summary / role adapters; pass `client` to plug in a stand-in (e.g. tools/llm_fakes.py)."""
+    if client is None and not GEMINI_API_KEY:
         logger.warning("WARNING: GOOGLE_GENAI_API_KEY environment variable not set. Summarization will fail.")
         return None, None
 
-    if genai is None:
+    if client is None and genai is None:
         logger.error("google-genai package is not installed. Summarization might fail.")
         return None, None
 
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
+        if client is None:
+            client = genai.Client(api_key=GEMINI_API_KEY)
         summary_model = GeminiAsyncModel(
             client,
             SUMMARY_MODEL_NAMES[0],
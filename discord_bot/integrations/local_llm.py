@@ -1,13 +1,21 @@
 import os
 import logging
-import aiohttp
 import json
+from typing import Awaitable, Callable, Optional
+
+from ..core.llm_scheduler import LLMOverloadedError, llm_scheduler
+from .local_llm_client import local_llm_client
+from .prompt_registry import PromptRegistry
 
 logger = logging.getLogger('discord_digest_bot')
 
 # --- 設定來源 ---
 BASE_URL = os.getenv('LOCAL_LLM_URL')
 POST_URL = f"{BASE_URL}/v1/chat/completions"
+# 排隊等待本地 LLM slot 的最長秒數；同時生成數由 LLM_MAX_CONCURRENCY_LOCAL 控制。
+LOCAL_LLM_QUEUE_DEADLINE = float(os.getenv('LOCAL_LLM_QUEUE_DEADLINE', '30'))
+# 角色問答的取樣溫度（雲端角色模型共用同一個值）。
+ROLE_LLM_TEMPERATURE = 0.7
 PROMPT_PATH = os.path.join(os.path.dirname(__file__), "system_prompt_role.json")
 
 # --- 內建 fallback prompt（basic） ---
@@ -15,50 +23,102 @@ BUILTIN_BASIC_PROMPT = ("你是 Discord 群組裡一位毒舌但熟悉的朋友
                         "回答請像熟人一樣自然，不要裝模作樣，也不要自稱機器人或講自己的設定。回覆保持在 100 字內，嘴砲可以，但還是要講重點。")
 
 
-# --- 載入 JSON prompt，如果失敗就用內建 basic ---
+# --- 角色 prompt 只載入一次，檔案更新時才重新讀取；失敗時用內建 basic ---
+prompt_registry = PromptRegistry(PROMPT_PATH, BUILTIN_BASIC_PROMPT)
+
+
 def resolve_prompt(role: str) -> str:
-    """依角色名稱載入 system prompt；失敗時退回內建 basic prompt。"""
-    try:
-        with open(PROMPT_PATH, encoding='utf-8') as f:
-            prompts = json.load(f)
-            prompt = prompts.get(role)
-            if prompt:
-                logger.info(f"使用角色 prompt：{role}（來自 system_prompt_role.json）")
-                return prompt
-            else:
-                logger.warning(f"prompts.json 中找不到角色 '{role}'，使用內建 basic prompt。")
-    except Exception as e:
-        logger.warning(f"無法讀取 prompts.json：{e}，使用內建 basic prompt。")
+    """依角色名稱取得 system prompt；找不到時退回內建 basic prompt。"""
+    return prompt_registry.get(role).text
 
-    return BUILTIN_BASIC_PROMPT
 
+async def query_local_llm(
+    prompt: str,
+    role: str = "basic",
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+    max_wait: Optional[float] = LOCAL_LLM_QUEUE_DEADLINE,
+) -> str:
+    """呼叫本地 OpenAI-compatible LLM API，回傳解析後的文字結果。
 
-async def query_local_llm(prompt: str, role: str = "basic") -> str:
-    """呼叫本地 OpenAI-compatible LLM API，回傳解析後的文字結果。"""
+    請求先經過共用 scheduler 排隊；排隊過長被拒絕、或 `max_wait` 秒內沒排到時
+    拋出 LLMOverloadedError，讓呼叫端改走雲端或回覆忙線訊息。
+    傳入 `on_text` 時改用 SSE 串流（`stream: true`），每收到一段就以目前累積的文字呼叫一次。
+    """
     url = POST_URL.rstrip('/')
     role_prompt = resolve_prompt(role)
     try:
-        async with aiohttp.ClientSession() as session:
-            payload = {
-                # "model": "google/gemma-3-12b",  # 請替換為您實際使用的模型 ID
-                "messages": [
-                    {"role": "system", "content": role_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 2048,
-                "stream": False
-            }
-
-            resp = await session.post(url, json=payload)
-            resp.raise_for_status()
-            data = await resp.json()
-
-            # 嘗試解析回應
-            if isinstance(data, dict) and 'choices' in data:
-                return data['choices'][0].get('message', {}).get('content', '').strip()
-
-            return str(data)
+        if on_text is not None:
+            return await llm_scheduler.run(
+                "local",
+                lambda: _stream_chat_completion(url, role_prompt, prompt, on_text),
+                max_wait=max_wait,
+            )
+        return await llm_scheduler.run(
+            "local",
+            lambda: _post_chat_completion(url, role_prompt, prompt),
+            max_wait=max_wait,
+        )
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error querying local LLM: {e}", exc_info=True)
         return f"Error contacting local LLM: {e}"
+
+
+def _chat_payload(role_prompt: str, prompt: str, *, stream: bool) -> dict:
+    return {
+        # "model": "google/gemma-3-12b",  # 請替換為您實際使用的模型 ID
+        "messages": [
+            {"role": "system", "content": role_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": ROLE_LLM_TEMPERATURE,
+        "max_tokens": 2048,
+        "stream": stream
+    }
+
+
+async def _post_chat_completion(url: str, role_prompt: str, prompt: str) -> str:
+    async with local_llm_client.post(url, _chat_payload(role_prompt, prompt, stream=False)) as resp:
+        data = await resp.json()
+
+    # 嘗試解析回應
+    if isinstance(data, dict) and 'choices' in data:
+        return data['choices'][0].get('message', {}).get('content', '').strip()
+
+    return str(data)
+
+
+async def _stream_chat_completion(
+    url: str,
+    role_prompt: str,
+    prompt: str,
+    on_text: Callable[[str], Awaitable[None]],
+) -> str:
+    text = ""
+    async with local_llm_client.post(url, _chat_payload(role_prompt, prompt, stream=True)) as resp:
+        async for raw_line in resp.content:
+            delta = parse_sse_delta(raw_line)
+            if delta is None:
+                break
+            if delta:
+                text += delta
+                await on_text(text)
+    return text.strip()
+
+
+def parse_sse_delta(raw_line: bytes) -> Optional[str]:
+    """Parse one SSE line of an OpenAI-compatible stream; None marks `[DONE]`."""
+    line = raw_line.decode("utf-8", errors="replace").strip()
+    if not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        logger.warning("Skipping malformed SSE line from local LLM: %s", data[:200])
+        return ""
+    choices = chunk.get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or ""
@@ -0,0 +1,133 @@
+"""Long-lived HTTP client for the local OpenAI-compatible LLM server."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import aiohttp
+
+logger = logging.getLogger("discord_digest_bot")
+
+LOCAL_LLM_MAX_CONNECTIONS = int(os.getenv("LOCAL_LLM_MAX_CONNECTIONS", "4"))
+LOCAL_LLM_CONNECT_TIMEOUT = float(os.getenv("LOCAL_LLM_CONNECT_TIMEOUT", "5"))
+LOCAL_LLM_FIRST_BYTE_TIMEOUT = float(os.getenv("LOCAL_LLM_FIRST_BYTE_TIMEOUT", "60"))
+LOCAL_LLM_TOTAL_TIMEOUT = float(os.getenv("LOCAL_LLM_TOTAL_TIMEOUT", "180"))
+
+
+def _percentile(values: list[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LocalLLMLatencyStats:
+    """Rolling latency window for the local LLM (seconds)."""
+
+    def __init__(self, window: int = 512) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._first_byte: deque[float] = deque(maxlen=window)
+        self._total: deque[float] = deque(maxlen=window)
+
+    def record(self, *, first_byte: Optional[float], total: float, ok: bool, timed_out: bool) -> None:
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        if timed_out:
+            self.timeouts += 1
+        if first_byte is not None:
+            self._first_byte.append(first_byte)
+        if ok:
+            self._total.append(total)
+
+    def snapshot(self) -> dict[str, Any]:
+        first_byte = list(self._first_byte)
+        total = list(self._total)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "first_byte_p50": _percentile(first_byte, 50),
+            "first_byte_p95": _percentile(first_byte, 95),
+            "total_p50": _percentile(total, 50),
+            "total_p95": _percentile(total, 95),
+        }
+
+
+class LocalLLMClient:
+    """One pooled aiohttp session for the whole bot.
+
+    - 連線數上限即最大並行數，keep-alive 連線會被重複使用
+    - 逾時分三段：建立連線、收到回應標頭（first byte）、整個請求
+    - bot 啟動時 `start()`、關閉時 `close()`；尚未 start 就被呼叫時會自動建立 session
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: int = LOCAL_LLM_MAX_CONNECTIONS,
+        connect_timeout: float = LOCAL_LLM_CONNECT_TIMEOUT,
+        first_byte_timeout: float = LOCAL_LLM_FIRST_BYTE_TIMEOUT,
+        total_timeout: float = LOCAL_LLM_TOTAL_TIMEOUT,
+    ) -> None:
+        self.max_connections = max(1, max_connections)
+        self.connect_timeout = connect_timeout
+        self.first_byte_timeout = first_byte_timeout
+        self.total_timeout = total_timeout
+        self.stats = LocalLLMLatencyStats()
+        self.in_flight = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.total_timeout, sock_connect=self.connect_timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        logger.info(
+            "Local LLM client started (max connections=%s, timeouts connect/first byte/total=%s/%s/%ss)",
+            self.max_connections,
+            self.connect_timeout,
+            self.first_byte_timeout,
+            self.total_timeout,
+        )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @asynccontextmanager
+    async def post(self, url: str, payload: dict) -> AsyncIterator[aiohttp.ClientResponse]:
+        """POST JSON and yield the response once headers arrive; the body is read inside the block."""
+        if self._session is None or self._session.closed:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first_byte: Optional[float] = None
+        ok = False
+        timed_out = False
+        self.in_flight += 1
+        try:
+            response = await asyncio.wait_for(self._session.post(url, json=payload), self.first_byte_timeout)
+            first_byte = loop.time() - started
+            async with response:
+                response.raise_for_status()
+                yield response
+            ok = True
+        except asyncio.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.in_flight -= 1
+            self.stats.record(first_byte=first_byte, total=loop.time() - started, ok=ok, timed_out=timed_out)
+
+
+local_llm_client = LocalLLMClient()
@@ -0,0 +1,191 @@
+"""Per-model health tracking and routing for the Gemini failover chain."""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Iterable, Optional
+
+logger = logging.getLogger("discord_digest_bot")
+
+GEMINI_CIRCUIT_FAILURES = int(os.getenv("GEMINI_CIRCUIT_FAILURES", "3"))
+GEMINI_CIRCUIT_COOLDOWN = float(os.getenv("GEMINI_CIRCUIT_COOLDOWN", "30"))
+GEMINI_SLOW_FACTOR = float(os.getenv("GEMINI_SLOW_FACTOR", "2.0"))
+
+# error rate EWMA 超過此值視為狀況不佳，排在健康模型之後。
+DEGRADED_ERROR_RATE = 0.5
+
+
+class ModelHealth:
+    """Rolling health of one model: EWMA latency / error rate plus raw counters."""
+
+    __slots__ = (
+        "name",
+        "latency",
+        "error_rate",
+        "requests",
+        "failures",
+        "rate_limited",
+        "unavailable",
+        "consecutive_failures",
+        "opened_until",
+        "recent",
+    )
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.unavailable = 0
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.recent: deque[float] = deque(maxlen=128)
+
+
+class HedgeBudget:
+    """Cap how many duplicate (hedged) requests may be sent per rolling minute."""
+
+    def __init__(self, max_per_minute: int, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_per_minute = max_per_minute
+        self.launched = 0
+        self.wins = 0
+        self.denied = 0
+        self._clock = clock
+        self._sent: deque[float] = deque()
+
+    def try_acquire(self) -> bool:
+        now = self._clock()
+        while self._sent and now - self._sent[0] >= 60:
+            self._sent.popleft()
+        if len(self._sent) >= self.max_per_minute:
+            self.denied += 1
+            return False
+        self._sent.append(now)
+        self.launched += 1
+        return True
+
+    def snapshot(self) -> dict[str, int]:
+        return {"launched": self.launched, "wins": self.wins, "denied": self.denied}
+
+
+class ModelRouter:
+    """Order a model chain by health instead of always starting at index 0.
+
+    - 連續失敗 `failure_threshold` 次的模型進入 open 狀態，冷卻 `cooldown` 秒內排到最後
+    - 冷卻結束後是 half-open：下一次請求成功就恢復，失敗就立刻再 open
+    - 健康的模型之間維持設定的偏好順序，只有 EWMA 延遲比最快的慢 `slow_factor` 倍以上才往後排
+    - 所有模型都 open 時仍會依冷卻剩餘時間照樣嘗試，不會直接拒絕請求
+    """
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int = GEMINI_CIRCUIT_FAILURES,
+        cooldown: float = GEMINI_CIRCUIT_COOLDOWN,
+        slow_factor: float = GEMINI_SLOW_FACTOR,
+        alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.slow_factor = slow_factor
+        self.alpha = alpha
+        self._clock = clock
+        self._health: dict[str, ModelHealth] = {}
+
+    def health(self, model_name: str) -> ModelHealth:
+        health = self._health.get(model_name)
+        if health is None:
+            health = ModelHealth(model_name)
+            self._health[model_name] = health
+        return health
+
+    def is_open(self, model_name: str) -> bool:
+        return self.health(model_name).opened_until > self._clock()
+
+    def order(self, model_names: Iterable[str]) -> list[str]:
+        now = self._clock()
+        healths = [self.health(name) for name in model_names]
+        healthy_latencies = [
+            health.latency
+            for health in healths
+            if health.latency is not None and health.opened_until <= now
+        ]
+        fastest = min(healthy_latencies) if healthy_latencies else None
+
+        def sort_key(item: tuple[int, ModelHealth]) -> tuple:
+            index, health = item
+            is_open = health.opened_until > now
+            degraded = health.error_rate >= DEGRADED_ERROR_RATE
+            slow = (
+                fastest is not None
+                and health.latency is not None
+                and health.latency > fastest * self.slow_factor
+            )
+            return (is_open, health.opened_until if is_open else 0.0, degraded, slow, index)
+
+        return [health.name for _, health in sorted(enumerate(healths), key=sort_key)]
+
+    def latency_percentile(self, model_name: str, percentile: float, *, min_samples: int = 10) -> Optional[float]:
+        """Recent successful latency at `percentile`; None until enough samples exist."""
+        recent = sorted(self.health(model_name).recent)
+        if len(recent) < min_samples:
+            return None
+        index = min(len(recent) - 1, max(0, round(percentile / 100 * (len(recent) - 1))))
+        return recent[index]
+
+    def record_success(self, model_name: str, latency: Optional[float] = None) -> None:
+        health = self.health(model_name)
+        health.requests += 1
+        health.error_rate *= 1 - self.alpha
+        if latency is not None:
+            health.recent.append(latency)
+            health.latency = latency if health.latency is None else (
+                self.alpha * latency + (1 - self.alpha) * health.latency
+            )
+        if health.consecutive_failures >= self.failure_threshold:
+            logger.info("Gemini model %s recovered; closing circuit.", model_name)
+        health.consecutive_failures = 0
+        health.opened_until = 0.0
+
+    def record_failure(self, model_name: str, status_code: Optional[int] = None) -> None:
+        health = self.health(model_name)
+        health.requests += 1
+        health.failures += 1
+        health.error_rate = self.alpha + (1 - self.alpha) * health.error_rate
+        if status_code == 429:
+            health.rate_limited += 1
+        elif status_code == 503:
+            health.unavailable += 1
+        health.consecutive_failures += 1
+        if health.consecutive_failures >= self.failure_threshold:
+            health.opened_until = self._clock() + self.cooldown
+            logger.warning(
+                "Gemini model %s failed %s times in a row; skipping it for %.0fs.",
+                model_name,
+                health.consecutive_failures,
+                self.cooldown,
+            )
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Router state per model, for logs and diagnostics."""
+        now = self._clock()
+        return {
+            name: {
+                "state": "open" if health.opened_until > now else (
+                    "half-open" if health.consecutive_failures >= self.failure_threshold else "closed"
+                ),
+                "ewma_latency": health.latency,
+                "error_rate": round(health.error_rate, 3),
+                "requests": health.requests,
+                "failures": health.failures,
+                "rate_limited": health.rate_limited,
+                "unavailable": health.unavailable,
+                "open_for": max(0.0, health.opened_until - now),
+            }
+            for name, health in self._health.items()
+        }
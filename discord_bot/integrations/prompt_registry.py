@@ -0,0 +1,114 @@
+"""In-memory registry for the role prompts in system_prompt_role.json."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from ..core.tokens import estimate_tokens
+
+logger = logging.getLogger("discord_digest_bot")
+
+PROMPT_RELOAD_CHECK_INTERVAL = float(os.getenv("PROMPT_RELOAD_CHECK_INTERVAL", "5"))
+
+
+class RolePrompt:
+    """A parsed role prompt with its token length computed once at load time."""
+
+    __slots__ = ("role", "text", "tokens")
+
+    def __init__(self, role: str, text: str) -> None:
+        self.role = role
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+    def __repr__(self) -> str:
+        return f"RolePrompt(role={self.role!r}, tokens={self.tokens})"
+
+
+class PromptRegistry:
+    """Load role prompts once and reload them only when the file's mtime changes.
+
+    - 讀檔與 JSON 解析只在第一次使用或檔案更新後發生，平常只是查 dict
+    - 最多每 `check_interval` 秒 stat 一次檔案，熱路徑上不做檔案 I/O
+    - 找不到角色或檔案壞掉時退回 fallback prompt（只在狀態變化時記 log）
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fallback: str,
+        *,
+        check_interval: float = PROMPT_RELOAD_CHECK_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.path = path
+        self.fallback = RolePrompt("basic", fallback)
+        self.check_interval = check_interval
+        self.loads = 0
+        self._clock = clock
+        self._prompts: dict[str, RolePrompt] = {}
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._missing_roles: set[str] = set()
+
+    def get(self, role: str) -> RolePrompt:
+        self._maybe_reload()
+        prompt = self._prompts.get(role)
+        if prompt is not None:
+            return prompt
+        if role not in self._missing_roles:
+            self._missing_roles.add(role)
+            logger.warning("system_prompt_role.json 中找不到角色 '%s'，使用內建 basic prompt。", role)
+        return self.fallback
+
+    def roles(self) -> dict[str, RolePrompt]:
+        self._maybe_reload()
+        return dict(self._prompts)
+
+    def reload(self) -> None:
+        """Force a re-read on the next lookup."""
+        self._mtime = None
+        self._next_check = 0.0
+
+    def _maybe_reload(self) -> None:
+        now = self._clock()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as exc:
+            if self._mtime is not None or not self.loads:
+                logger.warning("無法讀取 system_prompt_role.json：%s，使用內建 basic prompt。", exc)
+            self._prompts = {}
+            self._mtime = None
+            self.loads += 1
+            return
+        if mtime == self._mtime:
+            return
+        self._load(mtime)
+
+    def _load(self, mtime: float) -> None:
+        self.loads += 1
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as exc:
+            # 檔案寫到一半或格式錯誤：保留上一版，下一次 mtime 變化時再試。
+            logger.warning("無法解析 system_prompt_role.json：%s，沿用目前的 prompt。", exc)
+            return
+        self._prompts = {
+            role: RolePrompt(role, text)
+            for role, text in (raw.items() if isinstance(raw, dict) else [])
+            if isinstance(text, str) and text
+        }
+        self._mtime = mtime
+        self._missing_roles.clear()
+        logger.info(
+            "Loaded %s role prompts from system_prompt_role.json (%s)",
+            len(self._prompts),
+            ", ".join(f"{prompt.role}={prompt.tokens} tokens" for prompt in self._prompts.values()),
+        )
@@ -0,0 +1,129 @@
+import types
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from tests.support import install_discord_stub, reload_module
+
+install_discord_stub()
+compactor = reload_module("discord_bot.features.chat.compactor")
+compact_message_history = compactor.compact_message_history
+shorten_content = compactor.shorten_content
+
+
+def make_messages(*entries):
+    """Build newest-first messages from oldest-first (name, display, content, minute) tuples."""
+    base = datetime(2026, 4, 10, 2, 0, tzinfo=timezone.utc)
+    messages = [
+        types.SimpleNamespace(
+            author=types.SimpleNamespace(name=name, display_name=display_name),
+            content=content,
+            created_at=base + timedelta(minutes=minute),
+        )
+        for name, display_name, content, minute in entries
+    ]
+    return list(reversed(messages))
+
+
+class ChatCompactorTests(unittest.TestCase):
+    def test_shorten_content_replaces_urls_emoji_and_code_blocks(self):
+        content = "看 https://www.example.com/a/b?c=1 <:pepe:123456> ```py\nprint(1)\nprint(2)\n```"
+
+        self.assertEqual(shorten_content(content), "看 <連結:example.com> :pepe: [程式碼 2 行]")
+
+    def test_merges_consecutive_lines_and_lists_author_ids_once(self):
+        messages = make_messages(
+            ("alpha", "Alpha", "第一句", 0),
+            ("alpha", "Alpha", "第二句", 1),
+            ("beta", "Beta", "回覆", 2),
+        )
+
+        transcript = compact_message_history(messages)
+
+        self.assertEqual(
+            transcript.text.splitlines(),
+            [
+                "參與者對照：Alpha=id:alpha、Beta=id:beta",
+                "[10:00] Alpha: 第一句 / 第二句",
+                "[10:02] Beta: 回覆",
+            ],
+        )
+
+    def test_near_duplicate_spam_is_collapsed_with_count(self):
+        messages = make_messages(
+            ("alpha", "Alpha", "哈哈哈哈", 0),
+            ("beta", "Beta", "好", 1),
+            ("alpha", "Alpha", "哈哈哈!!", 2),
+            ("alpha", "Alpha", "哈哈", 3),
+            ("beta", "Beta", "", 4),
+        )
+
+        transcript = compact_message_history(messages)
+
+        self.assertIn("[10:00] Alpha: 哈哈哈哈 (×3)", transcript.text)
+        self.assertEqual(transcript.dropped_messages, 3)
+        self.assertGreater(transcript.saved_tokens, 0)
+
+    def test_same_words_from_different_authors_are_kept(self):
+        messages = make_messages(("alpha", "Alpha", "+1", 0), ("beta", "Beta", "+1", 1))
+
+        transcript = compact_message_history(messages)
+
+        self.assertIn("Alpha: +1", transcript.text)
+        self.assertIn("Beta: +1", transcript.text)
+        self.assertEqual(transcript.dropped_messages, 0)
+
+    def test_different_links_are_not_collapsed_as_duplicates(self):
+        messages = make_messages(
+            ("alpha", "Alpha", "https://example.com/a", 0),
+            ("alpha", "Alpha", "https://example.com/b", 1),
+        )
+
+        transcript = compact_message_history(messages)
+
+        self.assertIn("<連結:example.com> / <連結:example.com>", transcript.text)
+        self.assertEqual(transcript.dropped_messages, 0)
+
+    def test_duplicate_author_display_names_get_distinct_aliases(self):
+        messages = make_messages(("alpha", "同名", "一", 0), ("beta", "同名", "二", 1))
+
+        transcript = compact_message_history(messages)
+
+        self.assertIn("同名=id:alpha、同名#2=id:beta", transcript.text)
+        self.assertIn("同名#2: 二", transcript.text)
+
+    def test_token_budget_drops_oldest_lines_first(self):
+        messages = make_messages(*[(f"user{index}", f"User{index}", f"第 {index} 則訊息內容", index * 10) for index in range(20)])
+
+        transcript = compact_message_history(messages, token_budget=120)
+
+        self.assertLessEqual(transcript.compacted_tokens, 140)
+        self.assertIn("第 19 則訊息內容", transcript.text)
+        self.assertNotIn("第 0 則訊息內容", transcript.text)
+        self.assertIn("因長度限制省略", transcript.text)
+
+
+class StreamCompactedHistoryTests(unittest.IsolatedAsyncioTestCase):
+    async def test_streamed_transcript_matches_batch_compaction(self):
+        messages = make_messages(
+            ("alpha", "Alpha", "早安", 0),
+            ("beta", "Beta", "午安", 1),
+            ("alpha", "Alpha", "晚安", 2),
+        )
+        for message_id, message in enumerate(reversed(messages), start=1):
+            message.id = message_id
+            message.author.bot = False
+
+        class FakeChannel:
+            async def history(self, *, limit, after=None, before=None, oldest_first=False):
+                for message in messages[:limit]:
+                    yield message
+
+        transcript = await compactor.stream_compacted_history(FakeChannel(), limit=10)
+
+        self.assertEqual(transcript.text, compact_message_history(messages).text)
+        self.assertEqual(transcript.message_count, 3)
+        self.assertEqual(transcript.newest_message_id, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,11 @@
+import os
+import tempfile
+import types
 import unittest
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
 
+from discord_bot.db.message_archive_repository import MessageArchiveRepository
 from tests.support import install_discord_stub, reload_module
 
 install_discord_stub()
@@ -15,27 +20,69 @@ class FakeAuthor:
 
 
 class FakeMessage:
-    def __init__(self, *, name: str, display_name: str, content: str, created_at: datetime, bot: bool = False):
+    def __init__(
+        self,
+        *,
+        name: str,
+        display_name: str,
+        content: str,
+        created_at: datetime,
+        bot: bool = False,
+        message_id: int = 0,
+    ):
+        self.id = message_id
         self.author = FakeAuthor(name=name, display_name=display_name, bot=bot)
         self.content = content
         self.created_at = created_at
+        self.channel = types.SimpleNamespace(id=10)
+        self.guild = types.SimpleNamespace(id=1)
 
 
 class FakeChannel:
     def __init__(self, messages):
+        self.id = 10
         self._messages = list(messages)
+        self.history_calls = []
 
-    async def history(self, *, limit, after=None, oldest_first=False):
+    async def history(self, *, limit, after=None, before=None, oldest_first=False):
+        self.history_calls.append({"limit": limit, "after": after, "before": before})
         emitted = 0
         for message in self._messages:
             if after and message.created_at <= after:
                 continue
+            if before and message.created_at >= before:
+                continue
             yield message
             emitted += 1
             if emitted >= limit:
                 break
 
 
+class SnowflakeChannel(FakeChannel):
+    async def history(self, *, limit, after=None, before=None, oldest_first=False):
+        self.history_calls.append({"limit": limit, "after": after, "before": before})
+        emitted = 0
+        for message in sorted(self._messages, key=lambda item: item.id, reverse=True):
+            if after is not None and message.id <= after.id:
+                continue
+            if before is not None and message.id >= before.id:
+                continue
+            yield message
+            emitted += 1
+            if emitted >= limit:
+                break
+
+
+def snowflake_messages(base, count, *, step=timedelta(minutes=1)):
+    messages = [
+        FakeMessage(name=f"u{index}", display_name=f"User {index}", content=str(index), created_at=base + step * index)
+        for index in range(1, count + 1)
+    ]
+    for message in messages:
+        message.id = history.SnowflakeBound.from_datetime(message.created_at).id
+    return messages
+
+
 class ChatHistoryTests(unittest.IsolatedAsyncioTestCase):
     async def test_collect_non_bot_messages_skips_bots_and_respects_limit(self):
         now = datetime.now(timezone.utc)
@@ -66,6 +113,206 @@ class ChatHistoryTests(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual([message.content for message in messages], ["new"])
 
+    async def test_collect_with_archive_backfills_gap_once_then_serves_locally(self):
+        base = datetime(2026, 4, 10, 8, 0, tzinfo=timezone.utc)
+        live = FakeMessage(
+            name="u3", display_name="User 3", content="live", created_at=base + timedelta(hours=2), message_id=3
+        )
+        gap_messages = [
+            FakeMessage(name="u2", display_name="User 2", content="gap new", created_at=base + timedelta(hours=1), message_id=2),
+            FakeMessage(name="u1", display_name="User 1", content="gap old", created_at=base, message_id=1),
+        ]
+        channel = FakeChannel(gap_messages)
+
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            os.environ, {"MESSAGE_ARCHIVE_PATH": os.path.join(temp_dir, "archive.db")}
+        ):
+            archive = MessageArchiveRepository()
+            archive.start_session(base + timedelta(hours=1, minutes=30))
+            archive.store_message(live)
+            after = base - timedelta(hours=1)
+
+            first = await history.collect_non_bot_messages(channel, limit=10, after=after, archive=archive)
+            second = await history.collect_non_bot_messages(channel, limit=10, after=after, archive=archive)
+            archive.close()
+
+        self.assertEqual([message.content for message in first], ["live", "gap new", "gap old"])
+        self.assertEqual([message.content for message in second], ["live", "gap new", "gap old"])
+        self.assertEqual(len(channel.history_calls), 1)
+        self.assertEqual(channel.history_calls[0]["before"], base + timedelta(hours=1, minutes=30))
+
+    async def test_truncated_backfill_does_not_lose_the_boundary_message(self):
+        base = datetime(2026, 4, 10, 8, 0, tzinfo=timezone.utc)
+        channel = FakeChannel(
+            [
+                FakeMessage(
+                    name=f"u{index}",
+                    display_name=f"User {index}",
+                    content=str(index),
+                    created_at=base + timedelta(minutes=index),
+                    message_id=index,
+                )
+                for index in range(10, 0, -1)
+            ]
+        )
+
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            os.environ, {"MESSAGE_ARCHIVE_PATH": os.path.join(temp_dir, "archive.db")}
+        ):
+            archive = MessageArchiveRepository()
+            archive.start_session(base + timedelta(hours=1))
+            after = base - timedelta(hours=1)
+
+            truncated = await history.collect_non_bot_messages(channel, limit=4, after=after, archive=archive)
+            wider = await history.collect_non_bot_messages(channel, limit=10, after=after, archive=archive)
+            again = await history.collect_non_bot_messages(channel, limit=10, after=after, archive=archive)
+            archive.close()
+
+        self.assertEqual([message.content for message in truncated], ["10", "9", "8", "7"])
+        expected = [str(index) for index in range(10, 0, -1)]
+        self.assertEqual([message.content for message in wider], expected)
+        self.assertEqual([message.content for message in again], expected)
+
+    async def test_collect_with_archive_skips_discord_when_window_is_covered(self):
+        base = datetime(2026, 4, 10, 8, 0, tzinfo=timezone.utc)
+        channel = FakeChannel([])
+
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            os.environ, {"MESSAGE_ARCHIVE_PATH": os.path.join(temp_dir, "archive.db")}
+        ):
+            archive = MessageArchiveRepository()
+            archive.start_session(base)
+            archive.store_message(
+                FakeMessage(name="u1", display_name="User 1", content="hi", created_at=base + timedelta(minutes=5), message_id=5)
+            )
+
+            messages = await history.collect_non_bot_messages(channel, limit=10, after=base, archive=archive)
+            archive.close()
+
+        self.assertEqual([message.content for message in messages], ["hi"])
+        self.assertEqual(channel.history_calls, [])
+
+    async def test_collected_messages_are_compact_records_with_shared_authors(self):
+        now = datetime.now(timezone.utc)
+        channel = FakeChannel(
+            [
+                FakeMessage(name="u1", display_name="User 1", content="a", created_at=now, message_id=3),
+                FakeMessage(name="u2", display_name="User 2", content="b", created_at=now, message_id=2),
+                FakeMessage(name="u1", display_name="User 1", content="c", created_at=now, message_id=1),
+            ]
+        )
+
+        messages = await history.collect_non_bot_messages(channel, limit=3)
+
+        self.assertTrue(all(isinstance(message, history.MessageRecord) for message in messages))
+        self.assertFalse(hasattr(messages[0], "__dict__"))
+        self.assertIs(messages[0].author, messages[2].author)
+        self.assertEqual([message.id for message in messages], [3, 2, 1])
+
+    async def test_stream_stops_reading_history_once_limit_is_reached(self):
+        now = datetime.now(timezone.utc)
+        consumed = []
+
+        class CountingChannel(FakeChannel):
+            async def history(self, **kwargs):
+                async for message in super().history(**kwargs):
+                    consumed.append(message.id)
+                    yield message
+
+        channel = CountingChannel(
+            [
+                FakeMessage(name=f"u{index}", display_name=f"User {index}", content=str(index), created_at=now, message_id=index)
+                for index in range(1000)
+            ]
+        )
+
+        stream = history.stream_non_bot_messages(channel, limit=1000)
+        first = [await anext(stream) for _ in range(3)]
+        await stream.aclose()
+
+        self.assertEqual([message.content for message in first], ["0", "1", "2"])
+        self.assertLess(len(consumed), 1000)
+
+    async def test_stream_surfaces_history_errors(self):
+        class BrokenChannel(FakeChannel):
+            async def history(self, **kwargs):
+                raise PermissionError("forbidden")
+                yield
+
+        with self.assertRaises(PermissionError):
+            await history.collect_non_bot_messages(BrokenChannel([]), limit=5)
+
+    async def test_time_sliced_fetch_merges_slices_newest_first_and_cuts_to_limit(self):
+        base = datetime.now(timezone.utc) - timedelta(hours=8)
+        messages = [
+            FakeMessage(
+                name=f"u{index}",
+                display_name=f"User {index}",
+                content=str(index),
+                created_at=base + timedelta(minutes=index),
+                bot=index % 10 == 0,
+            )
+            for index in range(1, 400)
+        ]
+        for message in messages:
+            message.id = history.SnowflakeBound.from_datetime(message.created_at).id
+
+        channel = SnowflakeChannel(messages)
+        budget = history.HistoryFetchBudget(max_concurrent=2, pages_per_second=0)
+
+        with patch.object(history, "history_fetch_budget", budget):
+            sliced = await history.collect_non_bot_messages(channel, limit=300, after=base, fetch_multiplier=2.0, slices=4)
+        sequential = await history.collect_non_bot_messages(FakeChannel(list(reversed(messages))), limit=300, after=base, fetch_multiplier=2.0)
+
+        self.assertEqual([message.content for message in sliced], [message.content for message in sequential])
+        self.assertGreater(len({call["after"].id for call in channel.history_calls}), 1)
+
+    async def test_older_slices_stop_once_newer_slices_fill_the_limit(self):
+        base = datetime.now(timezone.utc) - timedelta(hours=8)
+        # 全部訊息都落在最新的分段裡。
+        channel = SnowflakeChannel(snowflake_messages(base + timedelta(hours=7), 300, step=timedelta(seconds=10)))
+        budget = history.HistoryFetchBudget(max_concurrent=1, pages_per_second=0)
+
+        with patch.object(history, "history_fetch_budget", budget):
+            messages = await history.collect_non_bot_messages(channel, limit=50, after=base, slices=4)
+
+        self.assertEqual(len(messages), 50)
+        self.assertEqual(len(channel.history_calls), 1)
+
+    async def test_archive_gap_is_backfilled_in_slices(self):
+        base = datetime.now(timezone.utc) - timedelta(hours=8)
+        channel = SnowflakeChannel(snowflake_messages(base, 120, step=timedelta(minutes=3)))
+        budget = history.HistoryFetchBudget(max_concurrent=2, pages_per_second=0)
+
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            os.environ, {"MESSAGE_ARCHIVE_PATH": os.path.join(temp_dir, "archive.db")}
+        ), patch.object(history, "history_fetch_budget", budget):
+            archive = MessageArchiveRepository()
+            archive.start_session(datetime.now(timezone.utc))
+
+            first = await history.collect_non_bot_messages(channel, limit=500, after=base, archive=archive, slices=4)
+            calls = len(channel.history_calls)
+            second = await history.collect_non_bot_messages(channel, limit=500, after=base, archive=archive, slices=4)
+            archive.close()
+
+        expected = [str(index) for index in range(120, 0, -1)]
+        self.assertEqual([message.content for message in first], expected)
+        self.assertEqual([message.content for message in second], expected)
+        self.assertGreater(len({call["after"].id for call in channel.history_calls}), 1)
+        self.assertEqual(len(channel.history_calls), calls)
+
+    def test_slice_window_covers_range_without_gaps(self):
+        after = datetime(2026, 4, 1, tzinfo=timezone.utc)
+        before = after + timedelta(days=7)
+
+        ranges = history.slice_window(after, before, 4)
+
+        self.assertEqual(len(ranges), 4)
+        self.assertIsNone(ranges[0][1])
+        self.assertEqual(ranges[-1][0].id, history.SnowflakeBound.from_datetime(after).id)
+        for newer, older in zip(ranges, ranges[1:]):
+            self.assertEqual(newer[0].id, older[1].id)
+
     def test_format_message_history_can_include_author_id(self):
         messages = [
             FakeMessage(
@@ -0,0 +1,129 @@
+import types
+import unittest
+
+from tests.support import install_discord_stub, reload_module
+
+install_discord_stub()
+streaming = reload_module("discord_bot.features.chat.streaming")
+local_llm = reload_module("discord_bot.integrations.local_llm")
+
+
+def make_message(content, deleted):
+    message = types.SimpleNamespace(content=content, edits=[])
+
+    async def edit(*, content):
+        message.content = content
+        message.edits.append(content)
+
+    async def delete():
+        deleted.append(message)
+
+    message.edit = edit
+    message.delete = delete
+    return message
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+        self.deleted = []
+
+    async def send(self, content, wait=False):
+        message = make_message(content, self.deleted)
+        self.messages.append(message)
+        return message
+
+
+class FakeInteraction:
+    def __init__(self):
+        self.followup = FakeFollowup()
+        # 排隊時 interaction_queue_notifier 寫進原本回應的提示。
+        self.original = "⏳ 輪到你了，SERN 正在處理…"
+        self.original_edits = []
+        self.original_deleted = False
+
+    async def edit_original_response(self, *, content):
+        self.original = content
+        self.original_edits.append(content)
+        return make_message(content, [])
+
+    async def delete_original_response(self):
+        self.original_deleted = True
+
+
+class StreamingReplyTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.interaction = FakeInteraction()
+        self.followup = self.interaction.followup
+
+    async def test_first_text_is_sent_immediately_and_later_updates_are_throttled(self):
+        reply = streaming.StreamingReply(self.interaction, prefix="Q\n\n", interval=60)
+
+        await reply.update("第一")
+        await reply.update("第一第二")
+        await reply.finish("第一第二第三")
+
+        self.assertEqual(self.followup.messages, [])
+        self.assertEqual(self.interaction.original_edits, ["Q\n\n第一 ▌", "Q\n\n第一第二第三"])
+        self.assertEqual(self.interaction.original, "Q\n\n第一第二第三")
+
+    async def test_long_answer_continues_in_new_followup_messages(self):
+        reply = streaming.StreamingReply(self.interaction, limit=20, interval=0)
+        text = "\n".join(f"第 {index} 行" for index in range(10))
+
+        await reply.update(text[:15])
+        await reply.finish(text)
+
+        contents = [self.interaction.original] + [message.content for message in self.followup.messages]
+        self.assertGreater(len(contents), 1)
+        self.assertTrue(all(len(content) <= 20 for content in contents))
+        self.assertEqual("\n".join(contents), text)
+
+    async def test_finish_without_updates_replaces_the_queue_notice(self):
+        reply = streaming.StreamingReply(self.interaction)
+
+        await reply.finish("cached summary")
+
+        self.assertTrue(reply.sent)
+        self.assertEqual(self.interaction.original, "cached summary")
+        self.assertEqual(self.followup.messages, [])
+
+    async def test_finish_deletes_surplus_pages_left_by_partial_updates(self):
+        reply = streaming.StreamingReply(self.interaction, limit=20, interval=0)
+
+        await reply.update("\n".join(f"第 {index} 行" for index in range(10)))
+        pages = len(self.followup.messages)
+        await reply.finish("短答案")
+
+        self.assertGreater(pages, 0)
+        self.assertEqual(self.interaction.original, "短答案")
+        self.assertEqual(len(self.followup.deleted), pages)
+
+    async def test_error_inside_context_removes_partial_pages(self):
+        with self.assertRaises(RuntimeError):
+            async with streaming.StreamingReply(self.interaction, limit=20, interval=0) as reply:
+                await reply.update("\n".join(f"第 {index} 行" for index in range(10)))
+                raise RuntimeError("stream broke")
+
+        self.assertTrue(self.interaction.original_deleted)
+        self.assertEqual(len(self.followup.deleted), len(self.followup.messages))
+        self.assertFalse(reply.sent)
+
+    async def test_finished_reply_is_kept_when_context_exits(self):
+        async with streaming.StreamingReply(self.interaction) as reply:
+            await reply.finish("完成")
+
+        self.assertFalse(self.interaction.original_deleted)
+        self.assertEqual(self.interaction.original, "完成")
+
+
+class LocalLLMStreamParsingTests(unittest.TestCase):
+    def test_parse_sse_delta(self):
+        self.assertEqual(local_llm.parse_sse_delta(b'data: {"choices":[{"delta":{"content":"hi"}}]}\n'), "hi")
+        self.assertEqual(local_llm.parse_sse_delta(b": keep-alive\n"), "")
+        self.assertEqual(local_llm.parse_sse_delta(b'data: {"choices":[{"delta":{"role":"assistant"}}]}'), "")
+        self.assertIsNone(local_llm.parse_sse_delta(b"data: [DONE]\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
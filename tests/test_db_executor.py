@@ -0,0 +1,109 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from discord_bot.db.executor import DBExecutor
+from discord_bot.db.repository import SummaryRepository
+
+
+class DBExecutorTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.executor = DBExecutor(slow_call_seconds=10)
+
+    async def asyncTearDown(self):
+        self.executor.shutdown()
+
+    async def test_calls_run_on_one_dedicated_thread_without_blocking_the_loop(self):
+        loop_thread = threading.get_ident()
+        threads = []
+        ticks = 0
+
+        def blocking_call():
+            threads.append(threading.get_ident())
+            time.sleep(0.05)
+            return "ok"
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticking = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(self.executor.run("test.call", blocking_call) for _ in range(2)))
+        ticking.cancel()
+
+        self.assertEqual(results, ["ok", "ok"])
+        self.assertEqual(len(set(threads)), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+        self.assertGreater(ticks, 5)
+
+    async def test_snapshot_reports_blocking_time_per_label(self):
+        await self.executor.run("summaries.insert", time.sleep, 0.02)
+        await self.executor.run("summaries.insert", time.sleep, 0)
+
+        stats = self.executor.snapshot()["operations"]["summaries.insert"]
+
+        self.assertEqual((stats["calls"], stats["errors"]), (2, 0))
+        self.assertGreaterEqual(stats["max_ms"], 20)
+        self.assertGreaterEqual(stats["total_ms"], stats["max_ms"])
+        self.assertEqual(self.executor.snapshot()["pending"], 0)
+
+    async def test_errors_are_counted_and_reraised(self):
+        def fail():
+            raise sqlite3.OperationalError("database is locked")
+
+        with self.assertRaises(sqlite3.OperationalError):
+            await self.executor.run("settings.get", fail)
+
+        self.assertEqual(self.executor.snapshot()["operations"]["settings.get"]["errors"], 1)
+
+    async def test_slow_calls_are_logged(self):
+        executor = DBExecutor(slow_call_seconds=0)
+        with self.assertLogs("discord_digest_bot", level="WARNING") as logs:
+            await executor.run("summaries.insert", lambda: None)
+        executor.shutdown()
+
+        self.assertIn("Slow DB call summaries.insert", logs.output[0])
+
+    async def test_reads_are_not_queued_behind_a_slow_write(self):
+        release = threading.Event()
+        write = asyncio.ensure_future(self.executor.run("summaries.flush", release.wait, 1))
+        await asyncio.sleep(0.01)
+
+        reader_thread = await asyncio.wait_for(self.executor.run_read("settings.get", threading.get_ident), 0.5)
+
+        self.assertFalse(write.done())
+        release.set()
+        await write
+        self.assertNotEqual(reader_thread, threading.get_ident())
+
+    async def test_calls_after_shutdown_run_inline(self):
+        self.executor.shutdown()
+
+        self.assertEqual(await self.executor.run("late.write", threading.get_ident), threading.get_ident())
+        self.assertEqual(self.executor.snapshot()["operations"]["late.write"]["calls"], 1)
+
+    async def test_repository_async_insert_is_written_from_the_db_thread(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sqlite_path = os.path.join(temp_dir, "summaries.db")
+            with patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": sqlite_path}, clear=False):
+                repository = SummaryRepository()
+                repository.init()
+
+                await repository.insert_summary_async({"channel_id": "general", "summary": "非同步寫入"})
+                await repository.writes.close()
+
+                rows = repository.conn.execute("SELECT channel_id, summary FROM summaries").fetchall()
+                repository.conn.close()
+
+        self.assertEqual(rows, [("general", "非同步寫入")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -40,12 +40,18 @@ class SummaryRepositoryTests(unittest.TestCase):
                 conn = sqlite3.connect(sqlite_path)
                 try:
                     row = conn.execute(
-                        "SELECT channel_id, user_id, command, question, prompt, summary, call_time FROM summaries"
+                        "SELECT id, channel_id, user_id, command, question, prompt, summary, call_time, prompt_hash "
+                        "FROM summaries"
                     ).fetchone()
+                    stored = conn.execute("SELECT prompt_hash, codec, original_length FROM summary_prompts").fetchall()
                 finally:
                     conn.close()
 
-                self.assertEqual(row, tuple(record.values()))
+                summary_id, *values, prompt_hash = row
+                expected = dict(record, prompt=None)
+                self.assertEqual(tuple(values), tuple(expected.values()))
+                self.assertEqual(stored, [(prompt_hash, "zlib", len("prompt"))])
+                self.assertEqual(repository.get_prompt(summary_id).text, "prompt")
                 repository.conn.close()
 
     def test_postgres_without_database_url_disables_writes(self):
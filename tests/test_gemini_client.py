@@ -1,3 +1,4 @@
+import asyncio
 import importlib
 import os
 import sys
@@ -45,6 +46,7 @@ class GeminiClientTests(unittest.IsolatedAsyncioTestCase):
         types_stub = types.ModuleType("google.genai.types")
         genai_stub.Client = FakeClient
         types_stub.GenerateContentConfig = FakeGenerateContentConfig
+        types_stub.CreateCachedContentConfig = FakeGenerateContentConfig
         genai_stub.types = types_stub
         google_stub.genai = genai_stub
 
@@ -159,6 +161,293 @@ class GeminiClientTests(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(fake_generate.await_count, 1)
 
+    async def test_rate_limit_with_retry_hint_pauses_shared_limiter_and_retries(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        client_error_type = type("ClientError", (Exception,), {"__module__": "google.genai.errors"})
+        rate_limit_error = client_error_type("429 RESOURCE_EXHAUSTED")
+        rate_limit_error.code = 429
+        rate_limit_error.details = {
+            "error": {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "0.01s"}]}
+        }
+        fake_generate = FakeClient.instances[0].aio.models.generate_content
+        fake_generate.side_effect = [rate_limit_error, types.SimpleNamespace(text="ok")]
+
+        response = await module.gemini_model.generate_content_async("prompt")
+
+        self.assertEqual(response.text, "ok")
+        self.assertEqual(fake_generate.await_count, 2)
+        self.assertIs(module.gemini_model.rate_limiter, module.role_model.rate_limiter)
+        self.assertEqual(module.gemini_rate_limiter.pauses, 1)
+
+    def test_retry_after_seconds_reads_message_text(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        self.assertEqual(module.retry_after_seconds(RuntimeError("Quota exceeded. Please retry in 34.5s.")), 34.5)
+        self.assertIsNone(module.retry_after_seconds(RuntimeError("429 RESOURCE_EXHAUSTED")))
+        self.assertEqual(
+            module.gemini_user_message(module.RateLimitExceededError("Gemini quota exhausted")),
+            module.GEMINI_RATE_LIMIT_MESSAGE,
+        )
+
+    async def test_stream_falls_back_before_first_chunk_and_accumulates_text(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        server_error_type = type("ServerError", (Exception,), {"__module__": "google.genai.errors"})
+        busy_error = server_error_type("503 UNAVAILABLE")
+        busy_error.code = 503
+
+        async def chunks():
+            for text in ("第一段", "", "第二段"):
+                yield types.SimpleNamespace(text=text)
+
+        fake_stream = AsyncMock(side_effect=[busy_error, chunks()])
+        FakeClient.instances[0].aio.models.generate_content_stream = fake_stream
+        seen = []
+
+        async def on_text(text):
+            seen.append(text)
+
+        text, block_reason = await module.stream_text(module.gemini_model.generate_content_stream_async("prompt"), on_text)
+
+        self.assertEqual((text, block_reason), ("第一段第二段", None))
+        self.assertEqual(seen, ["第一段", "第一段第二段"])
+        self.assertEqual(
+            [call.kwargs["model"] for call in fake_stream.await_args_list],
+            ["gemini-3.5-flash", "gemini-3-flash-preview"],
+        )
+        health = module.gemini_model.router.health("gemini-3-flash-preview")
+        self.assertEqual(len(health.recent), 1)
+        self.assertIsNotNone(health.latency)
+
+    async def test_adapter_skips_model_with_open_circuit(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        router = module.gemini_model.router
+        for _ in range(router.failure_threshold):
+            router.record_failure("gemini-3.5-flash", 503)
+        fake_generate = FakeClient.instances[0].aio.models.generate_content
+
+        response = await module.gemini_model.generate_content_async("prompt")
+
+        self.assertEqual(response.text, "ok")
+        self.assertEqual(fake_generate.await_args.kwargs["model"], "gemini-3-flash-preview")
+        state = module.gemini_model.router_state()
+        self.assertEqual(list(state)[-1], "gemini-3.5-flash")
+        self.assertEqual(state["gemini-3.5-flash"]["state"], "open")
+        self.assertEqual(state["gemini-3-flash-preview"]["requests"], 1)
+
+    async def test_hedged_request_returns_first_answer_and_cancels_slow_primary(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        model = module.gemini_model
+        model.hedging = True
+        for _ in range(10):
+            model.router.record_success("gemini-3.5-flash", 0.01)
+        primary_cancelled = asyncio.Event()
+
+        async def generate_content(*, model, contents, config=None):
+            if model == "gemini-3.5-flash":
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    primary_cancelled.set()
+                    raise
+            return types.SimpleNamespace(text=f"from {model}")
+
+        FakeClient.instances[0].aio.models.generate_content = generate_content
+
+        response = await model.generate_content_async("prompt")
+        await asyncio.wait_for(primary_cancelled.wait(), 1)
+
+        self.assertEqual(response.text, "from gemini-3-flash-preview")
+        self.assertEqual(model.hedges.snapshot(), {"launched": 1, "wins": 1, "denied": 0})
+
+    async def test_hedges_are_capped_per_minute(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        model = module.gemini_model
+        model.hedging = True
+        model.hedges = module.HedgeBudget(0)
+        for _ in range(10):
+            model.router.record_success("gemini-3.5-flash", 0.001)
+        calls = []
+
+        async def generate_content(*, model, contents, config=None):
+            calls.append(model)
+            await asyncio.sleep(0.02)
+            return types.SimpleNamespace(text="ok")
+
+        FakeClient.instances[0].aio.models.generate_content = generate_content
+
+        response = await model.generate_content_async("prompt")
+
+        self.assertEqual(response.text, "ok")
+        self.assertEqual(calls, ["gemini-3.5-flash"])
+        self.assertEqual(model.hedges.denied, 1)
+
+    async def test_hedge_is_skipped_when_rate_limiter_has_no_spare_quota(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        model = module.gemini_model
+        model.hedging = True
+        model.rate_limiter = module.RateLimiter("test", requests_per_minute=1, tokens_per_minute=0, max_wait=1)
+        for _ in range(10):
+            model.router.record_success("gemini-3.5-flash", 0.001)
+        calls = []
+
+        async def generate_content(*, model, contents, config=None):
+            calls.append(model)
+            await asyncio.sleep(0.02)
+            return types.SimpleNamespace(text="ok")
+
+        FakeClient.instances[0].aio.models.generate_content = generate_content
+
+        response = await model.generate_content_async("prompt")
+
+        self.assertEqual(response.text, "ok")
+        self.assertEqual(calls, ["gemini-3.5-flash"])
+        self.assertEqual(model.hedges.wins, 0)
+
+    async def test_request_waiting_for_quota_does_not_hold_a_scheduler_slot(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+        from discord_bot.core.llm_scheduler import LLMScheduler
+
+        now = [0.0]
+        quota_freed = asyncio.Event()
+        waiting_for_quota = asyncio.Event()
+
+        async def sleep(seconds):
+            waiting_for_quota.set()
+            await quota_freed.wait()
+            now[0] += seconds
+
+        model = module.gemini_model
+        model.hedging = False
+        model.rate_limiter = module.RateLimiter(
+            "test", requests_per_minute=1, tokens_per_minute=0, max_wait=120, clock=lambda: now[0], sleep=sleep
+        )
+        scheduler = LLMScheduler({"gemini": 1})
+
+        with patch.object(module, "llm_scheduler", scheduler):
+            await model.generate_content_async("first")
+            starved = asyncio.create_task(model.generate_content_async("second"))
+            await asyncio.wait_for(waiting_for_quota.wait(), 1)
+
+            # 第二個請求在等額度，scheduler 的唯一 slot 仍可給其他呼叫使用。
+            self.assertEqual(scheduler.snapshot()["gemini"]["active"], 0)
+            self.assertEqual(await asyncio.wait_for(scheduler.run("gemini", AsyncMock(return_value="other")), 1), "other")
+
+            quota_freed.set()
+            response = await asyncio.wait_for(starved, 1)
+
+        self.assertEqual(response.text, "ok")
+        self.assertEqual(model.rate_limiter.waited, 1)
+
+    async def test_streamed_request_is_hedged_on_time_to_first_chunk(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        model = module.gemini_model
+        model.hedging = True
+        for _ in range(10):
+            model.router.record_success("gemini-3.5-flash", 0.01)
+        primary_cancelled = asyncio.Event()
+
+        async def stream(*, model, contents, config=None):
+            async def chunks():
+                if model == "gemini-3.5-flash":
+                    try:
+                        await asyncio.sleep(10)
+                    except asyncio.CancelledError:
+                        primary_cancelled.set()
+                        raise
+                for text in ("from ", model):
+                    yield types.SimpleNamespace(text=text)
+
+            return chunks()
+
+        FakeClient.instances[0].aio.models.generate_content_stream = stream
+        model.rate_limiter = module.RateLimiter("test", requests_per_minute=10, tokens_per_minute=0, max_wait=1)
+
+        received = [chunk.text async for chunk in model.generate_content_stream_async("prompt")]
+        await asyncio.wait_for(primary_cancelled.wait(), 1)
+
+        self.assertEqual("".join(received), "from gemini-3-flash-preview")
+        self.assertEqual(model.hedges.snapshot(), {"launched": 1, "wins": 1, "denied": 0})
+        # 對沖同樣佔用 rate limiter 的 request 額度。
+        self.assertLess(model.rate_limiter.snapshot()["requests_available"], 8.1)
+
+    async def test_repeated_context_is_sent_once_through_gemini_context_cache(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        model = module.gemini_model
+        model.contexts = module.ContextCache(min_tokens=1)
+        aio = FakeClient.instances[0].aio
+        aio.caches = types.SimpleNamespace(create=AsyncMock(return_value=types.SimpleNamespace(name="cachedContents/1")))
+
+        async def chunks():
+            yield types.SimpleNamespace(text="answer")
+
+        aio.models.generate_content_stream = AsyncMock(side_effect=lambda **kwargs: chunks())
+        context = [{"role": "model", "parts": ["system"]}, {"role": "user", "parts": ["long history"]}]
+
+        async def ask(question):
+            return [chunk.text async for chunk in model.generate_with_context_stream_async(context, question)]
+
+        self.assertEqual(await ask("q1"), ["answer"])
+        self.assertEqual(await ask("q2"), ["answer"])
+        self.assertEqual(await ask("q3"), ["answer"])
+
+        first, second, third = [call.kwargs for call in aio.models.generate_content_stream.await_args_list]
+        self.assertIn("long history", first["contents"])
+        self.assertTrue(first["contents"].endswith("User:\nq1"))
+        self.assertEqual(second["contents"], "q2")
+        self.assertEqual(second["config"].kwargs, {"cached_content": "cachedContents/1"})
+        self.assertEqual(third["contents"], "q3")
+        self.assertEqual(aio.caches.create.await_count, 1)
+        self.assertEqual(aio.caches.create.await_args.kwargs["config"].kwargs["contents"], ["System:\nsystem\n\nUser:\nlong history"])
+        self.assertEqual(model.contexts.snapshot()["remote_hits"], 2)
+
+    async def test_expired_context_cache_falls_back_to_full_prompt(self):
+        with patch.dict(os.environ, {"GOOGLE_GENAI_API_KEY": "test-key"}, clear=False):
+            module = importlib.import_module("discord_bot.integrations.gemini_client")
+
+        model = module.gemini_model
+        model.contexts = module.ContextCache(min_tokens=1)
+        aio = FakeClient.instances[0].aio
+        aio.caches = types.SimpleNamespace(create=AsyncMock(return_value=types.SimpleNamespace(name="cachedContents/1")))
+        client_error_type = type("ClientError", (Exception,), {"__module__": "google.genai.errors"})
+        expired = client_error_type("404 NOT_FOUND cached content")
+        expired.code = 404
+
+        async def chunks():
+            yield types.SimpleNamespace(text="answer")
+
+        def stream(**kwargs):
+            if "config" in kwargs:
+                raise expired
+            return chunks()
+
+        aio.models.generate_content_stream = AsyncMock(side_effect=stream)
+
+        for question in ("q1", "q2"):
+            async for _ in model.generate_with_context_stream_async("history", question):
+                pass
+
+        contents = [call.kwargs["contents"] for call in aio.models.generate_content_stream.await_args_list]
+        self.assertEqual(contents, ["history\n\nUser:\nq1", "q2", "history\n\nUser:\nq2"])
+        self.assertEqual(model.contexts.snapshot()["remote_failures"], 1)
+
     def test_missing_api_key_disables_models(self):
         with patch.dict(os.environ, {}, clear=True):
             module = importlib.import_module("discord_bot.integrations.gemini_client")
@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch
+
+from tools import benchmark_llm as benchmark
+from tools import llm_fakes as fakes
+
+from discord_bot.integrations import gemini_client, local_llm
+from discord_bot.integrations.local_llm_client import LocalLLMClient
+
+FAST = fakes.LatencyProfile(median_ms=1, sigma=0, chunks=3, chunk_interval_ms=0)
+
+
+class LLMFakesTests(unittest.IsolatedAsyncioTestCase):
+    async def test_fake_openai_server_streams_and_injects_errors(self):
+        server = fakes.FakeOpenAIServer(latency=FAST)
+        url = await server.start()
+        client = LocalLLMClient()
+        seen = []
+
+        async def on_text(text):
+            seen.append(text)
+
+        try:
+            with patch.object(local_llm, "POST_URL", url), patch.object(local_llm, "local_llm_client", client):
+                answer = await local_llm.query_local_llm("hi", on_text=on_text)
+                server.faults = fakes.FaultProfile(error_503=1.0)
+                failed = await local_llm.query_local_llm("hi")
+        finally:
+            await client.close()
+            await server.stop()
+
+        self.assertTrue(answer.endswith("回覆1回覆2"))
+        self.assertEqual(len(seen), 3)
+        self.assertTrue(failed.startswith("Error contacting local LLM"))
+        self.assertEqual(server.stats.faults, {"503": 1})
+
+    async def test_fake_genai_client_plugs_into_create_models_and_triggers_failover(self):
+        client = fakes.FakeGenaiClient(
+            latency=FAST,
+            model_faults={gemini_client.SUMMARY_MODEL_NAMES[0]: fakes.FaultProfile(error_503=1.0)},
+        )
+        summary_model, role_model = gemini_client._create_models(client)
+        summary_model.router = gemini_client.ModelRouter()
+
+        response = await summary_model.generate_content_async("prompt")
+
+        self.assertEqual(response.text, "".join(fakes._answer_chunks(gemini_client.SUMMARY_MODEL_NAMES[1], 3)))
+        self.assertEqual(client.stats.faults, {"503": 1})
+        self.assertEqual(gemini_client.gemini_user_message(fakes.FakeAPIError(429, "RESOURCE_EXHAUSTED")),
+                         gemini_client.GEMINI_RATE_LIMIT_MESSAGE)
+        self.assertIsNotNone(role_model)
+
+    def test_benchmark_percentiles(self):
+        values = [index / 100 for index in range(101)]
+
+        self.assertEqual(benchmark.percentile(values, 50), 0.5)
+        self.assertEqual(benchmark.percentile(values, 99), 0.99)
+        self.assertIsNone(benchmark.percentile([], 95))
+
+
+if __name__ == "__main__":
+    unittest.main()
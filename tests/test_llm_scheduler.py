@@ -0,0 +1,149 @@
+import asyncio
+import unittest
+
+from discord_bot.core.llm_scheduler import (
+    LLMOverloadedError,
+    LLMPriority,
+    LLMQueueTimeoutError,
+    LLMScheduler,
+    llm_request,
+)
+
+
+class LLMSchedulerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+        self.order = []
+
+    async def occupy(self, scheduler, backend="gemini"):
+        started = asyncio.Event()
+
+        async def hold():
+            started.set()
+            await self.release.wait()
+
+        task = asyncio.create_task(scheduler.run(backend, hold))
+        await started.wait()
+        return task
+
+    def submit(self, scheduler, label, *, guild_id=1, priority=LLMPriority.SUMMARY, on_position=None):
+        async def work():
+            self.order.append(label)
+
+        async def call():
+            with llm_request(guild_id=guild_id, priority=priority, on_position=on_position):
+                await scheduler.run("gemini", work)
+
+        return asyncio.create_task(call())
+
+    async def test_concurrency_is_capped_per_backend(self):
+        scheduler = LLMScheduler({"gemini": 2, "local": 1})
+        active = 0
+        peak = 0
+
+        async def work():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        await asyncio.gather(*(scheduler.run("gemini", work) for _ in range(6)))
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(scheduler.snapshot()["gemini"]["active"], 0)
+
+    async def test_interactive_requests_jump_ahead_of_deep_summaries(self):
+        scheduler = LLMScheduler({"gemini": 1})
+        holder = await self.occupy(scheduler)
+        deep = self.submit(scheduler, "deep", priority=LLMPriority.DEEP)
+        await asyncio.sleep(0)
+        cheap = self.submit(scheduler, "cheap", priority=LLMPriority.INTERACTIVE)
+        await asyncio.sleep(0)
+
+        self.release.set()
+        await asyncio.gather(holder, deep, cheap)
+
+        self.assertEqual(self.order, ["cheap", "deep"])
+
+    async def test_busy_guild_does_not_starve_other_guilds(self):
+        scheduler = LLMScheduler({"gemini": 1})
+        holder = await self.occupy(scheduler)
+        tasks = [self.submit(scheduler, f"a{index}", guild_id=1) for index in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(self.submit(scheduler, "b0", guild_id=2))
+        await asyncio.sleep(0)
+
+        self.release.set()
+        await asyncio.gather(holder, *tasks)
+
+        self.assertLess(self.order.index("b0"), self.order.index("a1"))
+
+    async def test_overloaded_guild_is_shed(self):
+        scheduler = LLMScheduler({"gemini": 1}, max_queue_per_guild=1)
+        holder = await self.occupy(scheduler)
+        queued = self.submit(scheduler, "queued")
+        await asyncio.sleep(0)
+
+        with self.assertRaises(LLMOverloadedError):
+            with llm_request(guild_id=1, priority=LLMPriority.SUMMARY):
+                await scheduler.run("gemini", asyncio.sleep)
+
+        self.release.set()
+        await asyncio.gather(holder, queued)
+        self.assertEqual(scheduler.shed, 1)
+
+    async def test_waiters_receive_queue_positions_then_start_notice(self):
+        scheduler = LLMScheduler({"gemini": 1})
+        positions = []
+
+        async def on_position(position):
+            positions.append(position)
+
+        holder = await self.occupy(scheduler)
+        first = self.submit(scheduler, "first")
+        await asyncio.sleep(0)
+        second = self.submit(scheduler, "second", on_position=on_position)
+        await asyncio.sleep(0)
+
+        self.release.set()
+        await asyncio.gather(holder, first, second)
+        await asyncio.sleep(0)
+
+        self.assertEqual(positions, [1, 0, None])
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = LLMScheduler({"gemini": 1})
+        holder = await self.occupy(scheduler)
+        cancelled = self.submit(scheduler, "cancelled")
+        await asyncio.sleep(0)
+        kept = self.submit(scheduler, "kept")
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.snapshot()["gemini"]["waiting"], 1)
+
+        self.release.set()
+        await asyncio.gather(holder, kept)
+        self.assertEqual(self.order, ["kept"])
+
+    async def test_queue_deadline_gives_up_and_is_counted(self):
+        scheduler = LLMScheduler({"local": 1})
+        holder = await self.occupy(scheduler, backend="local")
+
+        with self.assertRaises(LLMQueueTimeoutError):
+            await scheduler.run("local", asyncio.sleep, max_wait=0.01)
+
+        stats = scheduler.snapshot()["local"]
+        self.assertEqual((stats["waiting"], stats["timed_out"], stats["queued_total"]), (0, 1, 1))
+        self.assertEqual(stats["peak_waiting"], 1)
+
+        self.release.set()
+        await holder
+        await scheduler.run("local", lambda: asyncio.sleep(0), max_wait=0.01)
+        self.assertEqual(scheduler.snapshot()["local"]["active"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from aiohttp import web
+
+from discord_bot.integrations.local_llm_client import LocalLLMClient
+
+
+class LocalLLMClientTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.peers = set()
+        self.delay = 0.0
+
+        async def chat(request):
+            self.peers.add(request.transport.get_extra_info("peername"))
+            await asyncio.sleep(self.delay)
+            return web.json_response({"choices": [{"message": {"content": "ok"}}]})
+
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", chat)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1/chat/completions"
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def test_sequential_requests_reuse_one_connection(self):
+        client = LocalLLMClient(max_connections=2)
+        await client.start()
+        try:
+            for _ in range(3):
+                async with client.post(self.url, {}) as resp:
+                    data = await resp.json()
+                self.assertEqual(data["choices"][0]["message"]["content"], "ok")
+        finally:
+            await client.close()
+
+        self.assertEqual(len(self.peers), 1)
+        stats = client.stats.snapshot()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["errors"], 0)
+        self.assertIsNotNone(stats["total_p95"])
+
+    async def test_first_byte_timeout_is_recorded(self):
+        self.delay = 0.2
+        client = LocalLLMClient(first_byte_timeout=0.05)
+        try:
+            with self.assertRaises(asyncio.TimeoutError):
+                async with client.post(self.url, {}):
+                    pass
+        finally:
+            await client.close()
+
+        stats = client.stats.snapshot()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["errors"], 1)
+        self.assertIsNone(stats["first_byte_p50"])
+        self.assertEqual(client.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import types
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from discord_bot.db.message_archive_repository import ARCHIVE_EPOCH, MessageArchiveRepository
+
+
+def make_message(message_id, *, content="hello", created_at=None, channel_id=10, name="alice"):
+    return types.SimpleNamespace(
+        id=message_id,
+        channel=types.SimpleNamespace(id=channel_id),
+        guild=types.SimpleNamespace(id=1),
+        author=types.SimpleNamespace(name=name, display_name=name.title(), bot=False),
+        content=content,
+        created_at=created_at or datetime(2026, 4, 10, 8, 0, tzinfo=timezone.utc),
+    )
+
+
+class MessageArchiveRepositoryTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        archive_path = os.path.join(self.temp_dir.name, "archive.db")
+        self.env = patch.dict(os.environ, {"MESSAGE_ARCHIVE_PATH": archive_path, "MESSAGE_ARCHIVE_ENABLED": "1"})
+        self.env.start()
+        self.repository = MessageArchiveRepository()
+
+    def tearDown(self):
+        self.repository.close()
+        self.env.stop()
+        self.temp_dir.cleanup()
+
+    def test_coverage_is_unknown_until_session_starts(self):
+        self.assertIsNone(self.repository.covered_from(10))
+
+        started_at = datetime(2026, 4, 10, 9, 0, tzinfo=timezone.utc)
+        self.repository.start_session(started_at)
+
+        self.assertEqual(self.repository.covered_from(10), started_at)
+
+    def test_store_edit_and_delete_keep_archive_current(self):
+        base = datetime(2026, 4, 10, 8, 0, tzinfo=timezone.utc)
+        self.repository.store_message(make_message(1, content="first", created_at=base))
+        self.repository.store_message(make_message(2, content="second", created_at=base + timedelta(minutes=1)))
+
+        self.repository.update_content(1, "first (edited)")
+        self.repository.delete_messages([2])
+
+        messages = self.repository.fetch_recent(10, limit=10)
+        self.assertEqual([(message.id, message.content) for message in messages], [(1, "first (edited)")])
+        self.assertEqual(messages[0].author.display_name, "Alice")
+        self.assertEqual(messages[0].created_at, base)
+
+    def test_extend_coverage_only_moves_earlier(self):
+        started_at = datetime(2026, 4, 10, 9, 0, tzinfo=timezone.utc)
+        self.repository.start_session(started_at)
+
+        self.repository.extend_coverage(10, started_at + timedelta(hours=1))
+        self.assertEqual(self.repository.covered_from(10), started_at)
+
+        self.repository.extend_coverage(10, ARCHIVE_EPOCH)
+        self.assertEqual(self.repository.covered_from(10), ARCHIVE_EPOCH)
+
+    def test_new_session_resets_coverage_and_prunes_expired_messages(self):
+        now = datetime(2026, 4, 20, 0, 0, tzinfo=timezone.utc)
+        self.repository.store_message(make_message(1, created_at=now - timedelta(days=30)))
+        self.repository.store_message(make_message(2, created_at=now - timedelta(days=1)))
+        self.repository.start_session(now - timedelta(hours=1))
+        self.repository.extend_coverage(10, ARCHIVE_EPOCH)
+
+        self.repository.start_session(now)
+
+        self.assertEqual(self.repository.covered_from(10), now)
+        self.assertEqual([message.id for message in self.repository.fetch_recent(10, limit=10)], [2])
+
+    def test_disabled_archive_never_reports_coverage(self):
+        with patch.dict(os.environ, {"MESSAGE_ARCHIVE_ENABLED": "0"}):
+            repository = MessageArchiveRepository()
+            repository.start_session()
+
+            self.assertIsNone(repository.covered_from(10))
+            self.assertFalse(repository.store_message(make_message(1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
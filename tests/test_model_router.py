@@ -0,0 +1,53 @@
+import unittest
+
+from discord_bot.integrations.model_router import ModelRouter
+
+MODELS = ("primary", "secondary", "tertiary")
+
+
+class ModelRouterTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.router = ModelRouter(failure_threshold=2, cooldown=30, slow_factor=2.0, clock=lambda: self.now)
+
+    def test_preference_order_is_kept_while_models_are_healthy(self):
+        self.router.record_success("primary", 1.0)
+        self.router.record_success("secondary", 0.8)
+
+        self.assertEqual(self.router.order(MODELS), list(MODELS))
+
+    def test_circuit_opens_after_consecutive_failures_and_half_opens_after_cooldown(self):
+        self.router.record_failure("primary", 503)
+        self.assertEqual(self.router.order(MODELS)[0], "primary")
+
+        self.router.record_failure("primary", 503)
+        self.assertEqual(self.router.order(MODELS), ["secondary", "tertiary", "primary"])
+        self.assertEqual(self.router.snapshot()["primary"]["state"], "open")
+        self.assertEqual(self.router.snapshot()["primary"]["unavailable"], 2)
+
+        self.now += 31
+        self.assertEqual(self.router.snapshot()["primary"]["state"], "half-open")
+        self.router.record_failure("primary", 429)
+        self.assertTrue(self.router.is_open("primary"))
+
+        self.now += 31
+        self.router.record_success("primary", 1.0)
+        self.assertEqual(self.router.snapshot()["primary"]["state"], "closed")
+
+    def test_slow_model_is_moved_behind_faster_ones(self):
+        self.router.record_success("primary", 9.0)
+        self.router.record_success("secondary", 1.0)
+
+        self.assertEqual(self.router.order(MODELS), ["secondary", "tertiary", "primary"])
+
+    def test_all_open_models_are_still_tried_soonest_recovery_first(self):
+        for name in ("secondary", "primary"):
+            self.router.record_failure(name)
+            self.now += 1
+            self.router.record_failure(name)
+
+        self.assertEqual(self.router.order(("primary", "secondary")), ["secondary", "primary"])
+
+
+if __name__ == "__main__":
+    unittest.main()
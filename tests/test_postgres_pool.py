@@ -0,0 +1,199 @@
+import os
+import threading
+import unittest
+from unittest.mock import patch
+
+import psycopg2
+
+from discord_bot.db import social_preview_settings_repository as settings_module
+from discord_bot.db.postgres_pool import DatabaseUnavailableError, PostgresPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn.fail_next:
+            error, self.conn.fail_next = self.conn.fail_next, None
+            if isinstance(error, psycopg2.OperationalError):
+                self.conn.closed = 2
+            raise error
+        self.conn.executed.append(sql)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail_next = None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class PostgresPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.connections = []
+        self.connect_errors = []
+
+    def connect(self, dsn, connect_timeout):
+        if self.connect_errors:
+            raise self.connect_errors.pop(0)
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+    def make_pool(self, **kwargs):
+        options = {"dsn": "postgresql://demo", "max_size": 2, "checkout_timeout": 0, "ping_interval": 30}
+        options.update(kwargs)
+        return PostgresPool(connect=self.connect, clock=lambda: self.now, **options)
+
+    def test_idle_connection_is_reused(self):
+        pool = self.make_pool()
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(pool.snapshot()["created"], 1)
+
+    def test_pool_is_bounded(self):
+        pool = self.make_pool(max_size=1)
+        with pool.connection():
+            with self.assertRaises(DatabaseUnavailableError):
+                with pool.connection():
+                    pass
+
+        self.assertEqual(pool.snapshot()["size"], 1)
+
+    def test_stale_idle_connection_is_pinged_and_replaced_when_dead(self):
+        pool = self.make_pool()
+        with pool.connection() as first:
+            pass
+        first.fail_next = psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.now = 31
+
+        with pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first.closed, 1)
+        self.assertEqual(pool.snapshot()["discarded"], 1)
+
+    def test_ping_runs_without_holding_the_pool_lock(self):
+        pool = self.make_pool()
+        with pool.connection() as conn:
+            pass
+        self.now = 31
+        snapshots = []
+        execute = FakeCursor.execute
+
+        def slow_ping(cursor, sql, params=None):
+            # 驗證期間另一個 thread 仍能取得 pool 的 lock。
+            thread = threading.Thread(target=lambda: snapshots.append(pool.snapshot()))
+            thread.start()
+            thread.join(1)
+            execute(cursor, sql, params)
+
+        with patch.object(FakeCursor, "execute", slow_ping):
+            with pool.connection() as again:
+                pass
+
+        self.assertIs(conn, again)
+        self.assertEqual(snapshots[0]["in_use"], 1)
+
+    def test_connection_errors_discard_and_other_errors_roll_back(self):
+        pool = self.make_pool()
+        with self.assertRaises(ValueError):
+            with pool.connection() as conn:
+                raise ValueError("bad row")
+        self.assertEqual(pool.snapshot()["idle"], 1)
+        self.assertGreaterEqual(conn.rollbacks, 1)
+
+        with self.assertRaises(psycopg2.InterfaceError):
+            with pool.connection():
+                raise psycopg2.InterfaceError("connection already closed")
+        self.assertEqual(pool.snapshot()["idle"], 0)
+        self.assertEqual(pool.snapshot()["size"], 0)
+
+    def test_reconnect_backs_off_exponentially(self):
+        pool = self.make_pool(retry_seconds=2)
+        self.connect_errors = [psycopg2.OperationalError("refused"), psycopg2.OperationalError("refused")]
+
+        with self.assertRaises(DatabaseUnavailableError):
+            with pool.connection():
+                pass
+        # 退避期間不會真的去連線。
+        with self.assertRaises(DatabaseUnavailableError):
+            with pool.connection():
+                pass
+        self.assertEqual(len(self.connect_errors), 1)
+
+        self.now = 2
+        with self.assertRaises(DatabaseUnavailableError):
+            with pool.connection():
+                pass
+        self.assertEqual(pool.snapshot()["backoff_for"], 4)
+
+        self.now = 6
+        with pool.connection():
+            pass
+        self.assertEqual(pool.snapshot()["connect_failures"], 2)
+        self.assertEqual(pool.snapshot()["backoff_for"], 0)
+
+    def test_schema_runs_once_per_pool(self):
+        pool = self.make_pool()
+        schema = ("demo", ("CREATE TABLE IF NOT EXISTS demo (id INT);",))
+        for _ in range(3):
+            with pool.connection(schema=schema):
+                pass
+
+        self.assertEqual(self.connections[0].executed, ["CREATE TABLE IF NOT EXISTS demo (id INT);"])
+
+
+class PooledRepositoryTests(unittest.TestCase):
+    def test_settings_repository_recovers_after_connection_drop(self):
+        connections = []
+
+        def connect(dsn, connect_timeout):
+            conn = FakeConnection()
+            connections.append(conn)
+            return conn
+
+        pool = PostgresPool(dsn="postgresql://demo", connect=connect, checkout_timeout=0)
+        with patch.dict(os.environ, {"DB_TYPE": "postgres", "DATABASE_URL": "postgresql://demo"}, clear=False), \
+                patch.object(settings_module, "postgres_pool", pool):
+            repository = settings_module.SocialPreviewSettingsRepository()
+            self.assertTrue(repository.init())
+
+            connections[0].fail_next = psycopg2.OperationalError("SSL connection has been closed unexpectedly")
+            self.assertFalse(repository.set_setting("123", "threads", True))
+            self.assertTrue(repository.set_setting("123", "threads", True))
+
+        self.assertTrue(repository.db_enabled)
+        self.assertEqual(len(connections), 2)
+        self.assertEqual(connections[1].commits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
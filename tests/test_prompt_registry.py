@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from discord_bot.integrations.prompt_registry import PromptRegistry
+
+
+class PromptRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "system_prompt_role.json")
+        self.now = 0.0
+        self.write({"basic": "你好", "kurisu": "助手"})
+        self.registry = PromptRegistry(self.path, "fallback", check_interval=5, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, prompts, mtime=None):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(prompts, f, ensure_ascii=False)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_prompts_are_parsed_once_with_token_lengths(self):
+        with mock.patch("builtins.open", wraps=open) as opened:
+            first = self.registry.get("kurisu")
+            self.now += 10
+            second = self.registry.get("kurisu")
+
+        self.assertIs(first, second)
+        self.assertEqual(first.text, "助手")
+        self.assertEqual(first.tokens, 2)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(self.registry.loads, 1)
+
+    def test_reloads_only_after_mtime_changes(self):
+        self.registry.get("basic")
+        self.write({"basic": "更新後"}, mtime=os.stat(self.path).st_mtime + 10)
+
+        self.assertEqual(self.registry.get("basic").text, "你好")
+        self.now += 5
+        self.assertEqual(self.registry.get("basic").text, "更新後")
+        self.assertEqual(self.registry.loads, 2)
+
+    def test_missing_role_and_broken_file_fall_back(self):
+        self.assertEqual(self.registry.get("unknown").text, "fallback")
+
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{broken")
+        os.utime(self.path, (1, 1))
+        self.now += 5
+        self.assertEqual(self.registry.get("basic").text, "你好")
+
+        os.remove(self.path)
+        self.now += 5
+        self.assertEqual(self.registry.get("basic").text, "fallback")
+
+
+if __name__ == "__main__":
+    unittest.main()
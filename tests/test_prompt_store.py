@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from discord_bot.db.prompt_store import CompressedPrompt, LazyPrompt, decompress_prompt
+from discord_bot.db.repository import SummaryRepository
+
+
+class PromptStoreTests(unittest.TestCase):
+    def test_compressed_prompt_round_trips_and_is_keyed_by_content(self):
+        transcript = "\n".join(f"[2026-10-17 12:{index % 60:02d}] 使用者{index}: 同一段歷史" for index in range(2000))
+
+        first = CompressedPrompt.from_text(transcript)
+        second = CompressedPrompt.from_text(transcript)
+
+        self.assertEqual(first.prompt_hash, second.prompt_hash)
+        self.assertLess(len(first.data), len(transcript.encode("utf-8")) // 5)
+        self.assertEqual(decompress_prompt(first.codec, memoryview(first.data)), transcript)
+
+    def test_lazy_prompt_only_decompresses_on_access(self):
+        prompt = LazyPrompt("zlib", b"not zlib data")
+        self.assertIn("compressed", repr(prompt))
+
+        with self.assertRaises(Exception):
+            prompt.text
+
+        stored = CompressedPrompt.from_text("歷史")
+        prompt = LazyPrompt(stored.codec, stored.data, prompt_hash=stored.prompt_hash)
+        self.assertEqual(str(prompt), "歷史")
+        self.assertIn("loaded", repr(prompt))
+
+
+class SummaryPromptStorageTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.sqlite_path = os.path.join(self.temp_dir.name, "summaries.db")
+        self.env = patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": self.sqlite_path}, clear=False)
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.temp_dir.cleanup()
+
+    def test_rerun_over_the_same_history_stores_the_prompt_once(self):
+        repository = SummaryRepository()
+        repository.insert_summaries(
+            [
+                {"channel_id": "general", "prompt": "同一段歷史", "summary": "第一次"},
+                {"channel_id": "general", "prompt": "同一段歷史", "summary": "第二次"},
+            ]
+        )
+        repository.insert_summaries([{"channel_id": "general", "prompt": "同一段歷史", "summary": "第三次"}])
+
+        conn = repository.conn
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM summary_prompts").fetchone()[0], 1)
+        rows = conn.execute("SELECT id, prompt, prompt_hash FROM summaries ORDER BY id").fetchall()
+        self.assertEqual({row[2] for row in rows}, {rows[0][2]})
+        self.assertEqual([row[1] for row in rows], [None, None, None])
+        self.assertEqual(repository.get_prompt(rows[2][0]).text, "同一段歷史")
+
+    def test_legacy_table_is_upgraded_and_inline_prompts_are_migrated(self):
+        conn = sqlite3.connect(self.sqlite_path)
+        conn.execute(
+            "CREATE TABLE summaries (id INTEGER PRIMARY KEY, channel_id TEXT, user_id TEXT, command TEXT, "
+            "question TEXT, prompt TEXT, summary TEXT, call_time TEXT);"
+        )
+        conn.executemany(
+            "INSERT INTO summaries (channel_id, prompt, summary) VALUES (?, ?, ?);",
+            [("a", "舊 prompt", "一"), ("b", "舊 prompt", "二"), ("c", "", "三")],
+        )
+        conn.commit()
+        conn.close()
+
+        repository = SummaryRepository()
+        self.assertEqual(repository.get_prompt(1).text, "舊 prompt")
+
+        self.assertEqual(repository.migrate_inline_prompts(batch_size=1), 1)
+        self.assertEqual(repository.migrate_inline_prompts(batch_size=10), 1)
+        self.assertEqual(repository.migrate_inline_prompts(batch_size=10), 0)
+
+        rows = repository.conn.execute("SELECT prompt, prompt_hash IS NOT NULL FROM summaries ORDER BY id").fetchall()
+        self.assertEqual(rows, [(None, 1), (None, 1), ("", 0)])
+        self.assertEqual(repository.conn.execute("SELECT COUNT(*) FROM summary_prompts").fetchone()[0], 1)
+        self.assertEqual(repository.get_prompt(2).text, "舊 prompt")
+        self.assertIsNone(repository.get_prompt(99))
+
+
+if __name__ == "__main__":
+    unittest.main()
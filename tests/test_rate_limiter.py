@@ -0,0 +1,58 @@
+import unittest
+
+from discord_bot.core.rate_limiter import RateLimiter, RateLimitExceededError
+
+
+class RateLimiterTests(unittest.IsolatedAsyncioTestCase):
+    def make(self, **kwargs):
+        self.now = 0.0
+        self.sleeps = []
+
+        async def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+        options = {"requests_per_minute": 60, "tokens_per_minute": 600, "max_wait": 5}
+        options.update(kwargs)
+        return RateLimiter("test", clock=lambda: self.now, sleep=sleep, **options)
+
+    async def test_waits_for_refill_instead_of_failing(self):
+        limiter = self.make(requests_per_minute=2, max_wait=60)
+        await limiter.acquire()
+        await limiter.acquire()
+        await limiter.acquire()
+
+        self.assertAlmostEqual(sum(self.sleeps), 30.0)
+        self.assertEqual(limiter.waited, 1)
+
+    async def test_token_bucket_rejects_when_deadline_is_too_short(self):
+        limiter = self.make()
+        await limiter.acquire(600)
+
+        with self.assertRaises(RateLimitExceededError):
+            await limiter.acquire(100, max_wait=5)
+        self.assertEqual(limiter.rejected, 1)
+
+        await limiter.acquire(100, max_wait=10)
+        self.assertAlmostEqual(sum(self.sleeps), 10.0)
+
+    async def test_pause_holds_every_caller_until_retry_hint_expires(self):
+        limiter = self.make()
+        limiter.pause(3)
+
+        await limiter.acquire(1)
+
+        self.assertAlmostEqual(self.now, 3.0)
+        self.assertEqual(limiter.snapshot()["pauses"], 1)
+
+    async def test_zero_limits_are_unlimited(self):
+        limiter = self.make(requests_per_minute=0, tokens_per_minute=0)
+        for _ in range(100):
+            await limiter.acquire(10_000)
+
+        self.assertEqual(self.sleeps, [])
+        self.assertIsNone(limiter.snapshot()["tokens_available"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+
+from discord_bot.core.single_flight import SingleFlight
+
+
+class SingleFlightTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_execution(self):
+        flights = SingleFlight("test")
+        started = 0
+
+        async def work():
+            nonlocal started
+            started += 1
+            await asyncio.sleep(0.01)
+            return "done"
+
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+        self.assertEqual(results, ["done"] * 5)
+        self.assertEqual(started, 1)
+        self.assertEqual((flights.calls, flights.deduplicated), (5, 4))
+        self.assertEqual(flights.in_flight(), 0)
+
+    async def test_errors_propagate_to_every_waiter_and_key_is_released(self):
+        flights = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(flights.do("key", fail), flights.do("key", fail), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(flights.in_flight(), 0)
+
+    async def test_cancelled_waiter_does_not_cancel_shared_task(self):
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return 42
+
+        first = asyncio.create_task(flights.do("key", work))
+        second = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+
+        self.assertEqual(await second, 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -59,7 +59,7 @@ class SocialPreviewCogTests(unittest.IsolatedAsyncioTestCase):
                 sys.modules[name] = module
 
     async def test_bot_author_message_is_ignored_before_settings_lookup(self):
-        self.cog_module.is_social_preview_enabled = Mock(return_value=True)
+        self.cog_module.is_social_preview_enabled = AsyncMock(return_value=True)
 
         await self.cog.on_message(FakeMessage("https://facebook.com/demo", bot_author=True))
 
@@ -69,7 +69,7 @@ class SocialPreviewCogTests(unittest.IsolatedAsyncioTestCase):
         self.facebook_stub.extract_facebook_urls.assert_not_called()
 
     async def test_message_without_social_url_skips_settings_lookup(self):
-        self.cog_module.is_social_preview_enabled = Mock(return_value=False)
+        self.cog_module.is_social_preview_enabled = AsyncMock(return_value=False)
 
         await self.cog.on_message(FakeMessage("ordinary chat message"))
 
@@ -79,7 +79,7 @@ class SocialPreviewCogTests(unittest.IsolatedAsyncioTestCase):
         self.facebook_stub.extract_facebook_urls.assert_called_once()
 
     async def test_disabled_facebook_url_only_checks_facebook_setting(self):
-        self.cog_module.is_social_preview_enabled = Mock(return_value=False)
+        self.cog_module.is_social_preview_enabled = AsyncMock(return_value=False)
         self.facebook_stub.extract_facebook_urls.return_value = ["https://facebook.com/demo"]
 
         await self.cog.on_message(FakeMessage("https://facebook.com/demo"))
@@ -91,7 +91,7 @@ class SocialPreviewCogTests(unittest.IsolatedAsyncioTestCase):
         def enabled(_guild_id, platform):
             return platform == "facebook"
 
-        self.cog_module.is_social_preview_enabled = Mock(side_effect=enabled)
+        self.cog_module.is_social_preview_enabled = AsyncMock(side_effect=enabled)
         self.facebook_stub.extract_facebook_urls.return_value = ["https://facebook.com/demo"]
         self.facebook_stub.handle_facebook_in_message.return_value = True
 
@@ -107,7 +107,7 @@ class SocialPreviewCogTests(unittest.IsolatedAsyncioTestCase):
         def enabled(_guild_id, platform):
             return platform in {"instagram", "facebook"}
 
-        self.cog_module.is_social_preview_enabled = Mock(side_effect=enabled)
+        self.cog_module.is_social_preview_enabled = AsyncMock(side_effect=enabled)
         self.instagram_stub.extract_instagram_urls.return_value = ["https://www.instagram.com/p/abc"]
         self.instagram_stub.handle_instagram_in_message.return_value = True
         self.facebook_stub.extract_facebook_urls.return_value = ["https://facebook.com/demo"]
@@ -122,7 +122,7 @@ class SocialPreviewCogTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(self.cog_module.is_social_preview_enabled.call_count, 1)
 
     async def test_threads_handler_short_circuits_facebook(self):
-        self.cog_module.is_social_preview_enabled = Mock(return_value=True)
+        self.cog_module.is_social_preview_enabled = AsyncMock(return_value=True)
         self.threads_stub.extract_threads_urls.return_value = ["https://threads.com/@demo/post/abc"]
         self.facebook_stub.extract_facebook_urls.return_value = ["https://facebook.com/demo"]
         self.threads_stub.handle_threads_in_message.return_value = True
@@ -169,16 +169,16 @@ class SocialPreviewSettingsTests(unittest.TestCase):
             real_connect = sqlite3.connect
             connect_attempts = 0
 
-            def flaky_connect(path):
+            def flaky_connect(path, **kwargs):
                 nonlocal connect_attempts
                 connect_attempts += 1
                 if connect_attempts == 1:
                     raise sqlite3.OperationalError("temporary failure")
-                return real_connect(path)
+                return real_connect(path, **kwargs)
 
             with patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": sqlite_path}, clear=False):
                 repository = SocialPreviewSettingsRepository(retry_interval_seconds=0)
-                with patch("discord_bot.db.social_preview_settings_repository.sqlite3.connect", side_effect=flaky_connect):
+                with patch("discord_bot.db.sqlite_engine.sqlite3.connect", side_effect=flaky_connect):
                     self.assertFalse(repository.init())
                     self.assertTrue(repository.set_setting("123", "threads", True, updated_by="42"))
 
@@ -2,7 +2,7 @@ import importlib
 import sys
 import types
 import unittest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock
 
 from tests.support import install_discord_stub
 
@@ -33,7 +33,7 @@ class SocialPreviewSettingsCogTests(unittest.IsolatedAsyncioTestCase):
         self.cog = self.cog_module.SocialPreviewSettingsCog(bot=object())
 
     async def test_non_manager_cannot_modify_settings(self):
-        service = Mock()
+        service = AsyncMock()
         self.cog_module.social_preview_settings_service = service
         interaction = FakeInteraction(manage_guild=False)
 
@@ -43,13 +43,13 @@ class SocialPreviewSettingsCogTests(unittest.IsolatedAsyncioTestCase):
             types.SimpleNamespace(value="disabled"),
         )
 
-        service.set_override.assert_not_called()
+        service.set_override_async.assert_not_called()
         self.assertTrue(interaction.response.messages[-1]["ephemeral"])
         self.assertIn("管理伺服器", interaction.response.messages[-1]["content"])
 
     async def test_manager_can_disable_single_platform(self):
-        service = Mock()
-        service.list_statuses.return_value = {
+        service = AsyncMock()
+        service.list_statuses_async.return_value = {
             "threads": self.cog_module.SocialPreviewSettingStatus("threads", True, False, False, "guild_override"),
             "facebook": self.cog_module.SocialPreviewSettingStatus("facebook", True, None, True, "global_default"),
             "instagram": self.cog_module.SocialPreviewSettingStatus("instagram", False, None, False, "global_default"),
@@ -63,13 +63,13 @@ class SocialPreviewSettingsCogTests(unittest.IsolatedAsyncioTestCase):
             types.SimpleNamespace(value="disabled"),
         )
 
-        service.set_override.assert_called_once_with("123", "threads", False, updated_by="42")
+        service.set_override_async.assert_called_once_with("123", "threads", False, updated_by="42")
         self.assertTrue(interaction.response.messages[-1]["ephemeral"])
         self.assertIn("Threads: 停用", interaction.response.messages[-1]["content"])
 
     async def test_default_state_clears_override(self):
-        service = Mock()
-        service.list_statuses.return_value = {
+        service = AsyncMock()
+        service.list_statuses_async.return_value = {
             "threads": self.cog_module.SocialPreviewSettingStatus("threads", True, None, True, "global_default"),
             "facebook": self.cog_module.SocialPreviewSettingStatus("facebook", True, None, True, "global_default"),
             "instagram": self.cog_module.SocialPreviewSettingStatus("instagram", False, None, False, "global_default"),
@@ -83,12 +83,12 @@ class SocialPreviewSettingsCogTests(unittest.IsolatedAsyncioTestCase):
             types.SimpleNamespace(value="default"),
         )
 
-        service.clear_override.assert_called_once_with("123", "facebook")
-        service.set_override.assert_not_called()
+        service.clear_override_async.assert_called_once_with("123", "facebook")
+        service.set_override_async.assert_not_called()
 
     async def test_manager_can_enable_instagram(self):
-        service = Mock()
-        service.list_statuses.return_value = {
+        service = AsyncMock()
+        service.list_statuses_async.return_value = {
             "threads": self.cog_module.SocialPreviewSettingStatus("threads", False, None, False, "global_default"),
             "facebook": self.cog_module.SocialPreviewSettingStatus("facebook", False, None, False, "global_default"),
             "instagram": self.cog_module.SocialPreviewSettingStatus("instagram", False, True, True, "guild_override"),
@@ -102,13 +102,13 @@ class SocialPreviewSettingsCogTests(unittest.IsolatedAsyncioTestCase):
             types.SimpleNamespace(value="enabled"),
         )
 
-        service.set_override.assert_called_once_with("123", "instagram", True, updated_by="42")
+        service.set_override_async.assert_called_once_with("123", "instagram", True, updated_by="42")
         self.assertTrue(interaction.response.messages[-1]["ephemeral"])
         self.assertIn("Instagram", interaction.response.messages[-1]["content"])
 
     async def test_database_failure_does_not_claim_setting_was_updated(self):
-        service = Mock()
-        service.set_override.return_value = False
+        service = AsyncMock()
+        service.set_override_async.return_value = False
         self.cog_module.social_preview_settings_service = service
         interaction = FakeInteraction(manage_guild=True)
 
@@ -118,20 +118,20 @@ class SocialPreviewSettingsCogTests(unittest.IsolatedAsyncioTestCase):
             types.SimpleNamespace(value="enabled"),
         )
 
-        service.list_statuses.assert_not_called()
+        service.list_statuses_async.assert_not_called()
         content = interaction.response.messages[-1]["content"]
         self.assertIn("資料庫目前無法使用", content)
         self.assertNotIn("已將 Threads 設為", content)
 
     async def test_status_reports_database_unavailable(self):
-        service = Mock()
-        service.settings_available.return_value = False
+        service = AsyncMock()
+        service.settings_available_async.return_value = False
         self.cog_module.social_preview_settings_service = service
         interaction = FakeInteraction()
 
         await self.cog.social_preview_status(interaction)
 
-        service.list_statuses.assert_not_called()
+        service.list_statuses_async.assert_not_called()
         self.assertIn("無法確認伺服器層級設定", interaction.response.messages[-1]["content"])
 
 
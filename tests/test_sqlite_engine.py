@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from discord_bot.db.deepfaker_repository import DeepFakerRepository
+from discord_bot.db.repository import SummaryRepository
+from discord_bot.db.sqlite_engine import SQLiteEngine, sqlite_engine
+
+
+class SQLiteEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "summaries.db")
+        self.engine = SQLiteEngine(self.path, busy_timeout_ms=1234, cache_size_kib=2048, mmap_size_mb=8)
+        with self.engine.writer() as conn:
+            conn.execute("CREATE TABLE demo (id INTEGER PRIMARY KEY, value TEXT);")
+            conn.commit()
+
+    def tearDown(self):
+        self.engine.close()
+        self.temp_dir.cleanup()
+
+    def test_writer_is_tuned_for_wal(self):
+        conn = self.engine.conn
+        self.assertEqual(self.engine.journal_mode, "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous;").fetchone()[0], 1)  # NORMAL
+        self.assertEqual(conn.execute("PRAGMA busy_timeout;").fetchone()[0], 1234)
+        self.assertEqual(conn.execute("PRAGMA cache_size;").fetchone()[0], -2048)
+        self.assertEqual(conn.execute("PRAGMA mmap_size;").fetchone()[0], 8 * 1024 * 1024)
+
+    def test_readers_are_read_only_and_see_committed_rows(self):
+        with self.engine.writer() as conn:
+            conn.execute("INSERT INTO demo (value) VALUES ('a');")
+            conn.commit()
+
+        with self.engine.reader() as reader:
+            self.assertIsNot(reader, self.engine.conn)
+            self.assertEqual(reader.execute("SELECT value FROM demo;").fetchall(), [("a",)])
+            with self.assertRaises(sqlite3.OperationalError):
+                reader.execute("INSERT INTO demo (value) VALUES ('b');")
+
+    def test_reader_is_not_blocked_by_open_write_transaction(self):
+        with self.engine.writer() as conn:
+            conn.execute("INSERT INTO demo (value) VALUES ('pending');")
+            with self.engine.reader() as reader:
+                # WAL：讀取看到的是上一個 commit 的快照，不必等 writer。
+                self.assertEqual(reader.execute("SELECT COUNT(*) FROM demo;").fetchone()[0], 0)
+            conn.commit()
+
+    def test_writer_is_serialized_and_rolls_back_on_error(self):
+        inside = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def hold_writer():
+            with self.engine.writer():
+                inside.set()
+                release.wait(1)
+                order.append("first")
+
+        thread = threading.Thread(target=hold_writer)
+        thread.start()
+        inside.wait(1)
+        release.set()
+        with self.engine.writer():
+            order.append("second")
+        thread.join()
+        self.assertEqual(order, ["first", "second"])
+
+        with self.assertRaises(ValueError):
+            with self.engine.writer() as conn:
+                conn.execute("INSERT INTO demo (value) VALUES ('x');")
+                raise ValueError("boom")
+        with self.engine.reader() as reader:
+            self.assertEqual(reader.execute("SELECT COUNT(*) FROM demo;").fetchone()[0], 0)
+
+    def test_reader_connections_are_reused_and_bounded(self):
+        with self.engine.reader() as first:
+            with self.engine.reader() as second:
+                self.assertIsNot(first, second)
+        with self.engine.reader() as again:
+            self.assertIn(again, (first, second))
+        self.assertEqual(self.engine.snapshot()["readers"], 2)
+
+    def test_memory_database_reads_through_the_writer(self):
+        engine = SQLiteEngine(":memory:")
+        with engine.reader() as conn:
+            self.assertIs(conn, engine.conn)
+        engine.close()
+
+
+class SharedEngineTests(unittest.TestCase):
+    def test_repositories_on_the_same_file_share_one_writer(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sqlite_path = os.path.join(temp_dir, "summaries.db")
+            with patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": sqlite_path}, clear=False):
+                summaries = SummaryRepository()
+                summaries.init()
+                events = DeepFakerRepository()
+                events.init()
+
+                self.assertIs(summaries.engine, events.engine)
+                self.assertIs(summaries.conn, events.conn)
+                summaries.engine.close()
+
+    def test_closed_engine_is_reopened(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sqlite_path = os.path.join(temp_dir, "summaries.db")
+            first = sqlite_engine(sqlite_path)
+            first.conn.close()
+
+            second = sqlite_engine(sqlite_path)
+
+            self.assertIsNot(first, second)
+            self.assertFalse(second.closed)
+            second.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
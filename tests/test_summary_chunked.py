@@ -0,0 +1,105 @@
+import asyncio
+import types
+import unittest
+
+from discord_bot.core.tokens import estimate_tokens
+from discord_bot.features.summaries.chunked import (
+    ChunkedSummarizer,
+    ChunkSummaryCache,
+    SummaryBlockedError,
+    split_transcript,
+)
+
+
+def make_lines(count, start=0):
+    return [f"[10:{index % 60:02d}] user{index}: 今天第 {index} 句聊天內容 hello world" for index in range(start, start + count)]
+
+
+class FakeModel:
+    def __init__(self, *, fail_on=None, delay=0.01):
+        self.fail_on = fail_on
+        self.delay = delay
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_content_async(self, contents):
+        prompt = contents[1]["parts"][0]
+        self.prompts.append(prompt)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if self.fail_on and self.fail_on in prompt:
+            raise RuntimeError("chunk failed")
+        label = "reduce" if "各段落的重點整理" in prompt else f"partial{len(self.prompts)}"
+        return types.SimpleNamespace(text=f" {label} ", candidates=[object()])
+
+
+class SplitTranscriptTests(unittest.TestCase):
+    def test_chunks_stay_within_token_budget_and_keep_every_line(self):
+        lines = make_lines(400)
+
+        chunks = split_transcript(lines, max_tokens=500)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(estimate_tokens(chunk) <= 500 for chunk in chunks))
+        self.assertEqual("\n".join(chunks).splitlines(), lines)
+
+    def test_dropping_oldest_lines_keeps_later_chunk_boundaries(self):
+        lines = make_lines(400)
+
+        original = split_transcript(lines, max_tokens=500)
+        shifted = split_transcript(lines[5:], max_tokens=500)
+
+        self.assertTrue(set(original[2:-1]) & set(shifted))
+
+
+class ChunkedSummarizerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_chunks_run_under_bounded_concurrency_then_reduce(self):
+        model = FakeModel()
+        summarizer = ChunkedSummarizer(model, "system", max_chunk_tokens=500, concurrency=2, cache=ChunkSummaryCache())
+
+        result = await summarizer.summarize("\n".join(make_lines(400)), prompt_scope="過去七天")
+
+        self.assertEqual(result, "reduce")
+        self.assertLessEqual(model.max_active, 2)
+        self.assertIn("各段落的重點整理", model.prompts[-1])
+
+    async def test_retry_reuses_chunks_that_already_succeeded(self):
+        cache = ChunkSummaryCache()
+        lines = make_lines(400)
+        failing_line = lines[-1]
+        transcript = "\n".join(lines)
+
+        failing_model = FakeModel(fail_on=failing_line)
+        with self.assertRaises(RuntimeError):
+            await ChunkedSummarizer(failing_model, "system", max_chunk_tokens=500, cache=cache).summarize(
+                transcript, prompt_scope="過去七天"
+            )
+        chunk_count = len(failing_model.prompts)
+        self.assertEqual(len(cache), chunk_count - 1)
+
+        retry_model = FakeModel()
+        await ChunkedSummarizer(retry_model, "system", max_chunk_tokens=500, cache=cache).summarize(
+            transcript, prompt_scope="過去七天"
+        )
+
+        self.assertEqual(len(retry_model.prompts), 2)
+        self.assertIn(failing_line, retry_model.prompts[0])
+
+    async def test_blocked_chunk_raises_summary_blocked_error(self):
+        class BlockedModel:
+            async def generate_content_async(self, contents):
+                return types.SimpleNamespace(candidates=[], prompt_feedback=types.SimpleNamespace(block_reason="SAFETY"))
+
+        summarizer = ChunkedSummarizer(BlockedModel(), "system", max_chunk_tokens=500, cache=ChunkSummaryCache())
+
+        with self.assertRaises(SummaryBlockedError):
+            await summarizer.summarize("\n".join(make_lines(10)), prompt_scope="過去七天")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,328 @@
+import asyncio
+import os
+import tempfile
+import types
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, Mock, patch
+
+from discord_bot.db.summary_watermark_repository import SummaryWatermarkRepository
+from tests.support import install_discord_stub, reload_module
+
+install_discord_stub()
+service = reload_module("discord_bot.features.summaries.service")
+from discord_bot.core.single_flight import SingleFlight
+from discord_bot.features.summaries.answer_cache import AnswerCache, normalize_question
+from discord_bot.features.summaries.cache import SummaryCache
+
+
+def make_message(message_id, content, created_at):
+    return types.SimpleNamespace(
+        id=message_id,
+        author=types.SimpleNamespace(name="alice", display_name="Alice", bot=False),
+        content=content,
+        created_at=created_at,
+    )
+
+
+class FakeGeminiModel:
+    def __init__(self, *texts):
+        self.generate_content_async = AsyncMock(
+            side_effect=[types.SimpleNamespace(text=text, candidates=[object()]) for text in texts]
+        )
+
+    def prompt(self, call_index):
+        contents = self.generate_content_async.await_args_list[call_index].kwargs["contents"]
+        return contents[1]["parts"][0]
+
+
+class SummaryServiceTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        sqlite_path = os.path.join(self.temp_dir.name, "summaries.db")
+        self.env = patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": sqlite_path}, clear=False)
+        self.env.start()
+        self.watermarks = SummaryWatermarkRepository()
+        self.channel = types.SimpleNamespace(id=42, name="general", guild=None)
+        self.summary_repository = Mock(insert_summary_async=AsyncMock())
+        self.patches = [
+            patch.object(service, "summary_watermark_repository", self.watermarks),
+            patch.object(service, "summary_cache", SummaryCache(persist=False)),
+            patch.object(service, "summary_repository", self.summary_repository),
+            patch.object(service, "notification_service", Mock(dispatch=AsyncMock())),
+        ]
+        for active_patch in self.patches:
+            active_patch.start()
+
+    def tearDown(self):
+        for active_patch in self.patches:
+            active_patch.stop()
+        if self.watermarks.conn is not None:
+            self.watermarks.conn.close()
+        self.env.stop()
+        self.temp_dir.cleanup()
+
+    async def test_repeat_summary_only_sends_delta_and_merges_previous_summary(self):
+        now = datetime.now(timezone.utc)
+        window_start = now - timedelta(days=1)
+        model = FakeGeminiModel("第一次總結", "合併後總結")
+        first_batch = [make_message(2, "second", now - timedelta(hours=2)), make_message(1, "first", now - timedelta(hours=3))]
+
+        with patch.object(service, "gemini_model", model):
+            fetch_after, watermark = await service.resolve_summary_window(self.channel.id, "過去24小時", window_start)
+            self.assertEqual(fetch_after, window_start)
+            self.assertIsNone(watermark)
+            await service.summarize_messages(first_batch, channel=self.channel, window_start=window_start)
+
+            fetch_after, watermark = await service.resolve_summary_window(self.channel.id, "過去24小時", window_start)
+            self.assertEqual(fetch_after, first_batch[0].created_at)
+            self.assertEqual(watermark.summary, "第一次總結")
+            result = await service.summarize_messages(
+                [make_message(3, "third", now - timedelta(minutes=5))],
+                channel=self.channel,
+                window_start=window_start,
+                watermark=watermark,
+            )
+
+        self.assertEqual(result, "合併後總結")
+        merge_prompt = model.prompt(1)
+        self.assertIn("第一次總結", merge_prompt)
+        self.assertIn("third", merge_prompt)
+        self.assertNotIn("first", merge_prompt)
+        stored = self.watermarks.get_watermark("42", "過去24小時")
+        self.assertEqual((stored.summary, stored.last_message_id), ("合併後總結", 3))
+        self.assertEqual(stored.window_start, window_start)
+
+    async def test_no_new_messages_returns_stored_summary_without_llm_call(self):
+        now = datetime.now(timezone.utc)
+        window_start = now - timedelta(days=1)
+        model = FakeGeminiModel("第一次總結")
+
+        with patch.object(service, "gemini_model", model):
+            await service.summarize_messages(
+                [make_message(1, "first", now - timedelta(hours=1))],
+                channel=self.channel,
+                window_start=window_start,
+            )
+            _, watermark = await service.resolve_summary_window(self.channel.id, "過去24小時", window_start)
+            result = await service.summarize_messages([], channel=self.channel, watermark=watermark)
+
+        self.assertEqual(result, "第一次總結")
+        self.assertEqual(model.generate_content_async.await_count, 1)
+
+    async def test_stale_watermark_falls_back_to_full_window(self):
+        now = datetime.now(timezone.utc)
+        model = FakeGeminiModel("很久以前的總結")
+
+        with patch.object(service, "gemini_model", model):
+            await service.summarize_messages(
+                [make_message(1, "first", now - timedelta(days=2))],
+                channel=self.channel,
+                window_start=now - timedelta(days=3),
+            )
+
+        window_start = now - timedelta(days=1)
+        fetch_after, watermark = await service.resolve_summary_window(self.channel.id, "過去24小時", window_start)
+
+        self.assertEqual(fetch_after, window_start)
+        self.assertIsNone(watermark)
+
+    async def test_same_newest_message_is_served_from_cache_and_recorded(self):
+        now = datetime.now(timezone.utc)
+        model = FakeGeminiModel("第一次總結")
+        messages = [make_message(7, "hello", now - timedelta(minutes=1))]
+
+        with patch.object(service, "gemini_model", model):
+            first = await service.summarize_messages(messages, channel=self.channel)
+            second = await service.summarize_messages(messages, channel=self.channel)
+
+        self.assertEqual((first, second), ("第一次總結", "第一次總結"))
+        self.assertEqual(model.generate_content_async.await_count, 1)
+        recorded = self.summary_repository.insert_summary_async.call_args_list[-1].args[0]
+        self.assertEqual(recorded["command"], "過去24小時總結（快取）")
+
+    async def test_truncated_transcript_is_not_served_the_full_summary(self):
+        now = datetime.now(timezone.utc)
+        model = FakeGeminiModel("完整總結", "只有最新一則")
+        messages = [make_message(9, "newest", now - timedelta(minutes=1)), make_message(8, "older", now - timedelta(minutes=2))]
+
+        with patch.object(service, "gemini_model", model):
+            full = await service.summarize_transcript(
+                service.compact_message_history(messages), channel=self.channel, message_limit=5000
+            )
+            truncated = await service.summarize_transcript(
+                service.compact_message_history(messages[:1]), channel=self.channel, message_limit=1
+            )
+
+        self.assertEqual((full, truncated), ("完整總結", "只有最新一則"))
+        self.assertEqual(model.generate_content_async.await_count, 2)
+
+    async def test_concurrent_identical_summaries_share_one_gemini_call(self):
+        now = datetime.now(timezone.utc)
+        messages = [make_message(8, "hello", now - timedelta(minutes=1))]
+        model = FakeGeminiModel("共用總結")
+
+        async def slow_response(**kwargs):
+            await asyncio.sleep(0.01)
+            return types.SimpleNamespace(text="共用總結", candidates=[object()])
+
+        model.generate_content_async.side_effect = slow_response
+        with patch.object(service, "gemini_model", model), patch.object(service, "summary_flights", SingleFlight("summary")):
+            results = await asyncio.gather(
+                *(service.summarize_messages(messages, channel=self.channel) for _ in range(3))
+            )
+
+        self.assertEqual(results, ["共用總結"] * 3)
+        self.assertEqual(model.generate_content_async.await_count, 1)
+
+
+class RoleLLMTests(unittest.IsolatedAsyncioTestCase):
+    async def test_saturated_local_llm_fails_over_to_cloud_when_enabled(self):
+        overloaded = AsyncMock(side_effect=service.LLMOverloadedError("local LLM queue is full"))
+        cloud = AsyncMock(return_value="cloud answer")
+        with patch.object(service, "query_local_llm", overloaded), patch.object(service, "call_cloud_llm", cloud), \
+                patch.object(service, "role_model", object()), patch.object(service, "LOCAL_LLM_FAILOVER_TO_CLOUD", True):
+            answer = await service.call_role_llm("prompt", role="kurisu", mode="local")
+
+        self.assertEqual(answer, "cloud answer")
+        cloud.assert_awaited_once_with("prompt", role="kurisu", on_text=None)
+
+    async def test_saturated_local_llm_raises_when_failover_is_disabled(self):
+        overloaded = AsyncMock(side_effect=service.LLMOverloadedError("local LLM queue is full"))
+        cloud = AsyncMock()
+        with patch.object(service, "query_local_llm", overloaded), patch.object(service, "call_cloud_llm", cloud), \
+                patch.object(service, "LOCAL_LLM_FAILOVER_TO_CLOUD", False):
+            with self.assertRaises(service.LLMOverloadedError):
+                await service.call_role_llm("prompt", mode="local")
+
+        cloud.assert_not_awaited()
+
+
+    async def test_repeated_question_over_same_history_is_answered_from_cache(self):
+        role_llm = AsyncMock(return_value="答案")
+        with patch.object(service, "query_local_llm", role_llm), patch.object(service, "answer_cache", AnswerCache()):
+            first = await service.answer_role_question("p1", "basic", question="為什麼？", history="h", mode="local")
+            second = await service.answer_role_question("p2", "basic", question=" 為什麼 ", history="h", mode="local")
+            other_history = await service.answer_role_question("p3", "basic", question="為什麼", history="h2")
+
+        self.assertEqual([first, second, other_history], [("答案", False), ("答案", True), ("答案", False)])
+        self.assertEqual(role_llm.await_count, 2)
+
+    async def test_failed_answers_are_not_cached(self):
+        role_llm = AsyncMock(side_effect=["Error contacting local LLM: boom", "答案"])
+        with patch.object(service, "query_local_llm", role_llm), patch.object(service, "answer_cache", AnswerCache()):
+            await service.answer_role_question("p", "kurisu", question="q", history="h")
+            answer = await service.answer_role_question("p", "kurisu", question="q", history="h")
+
+        self.assertEqual(answer, ("答案", False))
+
+    async def test_failover_answer_is_cached_under_the_cloud_backend(self):
+        local = AsyncMock(side_effect=[service.LLMOverloadedError("local LLM queue is full"), "本地答案"])
+        cloud = AsyncMock(return_value="雲端答案")
+        with patch.object(service, "query_local_llm", local), patch.object(service, "call_cloud_llm", cloud), \
+                patch.object(service, "role_model", object()), patch.object(service, "LOCAL_LLM_FAILOVER_TO_CLOUD", True), \
+                patch.object(service, "answer_cache", AnswerCache()):
+            failover = await service.answer_role_question("p", "basic", question="q", history="h", mode="local")
+            local_again = await service.answer_role_question("p", "basic", question="q", history="h", mode="local")
+            cloud_hit = await service.answer_role_question("p", "basic", question="q", history="h", mode="cloud")
+
+        self.assertEqual(failover, ("雲端答案", False))
+        self.assertEqual(local_again, ("本地答案", False))
+        self.assertEqual(cloud_hit, ("雲端答案", True))
+
+
+class AnswerCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = AnswerCache(ttl_seconds=60, max_entries=2, clock=lambda: self.now)
+
+    def test_question_normalization_folds_width_case_and_trailing_punctuation(self):
+        self.assertEqual(normalize_question("ＡＢＣ　為什麼？？"), normalize_question("abc  為什麼"))
+
+    def test_question_normalization_keeps_inner_symbols_and_punctuation_only_questions(self):
+        self.assertNotEqual(normalize_question("1+1"), normalize_question("11"))
+        self.assertNotEqual(normalize_question("C++"), normalize_question("C"))
+        self.assertNotEqual(normalize_question("???"), normalize_question("!!!"))
+        self.assertNotEqual(normalize_question("😂😂"), normalize_question(""))
+        self.assertNotEqual(AnswerCache.key("basic", "???", "h"), AnswerCache.key("basic", "!!!", "h"))
+
+    def test_entries_expire_and_least_recently_used_is_evicted(self):
+        keys = [AnswerCache.key("basic", f"q{index}", "history") for index in range(3)]
+        self.cache.put(keys[0], "a0")
+        self.cache.put(keys[1], "a1")
+        self.cache.get(keys[0])
+        self.cache.put(keys[2], "a2")
+
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertEqual(self.cache.get(keys[0]), "a0")
+        self.now += 61
+        self.assertIsNone(self.cache.get(keys[2]))
+
+    def test_resample_bypasses_hits_in_proportion_to_temperature(self):
+        cache = AnswerCache(resample_factor=1.0, rng=Mock(random=Mock(side_effect=[0.5, 0.9, 0.0])))
+        key = AnswerCache.key("basic", "q", "h")
+        cache.put(key, "a")
+
+        self.assertIsNone(cache.get(key, temperature=0.7))
+        self.assertEqual(cache.get(key, temperature=0.7), "a")
+        self.assertEqual(cache.get(key, temperature=0.0), "a")
+        self.assertEqual(cache.resampled, 1)
+
+
+class SummaryCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.watermarks = Mock(get_watermark=Mock(return_value=None))
+
+    def make_cache(self, **kwargs):
+        return SummaryCache(watermarks=self.watermarks, clock=lambda: self.now, **kwargs)
+
+    def test_entries_expire_after_ttl(self):
+        cache = self.make_cache(ttl_seconds=60, persist=False)
+        key = cache.key(1, "過去24小時", 5)
+        cache.put(key, "總結")
+
+        self.now += 59
+        self.assertEqual(cache.get(key), "總結")
+        self.now += 2
+        self.assertIsNone(cache.get(key))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = self.make_cache(max_entries=2, persist=False)
+        first, second, third = (cache.key(1, "過去一小時", message_id) for message_id in (1, 2, 3))
+        cache.put(first, "a")
+        cache.put(second, "b")
+        cache.get(first)
+        cache.put(third, "c")
+
+        self.assertEqual(cache.get(first), "a")
+        self.assertIsNone(cache.get(second))
+
+    def test_persisted_watermark_for_same_message_counts_as_hit(self):
+        updated_at = datetime.fromtimestamp(self.now - 30, timezone.utc)
+        self.watermarks.get_watermark.return_value = types.SimpleNamespace(
+            last_message_id=9, summary="已存的總結", updated_at=updated_at
+        )
+        cache = self.make_cache(ttl_seconds=60, persist=True)
+
+        self.assertEqual(cache.get(cache.key(1, "過去七天", 9)), "已存的總結")
+        self.assertIsNone(cache.get(cache.key(1, "過去七天", 10)))
+        self.watermarks.get_watermark.assert_called_with("1", "過去七天")
+
+    def test_message_limit_separates_truncated_summaries(self):
+        updated_at = datetime.fromtimestamp(self.now - 30, timezone.utc)
+        self.watermarks.get_watermark.return_value = types.SimpleNamespace(
+            last_message_id=9, summary="完整的總結", updated_at=updated_at
+        )
+        cache = self.make_cache(ttl_seconds=60, persist=True)
+        cache.put(cache.key(1, "過去24小時", 9), "完整的總結")
+
+        self.assertIsNone(cache.get(cache.key(1, "過去24小時", 9, 10)))
+        self.assertEqual(cache.get(cache.key(1, "過去24小時", 9)), "完整的總結")
+        # watermark 不知道當時的訊息上限，截斷過的 key 不能拿它當快取。
+        self.watermarks.get_watermark.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
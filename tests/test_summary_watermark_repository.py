@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from discord_bot.db.summary_watermark_repository import SummaryWatermark, SummaryWatermarkRepository
+
+
+def make_watermark(**overrides) -> SummaryWatermark:
+    base = datetime(2026, 4, 10, 8, 0, tzinfo=timezone.utc)
+    values = {
+        "channel_id": "42",
+        "prompt_scope": "過去24小時",
+        "summary": "大家在聊晚餐",
+        "last_message_id": 1234567890123,
+        "last_message_at": base,
+        "window_start": base - timedelta(days=1),
+        "updated_at": base + timedelta(minutes=1),
+    }
+    values.update(overrides)
+    return SummaryWatermark(**values)
+
+
+class SummaryWatermarkRepositoryTests(unittest.TestCase):
+    def test_save_and_get_round_trip_in_sqlite(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sqlite_path = os.path.join(temp_dir, "summaries.db")
+            with patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": sqlite_path}, clear=False):
+                repository = SummaryWatermarkRepository()
+                watermark = make_watermark()
+
+                self.assertTrue(repository.save_watermark(watermark))
+                self.assertEqual(repository.get_watermark("42", "過去24小時"), watermark)
+                self.assertIsNone(repository.get_watermark("42", "過去一小時"))
+                repository.conn.close()
+
+    def test_save_overwrites_existing_channel_scope(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sqlite_path = os.path.join(temp_dir, "summaries.db")
+            with patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": sqlite_path}, clear=False):
+                repository = SummaryWatermarkRepository()
+                repository.save_watermark(make_watermark())
+                updated = make_watermark(summary="改聊宵夜", last_message_id=1234567890999)
+
+                repository.save_watermark(updated)
+
+                self.assertEqual(repository.get_watermark("42", "過去24小時"), updated)
+                repository.conn.close()
+
+    def test_postgres_without_database_url_disables_watermarks(self):
+        with patch.dict(os.environ, {"DB_TYPE": "postgres", "DATABASE_URL": ""}, clear=False):
+            repository = SummaryWatermarkRepository()
+
+            self.assertFalse(repository.save_watermark(make_watermark()))
+            self.assertIsNone(repository.get_watermark("42", "過去24小時"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,8 +3,9 @@ import sqlite3
 import tempfile
 import unittest
 from pathlib import Path
-from unittest.mock import call, patch
+from unittest.mock import MagicMock, call, patch
 
+from discord_bot.db.prompt_store import CompressedPrompt
 from discord_bot.db.schema import DEEPFAKER_EVENT_COLUMNS, SUMMARY_COLUMNS
 
 
@@ -49,6 +50,26 @@ class SyncPostgresSummariesToolTests(unittest.TestCase):
 
             self.assertEqual(selected, row)
 
+    def test_fetch_summaries_expands_compressed_prompts(self):
+        stored = CompressedPrompt.from_text("壓縮過的 prompt")
+        fetched = [
+            (1, "general", "alice", "總結", "", None, "summary", "2026-10-17T12:00:00+08:00", "zlib", memoryview(stored.data)),
+            (2, "general", "bob", "總結", "", "舊 prompt", "summary", "2026-10-17T12:00:00+08:00", None, None),
+        ]
+        conn = MagicMock()
+        conn.__enter__.return_value = conn
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = fetched
+
+        with patch("psycopg2.connect", return_value=conn):
+            rows = sync_tool.fetch_table("postgresql://demo", "summaries", min_id=0)
+
+        sql = cursor.execute.call_args.args[0]
+        self.assertIn("LEFT JOIN summary_prompts p ON p.prompt_hash = t.prompt_hash", sql)
+        self.assertIn("WHERE t.id > %s", sql)
+        self.assertEqual([row[SUMMARY_COLUMNS.index("prompt")] for row in rows], ["壓縮過的 prompt", "舊 prompt"])
+        self.assertEqual(len(rows[0]), len(SUMMARY_COLUMNS))
+
     def test_write_all_tables_preserves_deepfaker_channel_name_and_bot_target(self):
         summary_row = (
             1,
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from discord_bot.db.deepfaker_repository import DeepFakerRepository
+from discord_bot.db.repository import SummaryRepository
+from discord_bot.db.schema import DEEPFAKER_EVENT_COLUMNS
+from discord_bot.db.write_behind import WriteBehindQueue
+
+
+class FakeTable:
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+        self.failures = []
+
+    def insert_batch(self, records):
+        self.calls.append(len(records))
+        if self.failures:
+            raise self.failures.pop(0)
+        for record in records:
+            if record.get("bad"):
+                raise sqlite3.IntegrityError("NOT NULL constraint failed")
+        self.rows.extend(records)
+
+
+class WriteBehindQueueTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.spill_path = os.path.join(self.temp_dir.name, "summaries.spill.jsonl")
+        self.table = FakeTable()
+        self.now = 0.0
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_queue(self, **kwargs):
+        options = {"batch_size": 3, "flush_interval": 60, "retry_seconds": 10, "spill_path": self.spill_path}
+        options.update(kwargs)
+        return WriteBehindQueue("summaries", self.table.insert_batch, clock=lambda: self.now, **options)
+
+    async def test_full_batch_is_written_in_one_call(self):
+        queue = self.make_queue()
+        for index in range(3):
+            queue.put({"id": index})
+
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+            if self.table.rows:
+                break
+
+        self.assertEqual(self.table.calls, [3])
+        self.assertEqual([row["id"] for row in self.table.rows], [0, 1, 2])
+        await queue.close()
+
+    async def test_partial_batch_is_flushed_after_interval(self):
+        queue = self.make_queue(flush_interval=0.02)
+        queue.put({"id": 1})
+
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(self.table.rows, [{"id": 1}])
+        await queue.close()
+
+    async def test_close_flushes_remaining_records(self):
+        queue = self.make_queue()
+        queue.put({"id": 1})
+
+        await queue.close()
+
+        self.assertEqual(self.table.rows, [{"id": 1}])
+        self.assertEqual(queue.snapshot()["written"], 1)
+
+    async def test_transient_failure_spills_then_replays_in_order(self):
+        queue = self.make_queue()
+        self.table.failures.append(sqlite3.OperationalError("database is locked"))
+        queue.put({"id": 1})
+        await queue.flush()
+
+        self.assertEqual(queue.snapshot()["spilled"], 1)
+        self.assertTrue(os.path.exists(self.spill_path))
+
+        # 退避期間新的紀錄排在 spill 檔後面，不會先寫進 DB。
+        queue.put({"id": 2})
+        await queue.flush()
+        self.assertEqual(self.table.rows, [])
+
+        self.now = 11
+        queue.put({"id": 3})
+        await queue.flush()
+
+        self.assertEqual([row["id"] for row in self.table.rows], [1, 2, 3])
+        self.assertFalse(os.path.exists(self.spill_path))
+        self.assertEqual(queue.snapshot()["spilled"], 0)
+        await queue.close()
+
+    async def test_spill_file_is_bounded(self):
+        queue = self.make_queue(spill_max_records=2)
+        self.table.failures.append(sqlite3.OperationalError("disk I/O error"))
+        for index in range(3):
+            queue._buffer.append({"id": index})
+        await queue.flush()
+
+        snapshot = queue.snapshot()
+        self.assertEqual((snapshot["spilled"], snapshot["dropped"]), (2, 1))
+        with open(self.spill_path, encoding="utf-8") as spill:
+            self.assertEqual([json.loads(line)["id"] for line in spill], [0, 1])
+
+    async def test_rejected_batch_falls_back_to_row_by_row(self):
+        queue = self.make_queue()
+        for record in ({"id": 1}, {"id": 2, "bad": True}, {"id": 3}):
+            queue._buffer.append(record)
+
+        await queue.flush()
+
+        self.assertEqual([row["id"] for row in self.table.rows], [1, 3])
+        self.assertEqual(queue.snapshot()["dropped"], 1)
+        self.assertFalse(os.path.exists(self.spill_path))
+
+    async def test_transient_failure_during_row_retry_is_spilled_not_dropped(self):
+        queue = self.make_queue()
+        for record in ({"id": 1, "bad": True}, {"id": 2}, {"id": 3}):
+            queue._buffer.append(record)
+        insert_batch = self.table.insert_batch
+        calls = []
+
+        def flaky_insert(records):
+            calls.append(records)
+            # 整批、第 1 筆、第 2 筆之後 DB 被鎖住。
+            if len(calls) == 4:
+                raise sqlite3.OperationalError("database is locked")
+            insert_batch(records)
+
+        queue.insert_batch = flaky_insert
+        await queue.flush()
+
+        snapshot = queue.snapshot()
+        self.assertEqual((snapshot["dropped"], snapshot["spilled"]), (1, 1))
+        self.assertEqual([row["id"] for row in self.table.rows], [2])
+        with open(self.spill_path, encoding="utf-8") as spill:
+            self.assertEqual([json.loads(line)["id"] for line in spill], [3])
+
+    async def test_records_after_close_are_written_by_submit_and_rejected_by_put(self):
+        queue = self.make_queue()
+        await queue.close()
+
+        await queue.submit({"id": 1})
+
+        self.assertEqual(self.table.rows, [{"id": 1}])
+        with self.assertRaises(RuntimeError):
+            queue.put({"id": 2})
+
+    async def test_corrupt_spill_line_only_drops_that_line(self):
+        with open(self.spill_path, "w", encoding="utf-8") as spill:
+            spill.write(json.dumps({"id": 1}) + "\n")
+            spill.write('{"id": 2, "summ\n')
+            spill.write(json.dumps({"id": 3}) + "\n")
+        queue = self.make_queue()
+
+        await queue.flush(force_retry=True)
+
+        self.assertEqual([row["id"] for row in self.table.rows], [1, 3])
+        self.assertEqual(queue.snapshot()["dropped"], 1)
+        self.assertFalse(os.path.exists(self.spill_path))
+
+    async def test_spill_left_by_previous_process_is_replayed(self):
+        with open(self.spill_path, "w", encoding="utf-8") as spill:
+            spill.write(json.dumps({"id": 0}) + "\n")
+        queue = self.make_queue()
+        queue.put({"id": 1})
+
+        await queue.close()
+
+        self.assertEqual([row["id"] for row in self.table.rows], [0, 1])
+        self.assertFalse(os.path.exists(self.spill_path))
+
+
+class RepositoryBatchInsertTests(unittest.TestCase):
+    def test_summaries_with_different_columns_share_one_transaction(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sqlite_path = os.path.join(temp_dir, "summaries.db")
+            with patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": sqlite_path}, clear=False):
+                repository = SummaryRepository()
+                repository.insert_summaries(
+                    [
+                        {"channel_id": "a", "summary": "一"},
+                        {"channel_id": "b", "question": "問題", "summary": "二"},
+                        {"channel_id": "c", "summary": "三"},
+                    ]
+                )
+                rows = repository.conn.execute("SELECT channel_id, question FROM summaries ORDER BY id").fetchall()
+                repository.conn.close()
+
+        self.assertEqual(rows, [("a", None), ("c", None), ("b", "問題")])
+
+    def test_deepfaker_batch_is_rolled_back_and_raised_on_failure(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sqlite_path = os.path.join(temp_dir, "summaries.db")
+            with patch.dict(os.environ, {"DB_TYPE": "sqlite", "SQLITE_PATH": sqlite_path}, clear=False):
+                repository = DeepFakerRepository()
+                repository.init()
+                repository.conn.execute("DROP TABLE deepfaker_events;")
+
+                with self.assertRaises(sqlite3.OperationalError):
+                    repository.insert_events([{column: "x" for column in DEEPFAKER_EVENT_COLUMNS}])
+                repository.conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Drive the summary / conversation LLM flows against offline fakes and report latency.
+
+不需要 API key 或本地 LLM：Gemini 換成 FakeGenaiClient，本地 LLM 換成 FakeOpenAIServer，
+其餘（scheduler、rate limiter、model router、快取、DB 寫入）都是正式程式碼。
+
+範例：
+    python tools/benchmark_llm.py --flow all --requests 200 --concurrency 20
+    python tools/benchmark_llm.py --flow summary --error-503 0.1 --latency-ms 800 --json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import types
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from tools.llm_fakes import FakeGenaiClient, FakeOpenAIServer, add_profile_arguments, profiles_from_args
+
+FLOWS = ("summary", "ask", "answer_book")
+
+
+def percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class FlowResult:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latencies: list[float] = []
+        self.errors: Counter[str] = Counter()
+        self.started = 0.0
+        self.finished = 0.0
+
+    def report(self) -> dict[str, Any]:
+        elapsed = max(self.finished - self.started, 1e-9)
+        return {
+            "flow": self.name,
+            "ok": len(self.latencies),
+            "errors": dict(self.errors),
+            "p50_ms": _ms(percentile(self.latencies, 50)),
+            "p95_ms": _ms(percentile(self.latencies, 95)),
+            "p99_ms": _ms(percentile(self.latencies, 99)),
+            "throughput_rps": round(len(self.latencies) / elapsed, 2),
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _prepare_environment(workdir: str) -> None:
+    # 在 import discord_bot 前設定，讓 repository 寫到暫存 SQLite，不碰正式資料。
+    os.environ.setdefault("DB_TYPE", "sqlite")
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "benchmark.db")
+    os.environ["SUMMARY_CACHE_PERSIST"] = "0"
+    os.environ.setdefault("LOCAL_LLM_URL", "http://127.0.0.1:9")
+
+
+def _install_fakes(genai_client: FakeGenaiClient, local_llm_url: str) -> types.SimpleNamespace:
+    from discord_bot.cogs import conversation_cog
+    from discord_bot.features.summaries import service
+    from discord_bot.integrations import gemini_client, local_llm
+
+    gemini_model, role_model = gemini_client._create_models(genai_client)
+    gemini_client.gemini_model, gemini_client.role_model = gemini_model, role_model
+    service.gemini_model, service.role_model = gemini_model, role_model
+    conversation_cog.gemini_model = gemini_model
+    local_llm.POST_URL = local_llm_url
+    return types.SimpleNamespace(gemini_client=gemini_client, service=service, gemini_model=gemini_model)
+
+
+def _build_transcript(index: int, messages: int, shared: bool) -> Any:
+    from discord_bot.features.chat.compactor import compact_message_history
+    from discord_bot.features.chat.message_record import MessageRecord, intern_author
+
+    base = 0 if shared else index * messages
+    now = datetime.now(timezone.utc)
+    records = [
+        MessageRecord(
+            id=base + offset + 1,
+            created_at=now - timedelta(seconds=offset * 30),
+            author=intern_author(f"user{offset % 7}", f"使用者{offset % 7}"),
+            content=f"第 {offset} 則測試訊息，聊聊今天的進度 https://example.com/{offset}",
+        )
+        for offset in range(messages)
+    ]
+    return compact_message_history(records)
+
+
+async def _timed(result: FlowResult, call: Callable[[], Awaitable[Any]]) -> None:
+    started = time.perf_counter()
+    try:
+        answer = await call()
+    except Exception as exc:
+        result.errors[type(exc).__name__] += 1
+        return
+    if isinstance(answer, str) and answer.startswith(("Error", "Summarization failed", "Summarization blocked")):
+        result.errors[answer.split(":", 1)[0]] += 1
+        return
+    result.latencies.append(time.perf_counter() - started)
+
+
+async def run_flow(name: str, args: argparse.Namespace, env: types.SimpleNamespace) -> FlowResult:
+    from discord_bot.core.llm_scheduler import LLMPriority, llm_request
+    from discord_bot.integrations.gemini_client import stream_text
+
+    result = FlowResult(name)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def noop(_text: str) -> None:
+        return None
+
+    async def one(index: int) -> None:
+        history_index = index % args.distinct_histories
+        guild_id = index % args.guilds
+        if name == "summary":
+            channel = types.SimpleNamespace(id=1000 + history_index, name=f"bench-{history_index}", guild=None)
+            transcript = _build_transcript(history_index, args.messages, shared=False)
+            priority = LLMPriority.SUMMARY
+            call = lambda: env.service.summarize_transcript(
+                transcript, prompt_scope="benchmark", user_id="bench", channel=channel
+            )
+        elif name == "ask":
+            transcript = _build_transcript(history_index, args.messages, shared=False)
+            context = [
+                {"role": "model", "parts": ["你是 Discord 頻道的觀察者。"]},
+                {"role": "user", "parts": [f"以下是最近的對話：\n\n{transcript.text}"]},
+            ]
+            priority = LLMPriority.SUMMARY
+
+            async def call() -> str:
+                text, block_reason = await stream_text(
+                    env.gemini_model.generate_with_context_stream_async(context, f"問題 {index}"),
+                    noop,
+                )
+                return text if block_reason is None else f"Error: blocked {block_reason}"
+        else:
+            transcript = _build_transcript(history_index, 20, shared=False)
+            priority = LLMPriority.INTERACTIVE
+            call = lambda: env.service.call_role_llm(
+                f"{transcript.text}\n\n問題 {index}", role="basic", mode=args.role_mode, on_text=noop
+            )
+
+        async with semaphore:
+            with llm_request(guild_id=guild_id, priority=priority):
+                await _timed(result, call)
+
+    result.started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.requests)))
+    result.finished = time.perf_counter()
+    return result
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    latency, faults = profiles_from_args(args)
+    genai_client = FakeGenaiClient(latency=latency, faults=faults, seed=args.seed)
+    server = FakeOpenAIServer(latency=latency, faults=faults, seed=args.seed)
+    local_llm_url = await server.start()
+    env = _install_fakes(genai_client, local_llm_url)
+
+    from discord_bot.core.bootstrap import shutdown_application
+    from discord_bot.core.llm_scheduler import llm_scheduler
+    from discord_bot.db.executor import db_executor
+    from discord_bot.db.repository import summary_repository
+    from discord_bot.integrations.local_llm_client import local_llm_client
+
+    flows = FLOWS if args.flow == "all" else (args.flow,)
+    try:
+        reports = [(await run_flow(flow, args, env)).report() for flow in flows]
+    finally:
+        await local_llm_client.close()
+        await server.stop()
+        await shutdown_application()
+
+    return {
+        "flows": reports,
+        "scheduler": llm_scheduler.snapshot(),
+        "gemini_router": env.gemini_model.router.snapshot(),
+        "gemini_rate_limiter": env.gemini_model.rate_limiter.snapshot(),
+        "local_llm_client": local_llm_client.stats.snapshot(),
+        "db_executor": db_executor.snapshot(),
+        "summary_writes": summary_repository.writes.snapshot(),
+        "fake_gemini": {"requests": genai_client.stats.requests, "faults": genai_client.stats.faults},
+        "fake_local_llm": {
+            "requests": server.stats.requests,
+            "faults": server.stats.faults,
+            "peak_concurrency": server.peak_active,
+        },
+    }
+
+
+def _print_table(summary: dict[str, Any]) -> None:
+    header = f"{'flow':<12}{'ok':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}  errors"
+    print(header)
+    print("-" * len(header))
+    for report in summary["flows"]:
+        print(
+            f"{report['flow']:<12}{report['ok']:>6}"
+            f"{report['p50_ms'] or '-':>10}{report['p95_ms'] or '-':>10}{report['p99_ms'] or '-':>10}"
+            f"{report['throughput_rps']:>9}  {report['errors'] or ''}"
+        )
+    print()
+    for key in (
+        "scheduler",
+        "gemini_router",
+        "gemini_rate_limiter",
+        "local_llm_client",
+        "db_executor",
+        "summary_writes",
+        "fake_gemini",
+        "fake_local_llm",
+    ):
+        print(f"{key}: {json.dumps(summary[key], ensure_ascii=False, default=str)}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark LLM flows against offline fakes.")
+    parser.add_argument("--flow", choices=(*FLOWS, "all"), default="all")
+    parser.add_argument("--requests", type=int, default=100, help="requests per flow")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight at once")
+    parser.add_argument("--messages", type=int, default=300, help="history size for summary / ask")
+    parser.add_argument("--distinct-histories", type=int, default=1_000_000, help="lower it to exercise caches")
+    parser.add_argument("--guilds", type=int, default=3, help="spread requests over this many guild ids")
+    parser.add_argument("--role-mode", choices=("local", "cloud"), default="local")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own log output")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    args.distinct_histories = max(1, args.distinct_histories)
+    args.guilds = max(1, args.guilds)
+    if not args.verbose:
+        # 注入的錯誤會讓 bot 記下大量 warning / traceback，預設只看報表。
+        logging.getLogger("discord_digest_bot").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _prepare_environment(workdir)
+        summary = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+    else:
+        _print_table(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
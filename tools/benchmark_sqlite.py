@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Compare SQLite insert throughput: one default connection per repository vs. the shared tuned engine.
+
+每個情境都在新的暫存檔上，以 `--writers` 條 thread 寫入 `--records` 筆 summaries，
+同時有一條 thread 反覆讀取最新幾筆，量測讀取延遲：
+
+- legacy：每條 writer 各開一條預設連線（rollback journal、synchronous=FULL），逐筆 commit
+- engine：共用 `sqlite_engine` 的單一 writer（WAL、synchronous=NORMAL），逐筆 commit，讀取走 reader 連線
+- engine_batched：同上，但以 `--batch-size` 筆為一個 transaction，等同 write-behind queue 的寫法
+
+範例：
+    python tools/benchmark_sqlite.py --records 2000 --writers 3
+    python tools/benchmark_sqlite.py --records 5000 --batch-size 100 --json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from discord_bot.db.schema import SQLITE_CREATE_SUMMARIES_SQL
+from discord_bot.db.sqlite_engine import SQLiteEngine
+
+SCENARIOS = ("legacy", "engine", "engine_batched")
+INSERT_SQL = "INSERT INTO summaries (channel_id, user_id, command, prompt, summary, call_time) VALUES (?, ?, ?, ?, ?, ?);"
+READ_SQL = "SELECT id, summary FROM summaries ORDER BY id DESC LIMIT 20;"
+
+
+def percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 2)
+
+
+def make_row(writer: int, index: int) -> tuple[Any, ...]:
+    return (
+        f"channel-{writer}",
+        f"user-{index % 17}",
+        "總結",
+        "prompt " * 40,
+        f"summary {writer}-{index} " * 20,
+        "2026-10-17T12:00:00+08:00",
+    )
+
+
+class Scenario:
+    """One way of getting a write connection and a read connection for the benchmark threads."""
+
+    def __init__(self, name: str, path: str, batch_size: int) -> None:
+        self.name = name
+        self.path = path
+        self.batch_size = batch_size if name == "engine_batched" else 1
+        self.engine: Optional[SQLiteEngine] = None
+        self._local = threading.local()
+        self._legacy_connections: list[sqlite3.Connection] = []
+        self._legacy_lock = threading.Lock()
+
+        if name == "legacy":
+            with self._legacy() as conn:
+                conn.execute(SQLITE_CREATE_SUMMARIES_SQL)
+                conn.commit()
+        else:
+            self.engine = SQLiteEngine(path)
+            with self.engine.writer() as conn:
+                conn.execute(SQLITE_CREATE_SUMMARIES_SQL)
+                conn.commit()
+
+    @contextmanager
+    def _legacy(self) -> Iterator[sqlite3.Connection]:
+        # 舊寫法：每個 repository 一條預設參數的連線，彼此不共用。
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self._legacy_lock:
+                self._legacy_connections.append(conn)
+        yield conn
+
+    def writer(self) -> Any:
+        return self._legacy() if self.engine is None else self.engine.writer()
+
+    def reader(self) -> Any:
+        return self._legacy() if self.engine is None else self.engine.reader()
+
+    def close(self) -> None:
+        for conn in self._legacy_connections:
+            conn.close()
+        if self.engine is not None:
+            self.engine.close()
+
+
+def run_scenario(name: str, args: argparse.Namespace) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        scenario = Scenario(name, os.path.join(temp_dir, f"{name}.db"), args.batch_size)
+        per_writer = args.records // args.writers
+        write_latencies: list[float] = []
+        read_latencies: list[float] = []
+        errors: dict[str, int] = {}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def record_error(exc: Exception) -> None:
+            with lock:
+                errors[str(exc)] = errors.get(str(exc), 0) + 1
+
+        def write(writer: int) -> None:
+            rows = [make_row(writer, index) for index in range(per_writer)]
+            for start in range(0, len(rows), scenario.batch_size):
+                batch = rows[start:start + scenario.batch_size]
+                began = time.perf_counter()
+                try:
+                    with scenario.writer() as conn:
+                        conn.executemany(INSERT_SQL, batch)
+                        conn.commit()
+                except sqlite3.OperationalError as exc:
+                    record_error(exc)
+                    continue
+                with lock:
+                    write_latencies.append(time.perf_counter() - began)
+
+        def read() -> None:
+            while not done.is_set():
+                began = time.perf_counter()
+                try:
+                    with scenario.reader() as conn:
+                        conn.execute(READ_SQL).fetchall()
+                except sqlite3.OperationalError as exc:
+                    record_error(exc)
+                    continue
+                read_latencies.append(time.perf_counter() - began)
+                time.sleep(0.001)
+
+        threads = [threading.Thread(target=write, args=(writer,)) for writer in range(args.writers)]
+        reader = threading.Thread(target=read)
+        started = time.perf_counter()
+        reader.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        done.set()
+        reader.join()
+
+        with scenario.writer() as conn:
+            written = conn.execute("SELECT COUNT(*) FROM summaries;").fetchone()[0]
+        journal_mode = scenario.engine.journal_mode if scenario.engine is not None else "delete"
+        scenario.close()
+
+    return {
+        "scenario": name,
+        "journal_mode": journal_mode,
+        "batch_size": scenario.batch_size,
+        "rows": written,
+        "rows_per_s": round(written / elapsed, 1),
+        "commit_p50_ms": _ms(percentile(write_latencies, 50)),
+        "commit_p95_ms": _ms(percentile(write_latencies, 95)),
+        "read_p95_ms": _ms(percentile(read_latencies, 95)),
+        "reads": len(read_latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def print_table(results: list[dict[str, Any]]) -> None:
+    columns: list[tuple[str, Callable[[dict[str, Any]], Any]]] = [
+        ("scenario", lambda row: row["scenario"]),
+        ("journal", lambda row: row["journal_mode"]),
+        ("batch", lambda row: row["batch_size"]),
+        ("rows", lambda row: row["rows"]),
+        ("rows/s", lambda row: row["rows_per_s"]),
+        ("commit p50", lambda row: row["commit_p50_ms"]),
+        ("commit p95", lambda row: row["commit_p95_ms"]),
+        ("read p95", lambda row: row["read_p95_ms"]),
+        ("errors", lambda row: sum(row["errors"].values())),
+    ]
+    header = " | ".join(f"{title:>14}" for title, _ in columns)
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(" | ".join(f"{str(getter(row)):>14}" for _, getter in columns))
+    baseline = next((row for row in results if row["scenario"] == "legacy"), None)
+    if baseline and baseline["rows_per_s"]:
+        print()
+        for row in results:
+            if row is not baseline:
+                print(f"{row['scenario']}: {row['rows_per_s'] / baseline['rows_per_s']:.1f}x legacy throughput")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark SQLite insert throughput before/after the shared engine.")
+    parser.add_argument("--scenario", choices=(*SCENARIOS, "all"), default="all")
+    parser.add_argument("--records", type=int, default=2000, help="total rows per scenario")
+    parser.add_argument("--writers", type=int, default=3, help="concurrent writer threads (one per repository)")
+    parser.add_argument("--batch-size", type=int, default=50, help="rows per transaction for engine_batched")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args(argv)
+    args.writers = max(1, args.writers)
+    args.batch_size = max(1, args.batch_size)
+
+    names = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = [run_scenario(name, args) for name in names]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Offline stand-ins for the LLM backends, for load tests and benchmarks.
+
+- FakeOpenAIServer：OpenAI-compatible `/v1/chat/completions`（含 SSE 串流），把
+  `local_llm.POST_URL` 指到 `server.url` 即可取代本地 LLM
+- FakeGenaiClient：模擬 `genai.Client().aio.models` / `aio.caches`，傳給
+  `gemini_client._create_models(client)` 即可取代 Gemini
+
+兩者都能設定延遲分佈（log-normal）、串流 chunk 數與錯誤注入（503 / 429 / timeout）。
+
+單獨啟動假本地 LLM：
+    python tools/llm_fakes.py --port 9453 --latency-ms 800 --error-503 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import types
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+from aiohttp import web
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@dataclass
+class LatencyProfile:
+    """Log-normal latency around `median_ms`; `sigma` widens the tail (0 = constant)."""
+
+    median_ms: float = 300.0
+    sigma: float = 0.5
+    chunks: int = 8
+    chunk_interval_ms: float = 40.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.sigma <= 0:
+            return self.median_ms / 1000
+        return rng.lognormvariate(math.log(max(self.median_ms, 0.001)), self.sigma) / 1000
+
+
+@dataclass
+class FaultProfile:
+    """Probabilities of injected failures per request; a timeout hangs for `timeout_seconds`."""
+
+    error_503: float = 0.0
+    error_429: float = 0.0
+    timeout: float = 0.0
+    timeout_seconds: float = 30.0
+    retry_after_seconds: float = 1.0
+
+    def draw(self, rng: random.Random) -> Optional[str]:
+        roll = rng.random()
+        for name, probability in (("503", self.error_503), ("429", self.error_429), ("timeout", self.timeout)):
+            if roll < probability:
+                return name
+            roll -= probability
+        return None
+
+
+@dataclass
+class FakeStats:
+    requests: int = 0
+    faults: dict[str, int] = field(default_factory=dict)
+
+    def record(self, fault: Optional[str]) -> None:
+        self.requests += 1
+        if fault is not None:
+            self.faults[fault] = self.faults.get(fault, 0) + 1
+
+
+def _answer_chunks(prompt: str, chunks: int) -> list[str]:
+    words = [f"回覆{index}" for index in range(max(1, chunks))]
+    words[0] = f"（{len(prompt)} 字 prompt）{words[0]}"
+    return words
+
+
+class FakeOpenAIServer:
+    """aiohttp server speaking just enough of the OpenAI chat completions API."""
+
+    def __init__(
+        self,
+        *,
+        latency: Optional[LatencyProfile] = None,
+        faults: Optional[FaultProfile] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency or LatencyProfile()
+        self.faults = faults or FaultProfile()
+        self.host = host
+        self.port = port
+        self.stats = FakeStats()
+        self.active = 0
+        self.peak_active = 0
+        self._rng = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat_completions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _chat_completions(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        prompt = "".join(str(message.get("content", "")) for message in payload.get("messages", []))
+        fault = self.faults.draw(self._rng)
+        self.stats.record(fault)
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        try:
+            await asyncio.sleep(self.latency.sample(self._rng))
+            if fault == "timeout":
+                await asyncio.sleep(self.faults.timeout_seconds)
+            elif fault in ("503", "429"):
+                headers = {"Retry-After": str(self.faults.retry_after_seconds)} if fault == "429" else None
+                return web.json_response({"error": {"code": int(fault)}}, status=int(fault), headers=headers)
+
+            chunks = _answer_chunks(prompt, self.latency.chunks)
+            if not payload.get("stream"):
+                await asyncio.sleep(self.latency.chunk_interval_ms * len(chunks) / 1000)
+                return web.json_response({"choices": [{"message": {"role": "assistant", "content": "".join(chunks)}}]})
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for chunk in chunks:
+                await asyncio.sleep(self.latency.chunk_interval_ms / 1000)
+                data = json.dumps({"choices": [{"delta": {"content": chunk}}]}, ensure_ascii=False)
+                await response.write(f"data: {data}\n\n".encode("utf-8"))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            return response
+        finally:
+            self.active -= 1
+
+
+class FakeAPIError(Exception):
+    """Looks like a google-genai APIError to `_error_status_code` / `gemini_user_message`."""
+
+    def __init__(self, code: int, status: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"{code} {status}")
+        self.code = code
+        self.details = {"error": {"code": code, "status": status, "details": []}}
+        if retry_after is not None:
+            self.details["error"]["details"].append(
+                {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_after}s"}
+            )
+
+
+FakeAPIError.__module__ = "google.genai.errors"
+
+
+def _fake_response(text: str, prompt_tokens: int) -> Any:
+    return types.SimpleNamespace(
+        text=text,
+        parts=[text],
+        candidates=[object()],
+        prompt_feedback=None,
+        usage_metadata=types.SimpleNamespace(total_token_count=prompt_tokens + len(text)),
+    )
+
+
+class _FakeModels:
+    def __init__(self, owner: "FakeGenaiClient") -> None:
+        self._owner = owner
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None) -> Any:
+        chunks = await self._owner._begin(model)
+        await asyncio.sleep(self._owner.latency.chunk_interval_ms * len(chunks) / 1000)
+        return _fake_response("".join(chunks), len(str(contents)))
+
+    async def generate_content_stream(self, *, model: str, contents: Any, config: Any = None) -> AsyncIterator[Any]:
+        chunks = await self._owner._begin(model)
+
+        async def stream() -> AsyncIterator[Any]:
+            for chunk in chunks:
+                await asyncio.sleep(self._owner.latency.chunk_interval_ms / 1000)
+                yield types.SimpleNamespace(text=chunk, prompt_feedback=None)
+
+        return stream()
+
+
+class _FakeCaches:
+    def __init__(self, owner: "FakeGenaiClient") -> None:
+        self._owner = owner
+        self.created = 0
+
+    async def create(self, *, model: str, config: Any = None) -> Any:
+        await self._owner._begin(model)
+        self.created += 1
+        return types.SimpleNamespace(name=f"cachedContents/fake-{self.created}", model=model)
+
+
+class FakeGenaiClient:
+    """Stand-in for `genai.Client`; `model_faults` overrides the fault profile per model name."""
+
+    def __init__(
+        self,
+        *,
+        latency: Optional[LatencyProfile] = None,
+        faults: Optional[FaultProfile] = None,
+        model_faults: Optional[dict[str, FaultProfile]] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency or LatencyProfile()
+        self.faults = faults or FaultProfile()
+        self.model_faults = model_faults or {}
+        self.stats = FakeStats()
+        self._rng = random.Random(seed)
+        self.aio = types.SimpleNamespace(models=_FakeModels(self), caches=_FakeCaches(self))
+
+    async def _begin(self, model: str) -> list[str]:
+        faults = self.model_faults.get(model, self.faults)
+        fault = faults.draw(self._rng)
+        self.stats.record(fault)
+        await asyncio.sleep(self.latency.sample(self._rng))
+        if fault == "503":
+            raise FakeAPIError(503, "UNAVAILABLE")
+        if fault == "429":
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED", retry_after=faults.retry_after_seconds)
+        if fault == "timeout":
+            await asyncio.sleep(faults.timeout_seconds)
+            raise FakeAPIError(504, "DEADLINE_EXCEEDED")
+        return _answer_chunks(model, self.latency.chunks)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="median latency before the first byte")
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    parser.add_argument("--chunks", type=int, default=8, help="streamed chunks per answer")
+    parser.add_argument("--chunk-interval-ms", type=float, default=40.0)
+    parser.add_argument("--error-503", type=float, default=0.0, help="probability of a 503")
+    parser.add_argument("--error-429", type=float, default=0.0, help="probability of a 429")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="probability of a hung request")
+    parser.add_argument("--timeout-seconds", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def profiles_from_args(args: argparse.Namespace) -> tuple[LatencyProfile, FaultProfile]:
+    latency = LatencyProfile(
+        median_ms=args.latency_ms,
+        sigma=args.sigma,
+        chunks=args.chunks,
+        chunk_interval_ms=args.chunk_interval_ms,
+    )
+    faults = FaultProfile(
+        error_503=args.error_503,
+        error_429=args.error_429,
+        timeout=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+    )
+    return latency, faults
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    latency, faults = profiles_from_args(args)
+    server = FakeOpenAIServer(latency=latency, faults=faults, host=args.host, port=args.port, seed=args.seed)
+    url = await server.start()
+    print(f"Fake local LLM listening on {url} (set LOCAL_LLM_URL=http://{args.host}:{server.port})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible local LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9453)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -13,6 +13,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from discord_bot.db.prompt_store import decompress_prompt
 from discord_bot.db.schema import (
     CREATE_DEEPFAKER_EVENT_INDEXES_SQL,
     DEEPFAKER_EVENT_COLUMNS,
@@ -117,6 +118,14 @@ def _coerce_row(row: Sequence[object]) -> tuple[object, ...]:
     return tuple(_coerce_sqlite_value(value) for value in row)
 
 
+def _inline_summary_prompt(row: Sequence[object]) -> tuple[object, ...]:
+    """Expand the compressed `summary_prompts` blob back into the backup's plain `prompt` column."""
+    *values, codec, compressed = row
+    if compressed is not None:
+        values[SUMMARY_COLUMNS.index("prompt")] = decompress_prompt(str(codec), compressed)
+    return tuple(values)
+
+
 def fetch_table(
     database_url: str,
     table: str,
@@ -132,11 +141,16 @@ def fetch_table(
     except ModuleNotFoundError as exc:
         raise RuntimeError("psycopg2 is not installed. Install requirements.txt before syncing PostgreSQL.") from exc
 
-    columns = ", ".join(SYNC_TABLES[table]["columns"])
-    sql = f"SELECT {columns} FROM {table} ORDER BY id"
+    columns = ", ".join(f"t.{column}" for column in SYNC_TABLES[table]["columns"])
+    source = f"{table} t"
+    if table == "summaries":
+        # 新資料的 prompt 壓縮存在 summary_prompts，一併取出後在本地解壓，備份檔仍維持單一 prompt 欄位。
+        columns += ", p.codec, p.compressed"
+        source += " LEFT JOIN summary_prompts p ON p.prompt_hash = t.prompt_hash"
+    sql = f"SELECT {columns} FROM {source} ORDER BY t.id"
     params: list[object] = []
     if min_id is not None:
-        sql = f"SELECT {columns} FROM {table} WHERE id > %s ORDER BY id"
+        sql = f"SELECT {columns} FROM {source} WHERE t.id > %s ORDER BY t.id"
         params.append(min_id)
     if limit is not None:
         if limit <= 0:
@@ -147,7 +161,10 @@ def fetch_table(
     with psycopg2.connect(database_url, connect_timeout=10) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, tuple(params))
-            return [_coerce_row(row) for row in cur.fetchall()]
+            rows = cur.fetchall()
+    if table == "summaries":
+        rows = [_inline_summary_prompt(row) for row in rows]
+    return [_coerce_row(row) for row in rows]
 
 
 def fetch_summaries(